@@ -0,0 +1,422 @@
+"""
+批次模式 (Gemini Batch API)：不需要即時結果的整份報告 / 多份報告回填。
+
+流程分三步，每一步都可以分開執行（例如晚上送出、隔天收取）：
+
+1. `prepare_batch_job`：把一或多份報告的每一頁組成與線上模式相同的請求 (core.gemini_client.build_page_parts)，
+   寫成 job JSONL（每行 `{"key": "<report_id>:<page_index>", "request": {...}}`）與 `<job>.manifest.json`。
+2. `submit_batch_job`：依大小切成多個 inline 批次送到 `models/{model}:batchGenerateContent`，
+   operation 名稱寫入 `<job>.state.json`。
+3. `collect_batch_job`：輪詢批次狀態；全部完成後依 key 拆回各報告，經 Schema 驗證與本地數值驗證
+   (core.verify，比對原 PDF 的文字層) 後寫出各自的輸出 JSON，
+   並寫入與線上模式相同格式的 journal，失敗頁可用 `esg_goal_miner.py --resume` 線上補跑。
+
+端點由 `GEMINI_BATCH_ENDPOINT`（未設定時沿用 `GEMINI_API_ENDPOINT`）決定，
+指向 tools/fake_gemini_server.py 即可離線測試整個流程。
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import fitz  # PyMuPDF
+
+from .gemini_client import build_page_parts
+from .journal import RunJournal, file_sha256, journal_path_for
+from .pdf_extractor import extract_mixed_content
+from .prompt import GOAL_RESPONSE_SCHEMA, PROMPT_VERSION
+from .schema import GoalResponseError, parse_goal_response, validate_goal_items
+from .usage import UsageTracker, usage_summary_path
+from .verify import verify_goal_items
+
+DEFAULT_BATCH_ENDPOINT = "https://generativelanguage.googleapis.com"
+# inline 批次的請求大小上限約 20 MB，保留一些餘裕給 JSON 包裝
+DEFAULT_MAX_BATCH_BYTES = 18_000_000
+_TERMINAL_FAILED_STATES = ("BATCH_STATE_FAILED", "BATCH_STATE_CANCELLED", "BATCH_STATE_EXPIRED")
+
+
+class BatchError(RuntimeError):
+    """批次工作建立 / 查詢失敗，或 job 檔案與 manifest 不一致。"""
+
+
+class BatchPendingError(BatchError):
+    """collect 時仍有批次尚未完成 (wait=False，或輪詢到逾時)；pending 為未完成的批次名稱。"""
+
+    def __init__(self, pending: List[str], total: int) -> None:
+        super().__init__(f"{len(pending)}/{total} 個批次尚未完成: {', '.join(pending)}")
+        self.pending = pending
+        self.total = total
+
+
+@dataclass
+class BatchReport:
+    """一份要放進批次工作的報告。report_id 留空時以 `<PDF 檔名>-<年份>` 命名。"""
+
+    pdf_path: Path
+    report_year: int
+    output_path: Path
+    report_id: str = ""
+
+
+def manifest_path_for(job_path: Path) -> Path:
+    return job_path.with_name(f"{job_path.stem}.manifest.json")
+
+
+def state_path_for(job_path: Path) -> Path:
+    return job_path.with_name(f"{job_path.stem}.state.json")
+
+
+def _rest_parts(parts: List[Any]) -> List[Dict[str, Any]]:
+    """把 build_page_parts 的輸出 (str / {"mime_type", "data": bytes}) 轉成 REST JSON 格式。"""
+    rest: List[Dict[str, Any]] = []
+    for part in parts:
+        if isinstance(part, str):
+            rest.append({"text": part})
+        else:
+            rest.append(
+                {
+                    "inline_data": {
+                        "mime_type": part["mime_type"],
+                        "data": base64.b64encode(part["data"]).decode("ascii"),
+                    }
+                }
+            )
+    return rest
+
+
+def _page_request(page: Dict[str, Any], report_year: int) -> Dict[str, Any]:
+    # 批次模式一律用 inline 圖片：describe 策略需要兩段相依的呼叫，無法放進同一個批次
+    use_images = page.get("mode", "TEXT") in ("HYBRID", "VISION") and bool(page["images"])
+    parts = build_page_parts(
+        page_text=page["text"],
+        images=page["images"],
+        current_year=report_year,
+        use_images=use_images,
+        inline_images=use_images,
+    )
+    return {
+        "contents": [{"role": "user", "parts": _rest_parts(parts)}],
+        "generation_config": {
+            "responseMimeType": "application/json",
+            "responseSchema": GOAL_RESPONSE_SCHEMA,
+            "temperature": 0.1,
+        },
+    }
+
+
+def prepare_batch_job(
+    reports: List[BatchReport],
+    job_path: Path,
+    *,
+    model_name: str = "gemini-2.5-flash-lite",
+) -> Dict[str, Any]:
+    """產生 job JSONL 與 manifest，回傳 manifest。不會呼叫任何 API。"""
+    job_path.parent.mkdir(parents=True, exist_ok=True)
+    manifest: Dict[str, Any] = {
+        "model": model_name.split("/")[-1],
+        "prompt_version": PROMPT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "reports": [],
+    }
+    used_ids: set[str] = set()
+
+    with job_path.open("w", encoding="utf-8") as f:
+        for report in reports:
+            report_id = report.report_id or f"{report.pdf_path.stem}-{report.report_year}"
+            base_id, n = report_id, 2
+            while report_id in used_ids:
+                report_id, n = f"{base_id}-{n}", n + 1
+            used_ids.add(report_id)
+
+            pages = extract_mixed_content(str(report.pdf_path))
+            for page in pages:
+                line = {
+                    "key": f"{report_id}:{page['page_index']}",
+                    "request": _page_request(page, report.report_year),
+                }
+                f.write(json.dumps(line, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+            manifest["reports"].append(
+                {
+                    "report_id": report_id,
+                    "pdf": str(report.pdf_path),
+                    "pdf_sha256": file_sha256(report.pdf_path),
+                    "report_year": report.report_year,
+                    "output": str(report.output_path),
+                    "pages": [{"page_index": p["page_index"], "mode": p["mode"]} for p in pages],
+                }
+            )
+
+    manifest_path_for(job_path).write_text(
+        json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+    return manifest
+
+
+def _load_json(path: Path, what: str) -> Dict[str, Any]:
+    if not path.is_file():
+        raise BatchError(f"找不到{what}: {path}")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+class _BatchApi:
+    """極簡 REST 客戶端；google-generativeai 0.8 尚未提供 Batch API 包裝。"""
+
+    def __init__(self, endpoint: Optional[str] = None, api_key: Optional[str] = None) -> None:
+        endpoint = (
+            endpoint
+            or os.getenv("GEMINI_BATCH_ENDPOINT")
+            or os.getenv("GEMINI_API_ENDPOINT")
+            or DEFAULT_BATCH_ENDPOINT
+        )
+        if "://" not in endpoint:
+            endpoint = f"https://{endpoint}"
+        self.endpoint = endpoint.rstrip("/")
+        self.api_key = api_key or os.getenv("GOOGLE_API_KEY") or "offline"
+
+    def _request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(
+            f"{self.endpoint}/v1beta/{path}",
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json", "x-goog-api-key": self.api_key},
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=300) as resp:
+                return json.loads(resp.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", errors="replace")[:500]
+            raise BatchError(f"{method} {path} 失敗: HTTP {e.code} {detail}") from e
+        except urllib.error.URLError as e:
+            raise BatchError(f"{method} {path} 無法連線: {e.reason}") from e
+
+    def create(self, model: str, display_name: str, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        body = {
+            "batch": {
+                "display_name": display_name,
+                "input_config": {"requests": {"requests": entries}},
+            }
+        }
+        return self._request("POST", f"models/{model}:batchGenerateContent", body)
+
+    def get(self, name: str) -> Dict[str, Any]:
+        return self._request("GET", name)
+
+
+def _chunk_entries(job_path: Path, max_bytes: int) -> List[List[Dict[str, Any]]]:
+    chunks: List[List[Dict[str, Any]]] = [[]]
+    size = 0
+    with job_path.open("r", encoding="utf-8") as f:
+        for raw in f:
+            if not raw.strip():
+                continue
+            line = json.loads(raw)
+            entry = {"request": line["request"], "metadata": {"key": line["key"]}}
+            entry_size = len(raw.encode("utf-8"))
+            if chunks[-1] and size + entry_size > max_bytes:
+                chunks.append([])
+                size = 0
+            chunks[-1].append(entry)
+            size += entry_size
+    return [c for c in chunks if c]
+
+
+def submit_batch_job(
+    job_path: Path,
+    *,
+    endpoint: Optional[str] = None,
+    api_key: Optional[str] = None,
+    max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+) -> Dict[str, Any]:
+    """送出 job 檔中的所有請求，回傳並寫入 state（含每個批次的 operation 名稱）。"""
+    manifest = _load_json(manifest_path_for(job_path), "manifest")
+    api = _BatchApi(endpoint, api_key)
+    state: Dict[str, Any] = {"endpoint": api.endpoint, "model": manifest["model"], "batches": []}
+
+    for i, entries in enumerate(_chunk_entries(job_path, max_batch_bytes)):
+        operation = api.create(manifest["model"], f"{job_path.stem}-{i}", entries)
+        state["batches"].append({"name": operation["name"], "requests": len(entries)})
+        # 每建立一個批次就寫一次 state，送到一半失敗時已建立的批次不會遺失
+        state_path_for(job_path).write_text(json.dumps(state, indent=2), encoding="utf-8")
+    return state
+
+
+def _extract_inlined_responses(operation: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """相容 operation.response 與 metadata.output 兩種位置的 inlinedResponses。"""
+    for container in (operation.get("response"), (operation.get("metadata") or {}).get("output")):
+        if not container:
+            continue
+        inlined = container.get("inlinedResponses") or container.get("inlined_responses") or {}
+        if isinstance(inlined, dict):
+            inlined = inlined.get("inlinedResponses") or inlined.get("inlined_responses") or []
+        return list(inlined)
+    return []
+
+
+def _batch_state(operation: Dict[str, Any]) -> str:
+    return (operation.get("metadata") or {}).get("state", "")
+
+
+def _response_text(response: Dict[str, Any]) -> tuple[str, str]:
+    candidates = response.get("candidates") or []
+    if not candidates:
+        return "", "NO_CANDIDATES"
+    candidate = candidates[0]
+    text = "".join(p.get("text", "") for p in (candidate.get("content") or {}).get("parts", []))
+    return text, candidate.get("finishReason") or candidate.get("finish_reason") or "STOP"
+
+
+def collect_batch_job(
+    job_path: Path,
+    *,
+    wait: bool = False,
+    poll_interval: float = 30.0,
+    timeout: Optional[float] = None,
+    endpoint: Optional[str] = None,
+    api_key: Optional[str] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    查詢批次狀態；尚未全部完成時丟出 BatchPendingError（wait=True 時持續輪詢直到完成或逾時）。
+    完成後寫出各報告的輸出 JSON / journal / usage，
+    回傳 {report_id: {items, failed_pages, unverified_pages, problems, output}}。
+    """
+    manifest = _load_json(manifest_path_for(job_path), "manifest")
+    state = _load_json(state_path_for(job_path), "state（請先執行 submit）")
+    api = _BatchApi(endpoint or state.get("endpoint"), api_key)
+    deadline = time.monotonic() + timeout if timeout else None
+
+    while True:
+        operations = [api.get(b["name"]) for b in state["batches"]]
+        for op in operations:
+            if _batch_state(op) in _TERMINAL_FAILED_STATES or op.get("error"):
+                raise BatchError(f"批次 {op.get('name')} 失敗: {op.get('error') or _batch_state(op)}")
+        pending = [op["name"] for op in operations if not op.get("done")]
+        if not pending:
+            break
+        if not wait or (deadline is not None and time.monotonic() >= deadline):
+            raise BatchPendingError(pending, len(operations))
+        time.sleep(poll_interval)
+
+    responses: Dict[str, Dict[str, Any]] = {}
+    for op in operations:
+        for entry in _extract_inlined_responses(op):
+            key = (entry.get("metadata") or {}).get("key")
+            if key:
+                responses[key] = entry
+    return _demux(manifest, responses)
+
+
+def _page_layers(report: Dict[str, Any]) -> Dict[int, Tuple[str, Sequence[Sequence[Any]]]]:
+    """
+    數值驗證用的 (文字層, 文字框)，只讀非 VISION 頁。
+    PDF 已不存在或內容與 prepare 時不同 (sha256 不符) 時回傳空 dict，目標一律標記 not_verifiable。
+    """
+    pdf_path = Path(report["pdf"])
+    if not pdf_path.is_file() or file_sha256(pdf_path) != report["pdf_sha256"]:
+        return {}
+    layers: Dict[int, Tuple[str, Sequence[Sequence[Any]]]] = {}
+    with fitz.open(pdf_path) as doc:
+        for page in report["pages"]:
+            if page["mode"] != "VISION":
+                pdf_page = doc.load_page(page["page_index"])
+                layers[page["page_index"]] = (pdf_page.get_text(), pdf_page.get_text("words"))
+    return layers
+
+
+def _demux(
+    manifest: Dict[str, Any], responses: Dict[str, Dict[str, Any]]
+) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    model = manifest["model"]
+
+    for report in manifest["reports"]:
+        report_year = report["report_year"]
+        output_path = Path(report["output"])
+        journal = RunJournal(
+            journal_path_for(output_path),
+            pdf_sha256=report["pdf_sha256"],
+            prompt_version=manifest["prompt_version"],
+            report_year=report_year,
+        )
+        usage = UsageTracker()
+        failed: List[Dict[str, Any]] = []
+        unverified: List[Dict[str, Any]] = []
+        problems: List[Dict[str, Any]] = []
+        layers = _page_layers(report)
+
+        for page in report["pages"]:
+            page_index, mode = page["page_index"], page["mode"]
+            entry = responses.get(f"{report['report_id']}:{page_index}")
+            try:
+                if entry is None:
+                    raise GoalResponseError("批次結果中找不到此頁")
+                if entry.get("error"):
+                    raise GoalResponseError(f"批次請求失敗: {entry['error']}")
+                response = entry.get("response") or {}
+                text, finish_reason = _response_text(response)
+                meta = response.get("usageMetadata") or {}
+                usage.record(
+                    model=model,
+                    kind="batch",
+                    page_index=page_index,
+                    mode=mode,
+                    prompt_tokens=meta.get("promptTokenCount", 0),
+                    output_tokens=meta.get("candidatesTokenCount", 0),
+                    image_bytes=0,
+                    latency_s=0.0,
+                    retries=0,
+                )
+                # 批次中無法續寫，截斷的頁面列為失敗，交給線上 --resume 補跑
+                raw_items = parse_goal_response(text, finish_reason=finish_reason)
+            except GoalResponseError as e:
+                failed.append({"page_index": page_index, "mode": mode, "error": str(e)})
+                journal.append(page_index, mode=mode, items=[], status="failed", error=str(e))
+                continue
+
+            items, page_problems = validate_goal_items(raw_items, report_year=report_year)
+            problems.extend({"page_index": page_index, "problem": p} for p in page_problems)
+            # 與線上模式相同的本地數值驗證 (core.pipeline)
+            page_text, words = layers.get(page_index, ("", None))
+            issues = verify_goal_items(items, page_text, words, mode=mode)
+            if issues:
+                unverified.append({"page_index": page_index, "mode": mode, "issues": issues})
+            for item in items:
+                item.setdefault("Report_Year", report_year)
+            journal.append(page_index, mode=mode, items=items, model=model, batch=True)
+
+        all_items = journal.assemble_items()
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with output_path.open("w", encoding="utf-8") as f:
+            json.dump(all_items, f, ensure_ascii=False, indent=2)
+        usage.write_summary(usage_summary_path(output_path))
+
+        results[report["report_id"]] = {
+            "output": str(output_path),
+            "items": all_items,
+            "failed_pages": failed,
+            "unverified_pages": unverified,
+            "problems": problems,
+        }
+    return results
+
+
+__all__ = [
+    "BatchError",
+    "BatchPendingError",
+    "BatchReport",
+    "DEFAULT_MAX_BATCH_BYTES",
+    "collect_batch_job",
+    "manifest_path_for",
+    "prepare_batch_job",
+    "state_path_for",
+    "submit_batch_job",
+]
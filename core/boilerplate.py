@@ -0,0 +1,208 @@
+"""
+跨頁頁首 / 頁尾等固定樣板文字的偵測與移除。
+
+報告每一頁的文字層都帶著頁首 (公司名稱、報告標題、章節名)、頁碼與法律聲明頁尾，
+每頁數十個 tokens，乘上數百頁與每次呼叫就很可觀。
+
+1. `detect_boilerplate(pdf_path)`：只讀文字層 (不渲染)，找出在足夠多頁面、
+   相同位置 (頁面上方或下方邊界區、相近高度) 重複出現的行。只有頁碼 / 日期中的數字視為萬用字元
+   (整行是頁碼或日期，或行首 / 行尾的頁碼)，因此 "12" / "13" 算同一行；其餘數字須完全相同。
+   含目標訊號 (core.compaction.has_goal_signal：百分比、數量單位、基準年或目標用語) 的行一律不視為樣板，
+   即使每頁都重複出現 (例如頁尾的 "2030 年減碳 50%" 標語)，也不會從頁面移除；
+   只含年份的頁首 / 頁尾 (例如 "2023 永續報告書"、"(c) 2023 PepsiCo Inc.") 仍視為樣板。
+2. `strip_boilerplate(pages, model)`：逐頁移除這些行，產出新的頁面 dict，
+   並在 `boilerplate_removed` 記下被移除的 (行號, 原文)，`restore_page_text` 可還原；
+   `original_text` 保留移除前的文字層，供跨年度索引 / 數值驗證使用。
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import fitz  # PyMuPDF
+
+from .compaction import has_goal_signal
+
+# 頁面上方 / 下方各多少比例的高度視為頁首 / 頁尾區
+_MARGIN_RATIO = 0.12
+# 垂直位置分桶數 (約頁高 2%)
+_Y_BINS = 50
+_DIGITS = re.compile(r"\d+")
+# 整行只有頁碼："12"、"p. 12"、"Page 12 of 80"、"第 12 頁"、"12/80"
+_PAGE_NUMBER = re.compile(
+    r"^(?:p\.?|page|第)?\s*\d{1,4}\s*頁?(?:\s*(?:/|／|of)\s*\d{1,4}\s*頁?)?$", re.I
+)
+# 整行只有日期："2024-03-31"、"31/03/2024"、"2024 年 3 月"、"March 31, 2024"
+_DATE = re.compile(
+    r"^(?:\d{4}[-/.]\d{1,2}(?:[-/.]\d{1,2})?|\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}|"
+    r"\d{4}\s*年\s*\d{1,2}\s*月(?:\s*\d{1,2}\s*日)?|"
+    r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+(?:\d{1,2},?\s+)?\d{4})$",
+    re.I,
+)
+# 行首 / 行尾以空白或分隔符號隔開的頁碼："12 | 永續報告書"、"Page 3 | (c) 2023 PepsiCo Inc."、"Sustainability Report 12"
+_EDGE_PAGE_NUMBER = re.compile(
+    r"^(?:(?:p\.?|page)\s*)?\d{1,3}(?=\s*[|｜·•]|\s)|(?<=[\s|｜·•])(?:(?:p\.?|page)\s*)?\d{1,3}$", re.I
+)
+_WHITESPACE = re.compile(r"\s+")
+
+LineKey = Tuple[str, int, str]
+
+
+def _line_key(text: str, y_center: float, page_height: float) -> Optional[LineKey]:
+    if page_height <= 0:
+        return None
+    rel = y_center / page_height
+    if rel <= _MARGIN_RATIO:
+        zone = "header"
+    elif rel >= 1 - _MARGIN_RATIO:
+        zone = "footer"
+    else:
+        return None
+    normalized = _normalize_line(text)
+    if not normalized:
+        return None
+    return zone, int(rel * _Y_BINS), normalized
+
+
+def _normalize_line(text: str) -> Optional[str]:
+    """比對用的行文字；頁碼 / 日期的數字以 # 表示。含目標訊號、不可視為樣板的行回傳 None。"""
+    line = _WHITESPACE.sub(" ", text).strip()
+    if not line:
+        return None
+    if _PAGE_NUMBER.match(line) or _DATE.match(line):
+        return _DIGITS.sub("#", line).lower()
+    if has_goal_signal(line):
+        return None
+    return _EDGE_PAGE_NUMBER.sub("#", line).lower()
+
+
+def _page_lines(page: fitz.Page) -> Iterator[Tuple[str, float]]:
+    """(行文字, 行中心 y)。"""
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", []):
+            text = "".join(span["text"] for span in line["spans"])
+            if text.strip():
+                y0, y1 = line["bbox"][1], line["bbox"][3]
+                yield text, (y0 + y1) / 2
+
+
+@dataclass
+class BoilerplateModel:
+    """
+    patterns: 被判定為樣板的行 ({zone, y_bin, text, pages})，text 中頁碼 / 日期的數字以 # 表示
+    page_lines: 每頁實際要移除的原始行文字
+    removed: strip_boilerplate 實際移除的 (行號, 原文)，可用 restore_page_text 還原
+    """
+
+    patterns: List[Dict[str, Any]] = field(default_factory=list)
+    page_lines: Dict[int, List[str]] = field(default_factory=dict)
+    removed: Dict[int, List[Tuple[int, str]]] = field(default_factory=dict)
+
+    @property
+    def removed_chars(self) -> int:
+        return sum(len(line) for lines in self.removed.values() for _, line in lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "patterns": self.patterns,
+            "removed": {str(k): v for k, v in sorted(self.removed.items())},
+            "removed_chars": self.removed_chars,
+        }
+
+
+def detect_boilerplate(
+    pdf_path: str,
+    only_pages: Optional[Collection[int]] = None,
+    *,
+    min_ratio: float = 0.3,
+    min_pages: int = 3,
+) -> BoilerplateModel:
+    """
+    在至少 max(min_pages, min_ratio × 頁數) 頁的相同邊界位置出現的行視為樣板。
+    only_pages 只影響要移除哪些頁的樣板；判定一律使用整份文件，少量頁面時也能正確偵測。
+    """
+    occurrences: Dict[LineKey, Set[int]] = defaultdict(set)
+    raw_lines: Dict[int, List[Tuple[LineKey, str]]] = defaultdict(list)
+
+    with fitz.open(pdf_path) as doc:
+        n_pages = len(doc)
+        for i in range(n_pages):
+            page = doc.load_page(i)
+            height = page.rect.height
+            for text, y_center in _page_lines(page):
+                key = _line_key(text, y_center, height)
+                if key is None:
+                    continue
+                occurrences[key].add(i)
+                if only_pages is None or i in only_pages:
+                    raw_lines[i].append((key, text))
+
+    threshold = max(min_pages, math.ceil(min_ratio * n_pages))
+    boilerplate = {key for key, pages in occurrences.items() if len(pages) >= threshold}
+
+    model = BoilerplateModel(
+        patterns=[
+            {"zone": k[0], "y_bin": k[1], "text": k[2], "pages": len(occurrences[k])}
+            for k in sorted(boilerplate)
+        ]
+    )
+    for i, lines in raw_lines.items():
+        removed = [text for key, text in lines if key in boilerplate]
+        if removed:
+            model.page_lines[i] = removed
+    return model
+
+
+def strip_page_text(text: str, lines_to_remove: Iterable[str]) -> Tuple[str, List[Tuple[int, str]]]:
+    """移除指定的行 (各移除第一次出現)，回傳 (新文字, [(原始行號, 原文), ...])。"""
+    pending = [line.strip() for line in lines_to_remove]
+    kept: List[str] = []
+    removed: List[Tuple[int, str]] = []
+    for line_no, line in enumerate(text.split("\n")):
+        stripped = line.strip()
+        if stripped and stripped in pending:
+            pending.remove(stripped)
+            removed.append((line_no, line))
+        else:
+            kept.append(line)
+    return "\n".join(kept), removed
+
+
+def restore_page_text(text: str, removed: List[Tuple[int, str]]) -> str:
+    """strip_page_text 的反向操作。"""
+    lines = text.split("\n")
+    for line_no, line in sorted(removed):
+        lines.insert(line_no, line)
+    return "\n".join(lines)
+
+
+def strip_boilerplate(
+    pages: Iterable[Dict[str, Any]], model: BoilerplateModel
+) -> Iterator[Dict[str, Any]]:
+    """逐頁移除樣板行；頁面 dict 另加 `boilerplate_removed` 供還原 / 稽核，`original_text` 保留原文。"""
+    for page in pages:
+        lines = model.page_lines.get(page["page_index"])
+        if not lines or page.get("mode") == "VISION":
+            yield page
+            continue
+        text, removed = strip_page_text(page["text"], lines)
+        model.removed[page["page_index"]] = removed
+        yield {
+            **page,
+            "text": text,
+            "original_text": page.get("original_text", page["text"]),
+            "boilerplate_removed": removed,
+        }
+
+
+__all__ = [
+    "BoilerplateModel",
+    "detect_boilerplate",
+    "restore_page_text",
+    "strip_boilerplate",
+    "strip_page_text",
+]
@@ -0,0 +1,178 @@
+"""
+單份報告的呼叫 / token / 圖片預算，預算不足時逐步降級。
+
+月配額有上限，一份超大報告可能一次用掉好幾天的額度。`ReportBudget` 設定三種上限
+(呼叫次數、prompt + output tokens、送出的圖片 bytes)，擷取流程 (core.pipeline) 每頁送出前先詢問：
+
+1. 預算充足 → 原樣送出
+2. 任一項剩餘比例低於 low_watermark → 不送圖片 (HYBRID 頁只用文字層；VISION 頁沒有文字可用，略過)
+3. 剩餘比例低於 low_watermark / 2 → 不送圖片且以 core.compaction 壓縮文字
+4. 連最精簡的版本都超出剩餘預算 → 不送出，記在 skipped_pages (reason="budget")
+
+送出前以本地估算判斷 (Prompt 固定部分 + 文字 + 圖片 tiles + 預估輸出 tokens)，
+送出後依 usage_scope 收集到的實際用量扣除。配合 `rank_pages_by_relevance` 先處理目標相關度高的頁面，
+預算用完時被略過的是最不可能有目標的頁面；略過的頁面不寫入 journal，加大預算後 `--resume` 即可補跑。
+"""
+
+from __future__ import annotations
+
+import struct
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Collection, Dict, Iterable, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from .compaction import compact_text, count_signals
+from .dictionary import tag_text
+from .planner import DEFAULT_OUTPUT_TOKENS, estimate_image_tokens
+from .prompt import compile_audit_prompt
+
+# 降級步驟名稱 (記在 degraded_pages)
+DROP_IMAGES = "drop_images"
+COMPACT_TEXT = "compact_text"
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _png_size(data: bytes) -> Tuple[int, int]:
+    """由 PNG IHDR 讀出寬高，不解碼圖片；無法辨識時視為單一 tile。"""
+    if data[:8] == _PNG_SIGNATURE and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    return 0, 0
+
+
+@dataclass
+class ReportBudget:
+    """None 代表該項不限制。spent_* 為目前已用量 (實際值)。"""
+
+    max_calls: Optional[int] = None
+    max_tokens: Optional[int] = None
+    max_image_bytes: Optional[int] = None
+    low_watermark: float = 0.3
+    spent_calls: int = 0
+    spent_tokens: int = 0
+    spent_image_bytes: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def enabled(self) -> bool:
+        return any(v is not None for v in (self.max_calls, self.max_tokens, self.max_image_bytes))
+
+    def _limits(self) -> List[Tuple[Optional[int], int]]:
+        return [
+            (self.max_calls, self.spent_calls),
+            (self.max_tokens, self.spent_tokens),
+            (self.max_image_bytes, self.spent_image_bytes),
+        ]
+
+    def remaining_ratio(self) -> float:
+        """三項中最吃緊的一項的剩餘比例 (1.0 = 未使用或不限制)。"""
+        with self._lock:
+            ratios = [
+                max(0, limit - spent) / limit if limit else 0.0
+                for limit, spent in self._limits()
+                if limit is not None
+            ]
+        return min(ratios, default=1.0)
+
+    @property
+    def exhausted(self) -> bool:
+        return self.remaining_ratio() <= 0.0
+
+    def _fits(self, calls: int, tokens: int, image_bytes: int) -> bool:
+        with self._lock:
+            return all(
+                limit is None or spent + need <= limit
+                for (limit, spent), need in zip(self._limits(), (calls, tokens, image_bytes))
+            )
+
+    def estimate(self, page: Dict[str, Any], report_year: int) -> Tuple[int, int, int]:
+        """單頁的預估 (呼叫數, tokens, 圖片 bytes)。"""
+        tokens = compile_audit_prompt(report_year).estimate_tokens(page["text"]) + DEFAULT_OUTPUT_TOKENS
+        images = page.get("images") or []
+        tokens += sum(estimate_image_tokens(*_png_size(img)) for img in images)
+        return 1, tokens, sum(len(img) for img in images)
+
+    def plan(
+        self, page: Dict[str, Any], report_year: int
+    ) -> Optional[Tuple[Dict[str, Any], List[str]]]:
+        """
+        回傳 (實際要送出的頁面, 套用的降級步驟)；預算不足以送出時回傳 None。
+        回傳的頁面保留原本的 mode，只替換 images / text。
+        """
+        if not self.enabled:
+            return page, []
+        ratio = self.remaining_ratio()
+        if ratio <= 0.0:
+            return None
+        level = 0 if ratio >= self.low_watermark else 1 if ratio >= self.low_watermark / 2 else 2
+
+        # 由完整到最精簡依序列出可送出的版本：(頁面, 降級步驟, 降級程度)
+        variants: List[Tuple[Dict[str, Any], List[str], int]] = [(page, [], 0)]
+        has_text = page.get("mode") != "VISION" and bool(page["text"].strip())
+        if has_text:
+            if page.get("images"):
+                variants.append(({**page, "images": []}, [DROP_IMAGES], 1))
+            base, steps, _ = variants[-1]
+            compacted = compact_text(base["text"], min_chars=0)
+            if compacted is not base["text"]:
+                variants.append(({**base, "text": compacted}, [*steps, COMPACT_TEXT], 2))
+
+        # 預算吃緊時至少降到對應程度 (沒有圖片 / 無法壓縮的頁面視同已降級)；放不下再往下一級。
+        # VISION 頁沒有文字層，無法降級，只在預算充足時送出
+        start = max((i for i, (_, _, degree) in enumerate(variants) if degree <= level), default=0)
+        if level > 0 and not has_text:
+            return None
+        for variant, steps, _ in variants[start:]:
+            if self._fits(*self.estimate(variant, report_year)):
+                return variant, steps
+        return None
+
+    def charge(self, records: Iterable[Dict[str, Any]]) -> None:
+        """依 usage 紀錄 (core.usage.UsageTracker.records) 扣除實際用量。"""
+        records = list(records)
+        with self._lock:
+            self.spent_calls += len(records)
+            self.spent_tokens += sum(r["prompt_tokens"] + r["output_tokens"] for r in records)
+            self.spent_image_bytes += sum(r["image_bytes"] for r in records)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_calls": self.max_calls,
+                "max_tokens": self.max_tokens,
+                "max_image_bytes": self.max_image_bytes,
+                "spent_calls": self.spent_calls,
+                "spent_tokens": self.spent_tokens,
+                "spent_image_bytes": self.spent_image_bytes,
+            }
+
+
+def page_relevance(text: str) -> int:
+    """目標相關度：字典命中次數 (領域 / 指標 / 範疇) 加上數值脈絡訊號數。"""
+    tags = tag_text(text)
+    return sum(tags.areas.values()) + sum(tags.metrics.values()) + sum(tags.scopes.values()) + count_signals(text)
+
+
+def rank_pages_by_relevance(pdf_path: str, pages: Optional[Collection[int]] = None) -> List[int]:
+    """
+    只讀文字層 (不渲染) 為頁面排序，相關度高的在前；同分依頁碼。
+    沒有文字層的頁面 (掃描頁 / 整頁圖表) 無法判斷，排在最後。
+    """
+    scores: List[Tuple[int, int]] = []
+    with fitz.open(pdf_path) as doc:
+        for i in range(len(doc)):
+            if pages is not None and i not in pages:
+                continue
+            scores.append((-page_relevance(doc[i].get_text()), i))
+    return [i for _, i in sorted(scores)]
+
+
+__all__ = [
+    "COMPACT_TEXT",
+    "DROP_IMAGES",
+    "ReportBudget",
+    "page_relevance",
+    "rank_pages_by_relevance",
+]
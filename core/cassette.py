@@ -0,0 +1,126 @@
+"""
+Gemini 呼叫的錄製 / 重播 (cassette)。
+
+- record：每次真實呼叫後，把「請求指紋 + 回應文字 + token + 延遲」追加寫入 JSONL（副檔名 .gz 時自動 gzip）。
+- replay：依請求指紋回放錄好的回應，不打 API；可選擇照錄製時的延遲 sleep，重現真實吞吐量。
+
+請求指紋 = model 名稱 + 所有文字 part + 圖片 bytes 的 sha256 + generation config，
+因此只要 Prompt、頁面內容或模型設定有任何變動，指紋就會不同（replay 時會直接報錯而不是默默回舊資料）。
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import gzip
+import hashlib
+import json
+import threading
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import IO, Any, Deque, Dict, List, Optional
+
+CASSETTE_MODES = ("record", "replay")
+
+
+class CassetteMissError(KeyError):
+    """replay 模式下找不到對應指紋的錄製回應。"""
+
+
+def _open(path: Path, mode: str) -> IO[str]:
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return path.open(mode, encoding="utf-8")
+
+
+def _config_dict(generation_config: Any) -> Dict[str, Any]:
+    if generation_config is None:
+        return {}
+    if dataclasses.is_dataclass(generation_config):
+        raw = dataclasses.asdict(generation_config)
+    elif isinstance(generation_config, dict):
+        raw = dict(generation_config)
+    else:
+        raw = dict(vars(generation_config))
+    return {k: v for k, v in raw.items() if v is not None}
+
+
+def request_fingerprint(model_name: str, parts: List[Any], generation_config: Any = None) -> str:
+    """計算請求指紋 (sha256 hex)。"""
+    h = hashlib.sha256()
+    h.update(model_name.split("/")[-1].encode("utf-8"))
+    for part in parts:
+        if isinstance(part, dict) and "data" in part:
+            h.update(b"\x00img:")
+            h.update(hashlib.sha256(part["data"]).digest())
+        else:
+            h.update(b"\x00txt:")
+            h.update(str(part).encode("utf-8"))
+    h.update(b"\x00cfg:")
+    h.update(json.dumps(_config_dict(generation_config), sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+class Cassette:
+    """
+    單一錄製檔。
+
+    replay 時同一個指紋若錄了多筆（例如同一頁被呼叫兩次），依錄製順序輪流回放。
+    """
+
+    def __init__(self, path: Path | str, mode: str, *, replay_latency: bool = False) -> None:
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"cassette mode must be one of {CASSETTE_MODES}, got {mode!r}")
+        self.path = Path(path)
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+
+        if mode == "replay":
+            if not self.path.is_file():
+                raise FileNotFoundError(f"找不到 cassette 檔案: {self.path}")
+            with _open(self.path, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        entry = json.loads(line)
+                        self._entries[entry["fp"]].append(entry)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self._entries.values())
+
+    def lookup(self, fp: str) -> Dict[str, Any]:
+        with self._lock:
+            queue = self._entries.get(fp)
+            if not queue:
+                raise CassetteMissError(f"cassette {self.path} 中沒有指紋 {fp[:12]}… 的錄製回應")
+            entry = queue.popleft()
+            queue.append(entry)
+            return entry
+
+    def append(self, fp: str, entry: Dict[str, Any]) -> None:
+        line = json.dumps({"fp": fp, **entry}, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            with _open(self.path, "a") as f:
+                f.write(line + "\n")
+            self._entries[fp].append({"fp": fp, **entry})
+
+
+def open_cassette(
+    path: Optional[str], mode: Optional[str], *, replay_latency: bool = False
+) -> Optional[Cassette]:
+    """path 為空時回傳 None（不錄製也不重播）；mode 預設 replay。"""
+    if not path:
+        return None
+    return Cassette(path, mode or "replay", replay_latency=replay_latency)
+
+
+__all__ = [
+    "CASSETTE_MODES",
+    "Cassette",
+    "CassetteMissError",
+    "open_cassette",
+    "request_fingerprint",
+]
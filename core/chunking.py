@@ -0,0 +1,184 @@
+"""
+把整份報告的 Markdown 切成 token 上限內的多段，各自產生稽核 Prompt。
+
+切點優先順序：
+1. 頁面邊界：MarkItDown (pdfminer) 輸出的分頁字元 `\f`，或 `<!-- Page N -->` 頁碼標記
+2. Markdown 標題行 (`#` 開頭)
+同一段落 (頁 / 標題區塊) 依序合併，直到再加入就會超過上限；單一區塊本身就超過上限時，
+交給 `AuditPrompt.split_content` 壓縮 / 切段。
+
+每段有固定的 chunk id (例如 `2024-C007`)，Prompt 內容開頭標明段落編號與頁碼範圍，
+LLM 回傳的 JSON 可依 chunk id 對回原文。
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import re
+import zipfile
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .prompt import DEFAULT_MAX_PROMPT_TOKENS, compile_audit_prompt, estimate_text_tokens
+
+_PAGE_MARKER = re.compile(r"^<!--\s*Page\s+(\d+)\s*-->\s*$", re.I | re.M)
+_HEADING = re.compile(r"^#{1,6}\s+\S", re.M)
+
+
+@dataclass
+class MarkdownChunk:
+    chunk_id: str
+    index: int
+    text: str
+    first_page: Optional[int] = None
+    last_page: Optional[int] = None
+    heading: str = ""
+
+    @property
+    def pages_label(self) -> str:
+        if self.first_page is None:
+            return ""
+        if self.first_page == self.last_page:
+            return f"p.{self.first_page}"
+        return f"p.{self.first_page}-{self.last_page}"
+
+
+def _split_pages(markdown: str) -> List[Tuple[Optional[int], str]]:
+    """依頁面邊界拆成 (頁碼 1-based, 文字)；沒有任何頁面資訊時頁碼為 None。"""
+    if _PAGE_MARKER.search(markdown):
+        pages: List[Tuple[Optional[int], str]] = []
+        matches = list(_PAGE_MARKER.finditer(markdown))
+        if markdown[: matches[0].start()].strip():
+            pages.append((None, markdown[: matches[0].start()]))
+        for m, nxt in zip(matches, matches[1:] + [None]):
+            end = nxt.start() if nxt is not None else len(markdown)
+            pages.append((int(m.group(1)), markdown[m.end() : end]))
+        return pages
+    if "\f" in markdown:
+        return [(i + 1, page) for i, page in enumerate(markdown.split("\f"))]
+    return [(None, markdown)]
+
+
+def _split_headings(text: str) -> List[str]:
+    starts = [m.start() for m in _HEADING.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    return [text[a:b] for a, b in zip(starts, starts[1:] + [len(text)])]
+
+
+def _first_heading(text: str) -> str:
+    m = _HEADING.search(text)
+    if not m:
+        return ""
+    line_end = text.find("\n", m.start())
+    return text[m.start() : line_end if line_end != -1 else len(text)].lstrip("#").strip()
+
+
+def chunk_header(chunk: MarkdownChunk, total: int) -> str:
+    """放在每段 Prompt 內容開頭的段落說明。"""
+    pages = f", {chunk.pages_label}" if chunk.pages_label else ""
+    return (
+        f"# Report Chunk {chunk.chunk_id} ({chunk.index}/{total}{pages})\n"
+        "This is one part of a longer report; extract only the goals that appear in this part."
+    )
+
+
+def split_markdown(
+    markdown: str,
+    current_year: int,
+    *,
+    max_tokens: int = DEFAULT_MAX_PROMPT_TOKENS,
+) -> List[MarkdownChunk]:
+    """把 Markdown 切成套上 Prompt 後不超過 max_tokens 的多段。"""
+    audit_prompt = compile_audit_prompt(current_year)
+    # 段落說明本身也佔 tokens (chunk id / 頁碼長度固定，取一個上限值)
+    reserved = estimate_text_tokens(
+        chunk_header(MarkdownChunk("0000-C000", 9999, "", 99999, 99999), 9999)
+    ) + 2
+    budget = max_tokens - audit_prompt.prefix_tokens - reserved
+
+    sections: List[Tuple[Optional[int], str]] = []
+    for page_no, page_text in _split_pages(markdown):
+        for section in _split_headings(page_text):
+            if not section.strip():
+                continue
+            if estimate_text_tokens(section) > budget:
+                for piece in audit_prompt.split_content(
+                    section, max_tokens=max_tokens, reserved_tokens=reserved
+                ):
+                    sections.append((page_no, piece))
+            else:
+                sections.append((page_no, section))
+
+    groups: List[List[Tuple[Optional[int], str]]] = []
+    current: List[Tuple[Optional[int], str]] = []
+    current_tokens = 0
+    for page_no, section in sections:
+        tokens = estimate_text_tokens(section) + 1
+        if current and current_tokens + tokens > budget:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append((page_no, section))
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+
+    chunks: List[MarkdownChunk] = []
+    for i, group in enumerate(groups, start=1):
+        text = "\n".join(section.strip("\n") for _, section in group)
+        page_numbers = [p for p, _ in group if p is not None]
+        chunks.append(
+            MarkdownChunk(
+                chunk_id=f"{current_year}-C{i:03d}",
+                index=i,
+                text=text,
+                first_page=min(page_numbers) if page_numbers else None,
+                last_page=max(page_numbers) if page_numbers else None,
+                heading=_first_heading(text),
+            )
+        )
+    return chunks
+
+
+def render_chunk_prompts(chunks: List[MarkdownChunk], current_year: int) -> List[str]:
+    audit_prompt = compile_audit_prompt(current_year)
+    return [
+        audit_prompt.render(f"{chunk_header(chunk, len(chunks))}\n\n{chunk.text}") for chunk in chunks
+    ]
+
+
+def chunk_manifest(chunks: List[MarkdownChunk], prompts: List[str]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "chunk_id": chunk.chunk_id,
+            "file": f"{chunk.chunk_id}.txt",
+            "pages": chunk.pages_label,
+            "heading": chunk.heading,
+            "prompt_tokens": estimate_text_tokens(prompt),
+        }
+        for chunk, prompt in zip(chunks, prompts)
+    ]
+
+
+def build_prompt_zip(chunks: List[MarkdownChunk], prompts: List[str]) -> bytes:
+    """每段一個 `<chunk_id>.txt`，加上 manifest.json (chunk id、頁碼範圍、估算 tokens)。"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for chunk, prompt in zip(chunks, prompts):
+            zf.writestr(f"{chunk.chunk_id}.txt", prompt)
+        zf.writestr(
+            "manifest.json",
+            json.dumps(chunk_manifest(chunks, prompts), ensure_ascii=False, indent=2),
+        )
+    return buffer.getvalue()
+
+
+__all__ = [
+    "MarkdownChunk",
+    "build_prompt_zip",
+    "chunk_header",
+    "chunk_manifest",
+    "render_chunk_prompts",
+    "split_markdown",
+]
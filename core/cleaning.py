@@ -3,6 +3,8 @@ from typing import Any, Optional, Tuple
 
 import pandas as pd
 
+from .dictionary import packaging_scope_code
+
 
 def clean_year(value: Any) -> Optional[int]:
     """將輸入轉換為年份整數 (e.g. '2015' -> 2015)；失敗則回傳 None。"""
@@ -52,8 +54,9 @@ def clean_value(value: Any) -> Tuple[Optional[float], bool, bool]:
         else:
             # 一般格式 extraction
             # 尋找字串中「第一個」符合數值格式的部分
+            # (千分位寫法需至少一組 ",ddd"，否則 "2021" 會只取到前三位 "202")
             extract_pattern = (
-                r"(?:^|[\s\(\[])([-+]?(?:\d{1,3}(?:,\d{3})*|\d+)(?:\.\d+)?)"
+                r"(?:^|[\s\(\[])([-+]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?)"
             )
             match = re.search(extract_pattern, temp_str)
 
@@ -74,18 +77,7 @@ def clean_value(value: Any) -> Tuple[Optional[float], bool, bool]:
 
 
 def normalize_packaging_scope(scope: str) -> str:
-    """標準化包裝相關 Scope 字串。"""
-    s = scope.lower().strip()
-
-    if "virgin" in s and "plastic" in s:
-        return "virgin_plastic_absolute"
-
-    if "recycled" in s:
-        return "recycled_content"
-
-    if "reusable" in s or "recyclable" in s or "compostable" in s:
-        return "rrc_packaging"
-
-    return "packaging_general"
+    """標準化包裝相關 Scope 字串（依 core.dictionary 中 Packaging 各指標的 scope_match 與 scope_code）。"""
+    return packaging_scope_code(scope)
 
 
@@ -0,0 +1,181 @@
+"""
+數值脈絡視窗 (numeric-context windowing)：縮短送給 LLM 的頁面文字。
+
+敘事型頁面常常 3,000 字元裡只有一句目標。壓縮後只保留：
+- 含年份、百分比、數量 / 單位、基準年用語或 ESG 指標詞彙的句子
+- 上述句子前後 `window` 句 (保留主詞 / 註腳等上下文)
+- 標題行 (短、無句號的行)
+被省略的連續內容以 `[...]` 標示，讓模型知道中間有跳過。
+
+較短的頁面 (< min_chars) 原樣保留；整頁都沒有命中時也原樣保留，避免把目標整個刪掉。
+`CompactionStats` 累計壓縮前後字元數，CLI / JSON 頁籤據此回報壓縮比例。
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+_YEAR = r"\b(?:19|20)\d{2}\b"
+_PERCENT = r"\d+(?:[.,]\d+)?\s*(?:%|％|percent\b|個百分點)"
+_QUANTITY = (
+    r"\d[\d,.]*\s*(?:萬|億|千)?\s*"
+    r"(?:t\b|tonnes?|tons?|kt|mt|tco2e?|co2e|kwh|mwh|gwh|gj|tj|m3|m³|liters?|litres?|kg|"
+    r"hectares?|acres?|million|billion|公噸|噸|度|公升|立方公尺|公頃|萬噸)"
+)
+_BASELINE = (
+    r"baseline|base year|compared (?:to|with)|versus|\bvs\.?|from a \d{4}|"
+    r"基準年|基期|相較|較\s*\d{4}"
+)
+# 對應 core.prompt 標準化字典中的指標用語
+_METRIC_TERMS = (
+    r"net[- ]zero|carbon neutral|emission|greenhouse|ghg|scope\s*[123]|renewable|energy efficiency|"
+    r"recycl|virgin plastic|packaging|reusable|compostable|landfill|water|replenish|"
+    r"regenerative|sustainabl[ey] sourc|gender|diversity|safety|human rights|target|goal|commit|"
+    r"淨零|碳中和|排放|溫室氣體|再生能源|能源效率|回收|再生料|原生塑膠|包裝|掩埋|用水|回補|"
+    r"再生農業|永續採購|性別|安全|人權|目標|承諾"
+)
+_TARGET_TERMS = r"target|goal|commit|pledge|目標|承諾"
+_SIGNAL = re.compile("|".join(f"(?:{p})" for p in (_YEAR, _PERCENT, _QUANTITY, _BASELINE, _METRIC_TERMS)), re.I)
+# 明確的目標訊號：不含單獨的年份與一般指標詞彙 (頁首 / 頁尾常見的 "2023 永續報告書" 不算)
+_GOAL_SIGNAL = re.compile("|".join(f"(?:{p})" for p in (_PERCENT, _QUANTITY, _BASELINE, _TARGET_TERMS)), re.I)
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？；;])\s+|(?<=[。！？；])")
+_OMITTED = "[...]"
+
+
+def _is_heading(line: str) -> bool:
+    stripped = line.strip()
+    if not stripped or len(stripped) > 80:
+        return False
+    if stripped[-1] in ".。,，;；:：":
+        return False
+    return (
+        stripped.isupper()
+        or stripped.istitle()
+        or bool(re.match(r"^(?:\d+(?:\.\d+)*|[IVX]+\.|第.{1,3}[章節])\s*\S", stripped))
+        or stripped.startswith("#")
+    )
+
+
+def _segments(text: str) -> List[Tuple[str, bool]]:
+    """拆成 (片段, 是否為標題)：段落內再依句號斷句，標題行單獨成段。"""
+    segments: List[Tuple[str, bool]] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        buffer: List[str] = []
+        for line in paragraph.split("\n"):
+            if _is_heading(line):
+                if buffer:
+                    segments.extend((s, False) for s in _sentences(" ".join(buffer)))
+                    buffer = []
+                segments.append((line.strip(), True))
+            elif line.strip():
+                buffer.append(line.strip())
+        if buffer:
+            segments.extend((s, False) for s in _sentences(" ".join(buffer)))
+    return segments
+
+
+def _sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_END.split(text) if s and s.strip()]
+
+
+def count_signals(text: str) -> int:
+    """文字中年份、百分比、數量、基準年用語與指標詞彙出現的次數 (目標相關度的粗略指標)。"""
+    return sum(1 for _ in _SIGNAL.finditer(text or ""))
+
+
+def has_goal_signal(text: str) -> bool:
+    """是否含百分比、數量 / 單位、基準年用語或目標用語；單獨的年份不算。"""
+    return bool(_GOAL_SIGNAL.search(text or ""))
+
+
+def compact_text(text: str, *, window: int = 1, min_chars: int = 1200) -> str:
+    """
+    回傳壓縮後的文字；不需要或無法壓縮時回傳原文 (同一個物件)。
+    只有實際略過至少一個片段 (輸出 `[...]`) 才算壓縮，單純合併斷行、去除空白不算。
+    """
+    if len(text) < min_chars:
+        return text
+    segments = _segments(text)
+    hits = [i for i, (seg, heading) in enumerate(segments) if not heading and _SIGNAL.search(seg)]
+    if not hits:
+        return text
+
+    keep = {i for i, (_, heading) in enumerate(segments) if heading}
+    for i in hits:
+        keep.update(range(max(0, i - window), min(len(segments), i + window + 1)))
+
+    lines: List[str] = []
+    skipped = False
+    for i, (seg, _) in enumerate(segments):
+        if i in keep:
+            if skipped and lines:
+                lines.append(_OMITTED)
+            lines.append(seg)
+            skipped = False
+        else:
+            skipped = True
+    if skipped:
+        lines.append(_OMITTED)
+    if _OMITTED not in lines:
+        return text
+    compacted = "\n".join(lines)
+    return compacted if len(compacted) < len(text) else text
+
+
+@dataclass
+class CompactionStats:
+    original_chars: int = 0
+    compacted_chars: int = 0
+    pages: int = 0
+    compacted_pages: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, before: int, after: int, compacted: bool) -> None:
+        """compacted: compact_text 是否實際略過片段 (回傳的不是原文)。"""
+        with self._lock:
+            self.pages += 1
+            self.original_chars += before
+            self.compacted_chars += after
+            if compacted:
+                self.compacted_pages += 1
+
+    @property
+    def ratio(self) -> float:
+        """壓縮後 / 壓縮前 的字元比例 (1.0 代表沒有縮短)。"""
+        return self.compacted_chars / self.original_chars if self.original_chars else 1.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "pages": self.pages,
+            "compacted_pages": self.compacted_pages,
+            "original_chars": self.original_chars,
+            "compacted_chars": self.compacted_chars,
+            "ratio": round(self.ratio, 3),
+        }
+
+
+def compact_pages(
+    pages: Iterable[Dict[str, Any]],
+    stats: CompactionStats,
+    *,
+    window: int = 1,
+    min_chars: int = 1200,
+) -> Iterator[Dict[str, Any]]:
+    """逐頁壓縮文字 (VISION 頁沒有文字層，原樣通過)；壓縮過的頁面以 `original_text` 保留原文。"""
+    for page in pages:
+        if page.get("mode") == "VISION":
+            yield page
+            continue
+        text = page["text"]
+        compacted = compact_text(text, window=window, min_chars=min_chars)
+        stats.add(len(text), len(compacted), compacted is not text)
+        if compacted is text:
+            yield page
+        else:
+            yield {**page, "text": compacted, "original_text": page.get("original_text", text)}
+
+
+__all__ = ["CompactionStats", "compact_pages", "compact_text", "count_signals", "has_goal_signal"]
@@ -0,0 +1,125 @@
+"""
+跨 Streamlit session 的全域併發上限與公平排隊。
+
+Streamlit 每個使用者 session 在各自的執行緒中執行；若每個 session 各自呼叫 API，
+人一多就會一起撞上配額 (429)，重試又讓情況更糟。
+`FairLimiter` 在整個 process 內限制同時進行中的模型呼叫數，等待中的請求依 session 輪流取得名額 (round-robin)，
+一個 session 送出大量頁面也不會讓其他 session 餓死。
+
+用法:
+
+    limiter = FairLimiter(4)
+    client = GeminiClient(limiter=limiter)          # 整個 process 共用
+    with client_session(session_id):                # 標記目前執行緒屬於哪個 session
+        extract_goals_from_pages(client, pages, year)
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator
+
+_current_session: ContextVar[str] = ContextVar("gemini_client_session", default="default")
+
+
+@contextmanager
+def client_session(session_id: str) -> Iterator[None]:
+    """在此區塊內發出的模型呼叫都歸屬於 session_id (用於公平排隊)。"""
+    token = _current_session.set(session_id)
+    try:
+        yield
+    finally:
+        _current_session.reset(token)
+
+
+def current_session() -> str:
+    return _current_session.get()
+
+
+class FairLimiter:
+    def __init__(self, max_concurrent: int) -> None:
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be >= 1")
+        self.max_concurrent = max_concurrent
+        self._cond = threading.Condition()
+        self._active = 0
+        # session -> 等待中的 ticket；取得名額後 session 移到最後，達成輪流
+        self._queues: "OrderedDict[str, Deque[object]]" = OrderedDict()
+        self._grants = 0
+        self._wait_s = 0.0
+        self._max_wait_s = 0.0
+
+    def _is_next(self, ticket: object) -> bool:
+        if self._active >= self.max_concurrent:
+            return False
+        for queue in self._queues.values():
+            return queue[0] is ticket
+        return False
+
+    @contextmanager
+    def slot(self, session: str | None = None) -> Iterator[None]:
+        """取得一個呼叫名額；session 未指定時使用 client_session() 設定的值。"""
+        self.acquire(session)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self, session: str | None = None) -> None:
+        """
+        依 session 輪流等待並取得一個名額，取得後須呼叫 release()。
+        名額需跟著某個背景請求 (例如 Future 完成時才釋放) 而不是程式區塊時使用；其餘情況用 slot()。
+        """
+        session = session or current_session()
+        ticket = object()
+        start = time.perf_counter()
+        with self._cond:
+            self._queues.setdefault(session, deque()).append(ticket)
+            while not self._is_next(ticket):
+                self._cond.wait()
+            queue = self._queues.pop(session)
+            queue.popleft()
+            if queue:
+                self._queues[session] = queue
+            self._active += 1
+            waited = time.perf_counter() - start
+            self._grants += 1
+            self._wait_s += waited
+            self._max_wait_s = max(self._max_wait_s, waited)
+            # 還有空位時讓下一個等待者也能繼續
+            self._cond.notify_all()
+
+    def try_acquire(self) -> bool:
+        """
+        不等待地取得一個名額 (例如 hedged request 的備援請求)：已滿或有人在排隊時回傳 False，
+        不插隊。取得後須呼叫 release()。
+        """
+        with self._cond:
+            if self._active >= self.max_concurrent or any(self._queues.values()):
+                return False
+            self._active += 1
+            self._grants += 1
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "active": self._active,
+                "waiting": {s: len(q) for s, q in self._queues.items()},
+                "grants": self._grants,
+                "avg_wait_s": round(self._wait_s / self._grants, 3) if self._grants else 0.0,
+                "max_wait_s": round(self._max_wait_s, 3),
+            }
+
+
+__all__ = ["FairLimiter", "client_session", "current_session"]
@@ -0,0 +1,41 @@
+"""
+同一次執行內的重複頁面去重。
+
+報告常把同一張目標總表放在摘要與附錄各一次，章節分隔頁也常一模一樣；
+這些頁面只需要送出一次請求，結果再複製給其他相同內容的頁面。
+
+`page_fingerprint` 以「正規化後的頁面文字 + 頁面模式 + 各圖片 sha256」計算指紋：
+- 連續空白與換行壓成一個空白，忽略換行 / 縮排差異
+- 只有數字的行 (頁碼) 會被移除，避免頁碼不同導致兩張相同的表格被視為不同
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import Any, Dict
+
+_PAGE_NUMBER_LINE = re.compile(r"^\s*(?:page\s*)?\d{1,4}(?:\s*/\s*\d{1,4})?\s*$", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_page_text(text: str) -> str:
+    lines = [line for line in (text or "").splitlines() if not _PAGE_NUMBER_LINE.match(line)]
+    return _WHITESPACE.sub(" ", " ".join(lines)).strip()
+
+
+def page_fingerprint(page: Dict[str, Any]) -> str:
+    """`extract_mixed_content` 單頁輸出的內容指紋；只有送出的 payload 完全相同時才會相等。"""
+    h = hashlib.sha256()
+    h.update(page.get("mode", "TEXT").encode("utf-8"))
+    h.update(b"\0")
+    h.update(normalize_page_text(page.get("text", "")).encode("utf-8"))
+    # 只有 HYBRID / VISION 頁會把圖片送出，TEXT 頁的圖片不影響請求內容
+    if page.get("mode") in ("HYBRID", "VISION"):
+        for img in page.get("images") or []:
+            h.update(b"\0")
+            h.update(hashlib.sha256(img).digest())
+    return h.hexdigest()
+
+
+__all__ = ["normalize_page_text", "page_fingerprint"]
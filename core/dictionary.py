@@ -0,0 +1,314 @@
+"""
+標準化 ESG 字典 (Focus Area / Metric / Scope) 的資料結構與本地比對器。
+
+`ESG_DICTIONARY` 是唯一的字典來源：
+- `render_dictionary_section()` 產生 Prompt 中的「Standardized ESG Dictionary」段落
+  (不指定領域時與原本手寫的段落逐字相同)；指定領域時只列出這些領域，縮短 Prompt。
+- `DictionaryMatcher` 把所有中英文同義詞編成單一 regex，一次掃描即可標記文字中出現的
+  領域 / 指標 / 範疇，用於頁面預先標記 (路由、縮小字典段落) 與 Scope 正規化。
+"""
+
+from __future__ import annotations
+
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 每個 metric / scope 的 synonyms 皆為小寫比對；英文同義詞以單字邊界比對，中文直接比對
+ESG_DICTIONARY: List[Dict[str, Any]] = [
+    {
+        "name": "Climate",
+        "zh": "氣候變遷",
+        "emoji": "🌍",
+        "synonyms": ["climate", "氣候"],
+        "metrics": [
+            {
+                "name": "Absolute GHG Reduction",
+                "description": "溫室氣體絕對減量",
+                "synonyms": [
+                    "ghg", "greenhouse gas", "emission", "emissions", "carbon reduction",
+                    "co2", "co2e", "tco2e", "溫室氣體", "碳排", "排放", "減碳",
+                ],
+            },
+            {
+                "name": "Net Zero",
+                "description": "淨零排放",
+                "synonyms": ["net zero", "net-zero", "carbon neutral", "carbon neutrality", "淨零", "碳中和"],
+            },
+            {
+                "name": "Renewable Energy",
+                "description": "再生能源比例",
+                "synonyms": [
+                    "renewable energy", "renewable electricity", "renewables", "solar", "wind power",
+                    "re100", "再生能源", "再生電力", "綠電", "太陽能", "風電",
+                ],
+            },
+            {
+                "name": "Energy Efficiency",
+                "description": "能源使用效率",
+                "synonyms": [
+                    "energy efficiency", "energy intensity", "energy consumption",
+                    "能源效率", "能源密集度", "節能", "能源使用", "用電",
+                ],
+            },
+        ],
+        "scopes": [
+            {"name": "Scope 1+2", "synonyms": ["scope 1 and 2", "scope 1+2", "scope 1 & 2", "scopes 1 and 2", "範疇一二", "範疇1+2"]},
+            {"name": "Scope 3", "synonyms": ["scope 3", "範疇三", "範疇3"]},
+            {"name": "Value Chain", "synonyms": ["value chain", "價值鏈"]},
+            {"name": "Global Operations", "synonyms": ["global operations", "全球營運"]},
+        ],
+        "rules": [
+            "當目標涉及 Scope 1 與 Scope 2 時，Output Scope 欄位請**嚴格**填入 `Scope 1+2`。",
+            "**禁止**在 Scope 欄位加入地區、子公司或括號註記 (例如：**不要寫** `Scope 1+2 (Taiwan Operations)` "
+            "或 `Scope 1+2 (Company only)`，一律刪除括號內容，只保留 `Scope 1+2`)。",
+        ],
+    },
+    {
+        "name": "Packaging",
+        "zh": "包裝與循環經濟",
+        "emoji": "📦",
+        "synonyms": ["packaging", "circular economy", "包裝", "循環經濟"],
+        "metrics": [
+            {
+                "name": "Recycled Content",
+                "description": "再生料使用比例, e.g., rPET",
+                "scope_code": "recycled_content",
+                "scope_match": [["recycled"]],
+                "synonyms": ["recycled content", "recycled", "rpet", "再生料", "再生塑膠", "回收料"],
+            },
+            {
+                "name": "Virgin Plastic Reduction",
+                "description": "原生塑膠減量",
+                "scope_code": "virgin_plastic_absolute",
+                "scope_match": [["virgin", "plastic"]],
+                "synonyms": ["virgin plastic", "virgin plastics", "原生塑膠"],
+            },
+            {
+                "name": "Packaging Design",
+                "description": "可回收/可堆肥設計, e.g., Recyclability",
+                "scope_code": "rrc_packaging",
+                "scope_match": [["recyclable"], ["compostable"]],
+                "synonyms": ["recyclable", "recyclability", "compostable", "可回收", "可堆肥"],
+            },
+            {
+                "name": "Reuse Models",
+                "description": "重複使用模式/減量",
+                "scope_code": "rrc_packaging",
+                "scope_match": [["reusable"]],
+                "synonyms": ["reusable", "reuse", "refill", "重複使用", "循環使用"],
+            },
+            {
+                "name": "Waste to Landfill",
+                "description": "廢棄物掩埋率",
+                "synonyms": ["landfill", "zero waste", "掩埋", "零廢棄"],
+            },
+        ],
+        "scopes": [
+            {"name": "Plastic Packaging", "synonyms": ["plastic packaging", "塑膠包裝"]},
+            {"name": "Beverage Containers", "synonyms": ["beverage container", "beverage containers", "bottles", "飲料容器"]},
+            {"name": "Food Packaging", "synonyms": ["food packaging", "食品包裝"]},
+            {"name": "Global Portfolio", "synonyms": ["global portfolio"]},
+        ],
+        # normalize_packaging_scope 的比對優先順序 (與原本 if 判斷的順序一致)。
+        # Scope 代碼只依各指標的 scope_match (子字串，組內須全部出現) 判斷，不使用 synonyms，
+        # 結果與原本的 if 判斷相同：例如 "virgin fiber" 仍為 packaging_general、"rPET bottles" 不算 recycled_content
+        "scope_code_priority": ["virgin_plastic_absolute", "recycled_content", "rrc_packaging"],
+        "default_scope_code": "packaging_general",
+    },
+    {
+        "name": "Water",
+        "zh": "水資源",
+        "emoji": "💧",
+        "synonyms": ["water", "水資源", "用水"],
+        "metrics": [
+            {
+                "name": "Water Replenishment",
+                "description": "水資源回補",
+                "synonyms": ["replenish", "replenishment", "water balance", "water neutral", "回補", "水平衡"],
+            },
+            {
+                "name": "Water Use Efficiency",
+                "description": "用水效率/強度",
+                "synonyms": ["water use efficiency", "water efficiency", "water intensity", "water use ratio", "用水效率", "用水強度", "節水"],
+            },
+        ],
+        "scopes": [
+            {"name": "High Water-Risk Areas", "synonyms": ["high water-risk", "high water risk", "water-stressed", "water stressed", "缺水地區", "高水風險"]},
+            {"name": "Manufacturing Operations", "synonyms": ["manufacturing operations", "manufacturing sites", "製造據點", "廠區"]},
+        ],
+    },
+    {
+        "name": "Agriculture",
+        "zh": "永續農業",
+        "emoji": "🌱",
+        "synonyms": ["agriculture", "farming", "農業"],
+        "metrics": [
+            {
+                "name": "Regenerative Agriculture",
+                "description": "再生農業採用面積",
+                "synonyms": ["regenerative agriculture", "regenerative farming", "regenerative", "再生農業"],
+            },
+            {
+                "name": "Sustainably Sourced",
+                "description": "永續採購比例",
+                "synonyms": ["sustainably sourced", "sustainable sourcing", "responsibly sourced", "certified sustainable", "永續採購", "永續來源"],
+            },
+        ],
+        "scopes": [
+            {"name": "Key Ingredients", "synonyms": ["key ingredients", "key crops", "主要原料"]},
+            {"name": "Direct Supply Chain", "synonyms": ["direct supply chain", "direct suppliers", "直接供應鏈"]},
+        ],
+    },
+    {
+        "name": "Human Rights & Social",
+        "zh": "人權與社會",
+        "emoji": "👥",
+        "synonyms": ["human rights", "social", "人權", "社會"],
+        "metrics": [
+            {
+                "name": "Gender Diversity",
+                "description": "性別多樣性/管理層比例",
+                "synonyms": ["gender", "women in", "female", "diversity", "性別", "女性", "多元"],
+            },
+            {
+                "name": "Safety",
+                "description": "工傷率/安全事故",
+                "synonyms": ["safety", "injury", "injuries", "ltir", "trir", "fatalities", "職業安全", "工傷", "失能傷害"],
+            },
+            {
+                "name": "Human Rights Audit",
+                "description": "人權盡職調查",
+                "synonyms": ["human rights due diligence", "human rights audit", "social audit", "人權盡職調查", "人權稽核"],
+            },
+        ],
+        "scopes": [
+            {"name": "Global Workforce", "synonyms": ["global workforce", "all employees", "全體員工"]},
+            {"name": "Management Roles", "synonyms": ["management roles", "management positions", "leadership", "管理職", "主管"]},
+            {"name": "Tier 1 Suppliers", "synonyms": ["tier 1 suppliers", "tier 1 supplier", "tier-1", "一階供應商"]},
+        ],
+    },
+]
+
+FOCUS_AREAS: Tuple[str, ...] = tuple(area["name"] for area in ESG_DICTIONARY)
+_AREAS_BY_NAME = {area["name"]: area for area in ESG_DICTIONARY}
+
+
+def render_dictionary_section(focus_areas: Optional[Sequence[str]] = None) -> str:
+    """
+    Prompt 的字典段落。focus_areas 為 None 時列出全部領域 (與 PROMPT_VERSION 對應的原始段落相同)，
+    否則依字典順序只列出指定的領域並重新編號。
+    """
+    areas = [a for a in ESG_DICTIONARY if focus_areas is None or a["name"] in focus_areas]
+    blocks: List[str] = []
+    for n, area in enumerate(areas, start=1):
+        lines = [
+            f"### {n}. {area['emoji']} Focus Area: {area['name']} ({area['zh']})",
+            "   - **Target Metrics**: ",
+        ]
+        lines += [f"     - `{m['name']}` ({m['description']})" for m in area["metrics"]]
+        lines.append("   - **Typical Scopes**: " + ", ".join(f"`{s['name']}`" for s in area["scopes"]))
+        if area.get("rules"):
+            lines.append("   - **Strict Formatting Rule**: ")
+            lines += [f"     - {rule}" for rule in area["rules"]]
+        blocks.append("\n".join(lines))
+    return "## 📚 Standardized ESG Dictionary (標準化字典)\n\n" + "\n\n".join(blocks)
+
+
+@dataclass
+class DictionaryTags:
+    """一段文字命中的字典項目與次數。"""
+
+    areas: Counter = field(default_factory=Counter)
+    metrics: Counter = field(default_factory=Counter)
+    scopes: Counter = field(default_factory=Counter)
+
+    def __bool__(self) -> bool:
+        return bool(self.areas)
+
+    def focus_areas(self) -> Tuple[str, ...]:
+        """命中的領域，依字典順序 (可直接作為 compile_audit_prompt 的 focus_areas)。"""
+        return tuple(a for a in FOCUS_AREAS if a in self.areas)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "areas": dict(self.areas),
+            "metrics": dict(self.metrics),
+            "scopes": dict(self.scopes),
+        }
+
+
+class DictionaryMatcher:
+    """所有同義詞編成單一 alternation regex (長詞優先)，一次掃描標記整段文字。"""
+
+    def __init__(self, dictionary: Iterable[Dict[str, Any]] = ESG_DICTIONARY) -> None:
+        # 同義詞 -> [(kind, area, name), ...]
+        self._targets: Dict[str, List[Tuple[str, str, str]]] = {}
+        for area in dictionary:
+            for syn in area.get("synonyms", []):
+                self._add(syn, ("area", area["name"], area["name"]))
+            for kind in ("metric", "scope"):
+                for entry in area.get(f"{kind}s", []):
+                    for syn in [entry["name"], *entry.get("synonyms", [])]:
+                        self._add(syn, (kind, area["name"], entry["name"]))
+        alternatives = []
+        for syn in sorted(self._targets, key=len, reverse=True):
+            pattern = re.escape(syn).replace(r"\ ", r"\s+")
+            if syn.isascii():
+                pattern = rf"(?<![a-z0-9]){pattern}(?![a-z0-9])"
+            alternatives.append(pattern)
+        self._pattern = re.compile("|".join(alternatives), re.I)
+
+    def _add(self, synonym: str, target: Tuple[str, str, str]) -> None:
+        key = synonym.lower()
+        if target not in self._targets.setdefault(key, []):
+            self._targets[key].append(target)
+
+    def tag(self, text: str) -> DictionaryTags:
+        tags = DictionaryTags()
+        for m in self._pattern.finditer(text or ""):
+            for kind, area, name in self._targets.get(re.sub(r"\s+", " ", m.group(0).lower()), []):
+                tags.areas[area] += 1
+                if kind == "metric":
+                    tags.metrics[name] += 1
+                elif kind == "scope":
+                    tags.scopes[name] += 1
+        return tags
+
+
+@lru_cache(maxsize=1)
+def default_matcher() -> DictionaryMatcher:
+    return DictionaryMatcher()
+
+
+def tag_text(text: str) -> DictionaryTags:
+    return default_matcher().tag(text)
+
+
+def packaging_scope_code(scope: str) -> str:
+    """依 Packaging 各指標的 scope_match 與 scope_code_priority，把 Scope 字串正規化成代碼。"""
+    area = _AREAS_BY_NAME["Packaging"]
+    s = scope.lower().strip()
+    matched = {
+        m["scope_code"]
+        for m in area["metrics"]
+        if any(all(term in s for term in group) for group in m.get("scope_match", []))
+    }
+    for code in area["scope_code_priority"]:
+        if code in matched:
+            return code
+    return area["default_scope_code"]
+
+
+__all__ = [
+    "DictionaryMatcher",
+    "DictionaryTags",
+    "ESG_DICTIONARY",
+    "FOCUS_AREAS",
+    "default_matcher",
+    "packaging_scope_code",
+    "render_dictionary_section",
+    "tag_text",
+]
@@ -1,12 +1,210 @@
-import json
 import os
-from typing import Any, Dict, List
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
 
 import google.generativeai as genai
 from dotenv import load_dotenv
+from google.api_core import exceptions as google_exceptions
+
+from .cassette import open_cassette, request_fingerprint
+from .concurrency import FairLimiter
+from .dictionary import tag_text
+from .hedging import HedgePolicy
 
 # 假設 prompt.py 在同一層目錄或正確的 package 下
-from .prompt import get_audit_prompt
+from .prompt import (
+    DEFAULT_MAX_PROMPT_TOKENS,
+    GOAL_RESPONSE_SCHEMA,
+    compile_audit_prompt,
+    estimate_text_tokens,
+)
+from .schema import (
+    GoalResponseError,
+    parse_goal_response,
+    salvage_goal_items,
+    validate_goal_items,
+)
+from .usage import UsageTracker
+
+# 可重試的暫時性錯誤 (配額 / 服務忙碌 / 逾時)
+_RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+IMAGE_STRATEGIES = ("inline", "describe")
+
+
+@dataclass
+class ModelReply:
+    """一次模型呼叫的正規化結果（真實呼叫與 cassette 重播共用）。"""
+
+    text: str
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    finish_reason: str = "STOP"
+    latency_s: float = 0.0
+
+
+@dataclass
+class PageExtraction:
+    """單頁擷取結果：通過驗證的目標 + 驗證過程發現的問題。"""
+
+    items: List[Dict[str, Any]] = field(default_factory=list)
+    problems: List[str] = field(default_factory=list)
+    model: str = ""
+    # cascade 時被升級到較強模型的原因 (validation / low_confidence / chart_data / invalid_output)
+    escalation_reason: str = ""
+    # Prompt 超過 max_prompt_tokens 而切成的請求數
+    prompt_chunks: int = 1
+
+
+def _reply_from_response(response: Any, latency_s: float) -> ModelReply:
+    try:
+        text = response.text or ""
+    except ValueError:
+        # 被安全機制擋下或沒有任何 candidate 時 .text 會丟 ValueError
+        text = ""
+    finish_reason = "STOP"
+    candidates = getattr(response, "candidates", None) or []
+    if candidates:
+        reason = getattr(candidates[0], "finish_reason", None)
+        finish_reason = getattr(reason, "name", None) or str(reason or "STOP")
+    meta = getattr(response, "usage_metadata", None)
+    return ModelReply(
+        text=text,
+        prompt_tokens=getattr(meta, "prompt_token_count", 0) or 0,
+        output_tokens=getattr(meta, "candidates_token_count", 0) or 0,
+        finish_reason=finish_reason,
+        latency_s=latency_s,
+    )
+
+
+def _page_content(
+    page_text: str, *, use_images: bool, inline_images: bool, image_desc: str, hint: str
+) -> str:
+    """警告 + 頁面文字 + 圖表描述 + 前一年差異提示，填入 Prompt 樣板的內容區。"""
+    merged_content_parts: List[str] = []
+
+    # [系統警告]：告訴主模型不要太相信原始文字的順序
+    if inline_images:
+        merged_content_parts.append(
+            "⚠️ [SYSTEM WARNING]: The rendered page image(s) are attached to this request. "
+            "The PDF text layer below may be jumbled or missing (scanned pages). "
+            "Read charts, tables and trend lines directly from the image(s) and PRIORITIZE them "
+            "for any trend data, year-value alignment, or chart interpretation."
+        )
+    elif use_images:
+        merged_content_parts.append(
+            "⚠️ [SYSTEM WARNING]: This page contains Charts/Graphs with potentially jumbled text layers. "
+            "Please PRIORITIZE the information in the '# Image-derived Details' section below "
+            "for any trend data, year-value alignment, or chart interpretation."
+        )
+
+    merged_content_parts.append(f"# Raw Page Text\n{page_text.strip()}")
+
+    if image_desc:
+        merged_content_parts.append(
+            f"\n# Image-derived Details (High Confidence for Charts)\n{image_desc.strip()}"
+        )
+
+    if hint:
+        merged_content_parts.append(
+            "\n# Changes Since Prior Year's Report (- prior / + current)\n"
+            "This page closely matches last year's report. Values on the changed lines below "
+            "are the updated figures; make sure they are reflected in the extracted goals.\n"
+            f"{hint.strip()}"
+        )
+
+    return "\n".join(merged_content_parts)
+
+
+def build_page_parts(
+    *,
+    page_text: str,
+    images: List[bytes],
+    current_year: int,
+    use_images: bool,
+    inline_images: bool,
+    image_desc: str = "",
+    hint: str = "",
+    focus_areas: Optional[Tuple[str, ...]] = None,
+) -> List[Any]:
+    """
+    組出單頁擷取請求的 parts：[完整 Prompt, (inline 時) 頁面截圖...]。
+    GeminiClient 與批次模式 (core/batch.py) 共用，確保兩邊送出的內容一致。
+    hint: 與前一年相似頁面的文字差異 (core.reuse.diff_hint)，提醒模型注意更新過的數字。
+    focus_areas: Prompt 字典段落只列出這些領域 (core.dictionary)；None 代表完整字典。
+    """
+    final_content = _page_content(
+        page_text, use_images=use_images, inline_images=inline_images, image_desc=image_desc, hint=hint
+    )
+    # 靜態部分已預先展開 (core.prompt.compile_audit_prompt)，這裡只接上本頁內容
+    prompt = compile_audit_prompt(current_year, focus_areas).render(final_content)
+
+    parts: List[Any] = [prompt]
+    if inline_images:
+        parts.extend({"mime_type": "image/png", "data": img} for img in images)
+    return parts
+
+
+def build_page_requests(
+    *,
+    page_text: str,
+    images: List[bytes],
+    current_year: int,
+    use_images: bool,
+    inline_images: bool,
+    image_desc: str = "",
+    hint: str = "",
+    max_prompt_tokens: Optional[int] = None,
+    focus_areas: Optional[Tuple[str, ...]] = None,
+) -> List[List[Any]]:
+    """
+    與 build_page_parts 相同，但 Prompt 估算超過 max_prompt_tokens 時，
+    頁面文字先壓縮、仍超過再切段 (AuditPrompt.split_content)，回傳多個請求的 parts。
+    切段時圖片只附在第一段，避免重複送出截圖。
+    """
+    if max_prompt_tokens is None:
+        return [
+            build_page_parts(
+                page_text=page_text,
+                images=images,
+                current_year=current_year,
+                use_images=use_images,
+                inline_images=inline_images,
+                image_desc=image_desc,
+                hint=hint,
+                focus_areas=focus_areas,
+            )
+        ]
+    overhead = _page_content(
+        "", use_images=use_images, inline_images=inline_images, image_desc=image_desc, hint=hint
+    )
+    pieces = compile_audit_prompt(current_year, focus_areas).split_content(
+        page_text,
+        max_tokens=max_prompt_tokens,
+        reserved_tokens=estimate_text_tokens(overhead),
+    )
+    return [
+        build_page_parts(
+            page_text=piece,
+            images=images if i == 0 else [],
+            current_year=current_year,
+            use_images=use_images and (i == 0 or not inline_images),
+            inline_images=inline_images and i == 0,
+            image_desc=image_desc,
+            hint=hint,
+            focus_areas=focus_areas,
+        )
+        for i, piece in enumerate(pieces)
+    ]
+
 
 class GeminiClient:
     """
@@ -18,13 +216,82 @@ class GeminiClient:
         model_name: str = "gemini-2.5-flash-lite",
         vision_model_name: str | None = None,
         api_key: str | None = None,
+        max_retries: int = 3,
+        retry_backoff: float = 2.0,
+        image_strategy: str = "inline",
+        max_continuations: int = 2,
+        api_endpoint: str | None = None,
+        cassette_path: str | None = None,
+        cassette_mode: str | None = None,
+        replay_latency: bool | None = None,
+        escalation_model_name: str | None = None,
+        confidence_threshold: float = 0.7,
+        hedge_percentile: float | None = None,
+        hedge_budget: float = 0.1,
+        limiter: FairLimiter | None = None,
+        max_prompt_tokens: int | None = DEFAULT_MAX_PROMPT_TOKENS,
+        focused_dictionary: bool = False,
+        track_usage: bool = True,
     ) -> None:
+        """
+        track_usage:
+            False 時 self.usage 不保留紀錄，只記到呼叫端的 usage_scope() (core/usage.py)；
+            由 Streamlit 所有 session 共用、與 process 同壽命的 client 應設為 False，避免記憶體無限增長。
+        focused_dictionary:
+            以 core.dictionary 先標記頁面文字，Prompt 的字典段落只列出命中的領域 (沒有命中時仍用完整字典)。
+        max_prompt_tokens:
+            單次請求 Prompt 的估算 token 上限 (預設讀環境變數 GEMINI_MAX_PROMPT_TOKENS)。
+            超過時頁面文字先做數值脈絡壓縮，仍超過再切成多個請求，結果合併；None 代表不限制。
+        limiter:
+            process 內共用的併發上限 (core/concurrency.py)。多個 Streamlit session 共用同一個 client 時，
+            每次實際送出請求前先取得名額，依 session 輪流排隊；重試的退避等待不佔名額。
+            hedged request 的備援請求另佔一個名額，沒有空位時不送備援。
+        hedge_percentile / hedge_budget:
+            hedged requests。呼叫超過最近延遲的第 hedge_percentile 百分位數仍未回應時，
+            送出相同的備援請求並採用先回來的結果；備援數量上限為總呼叫數 × hedge_budget。
+        escalation_model_name / confidence_threshold:
+            cascade 模式。每頁先交給 model_name (快速模型)；若輸出未通過 Schema 驗證、
+            任一筆 Confidence 低於門檻，或內容來自圖表 (有圖片且抽出 Progress_History)，
+            就以 escalation_model_name (較強模型) 重跑該頁並採用其結果。
+        cassette_path / cassette_mode / replay_latency:
+            錄製 ("record") 或重播 ("replay") 所有模型呼叫，見 core/cassette.py。
+            未指定時讀取環境變數 GEMINI_CASSETTE、GEMINI_CASSETTE_MODE、GEMINI_CASSETTE_LATENCY=1。
+            replay 模式完全不連網，也不需要 API Key。
+        api_endpoint:
+            改連指定的 Gemini 相容端點 (例如 tools/fake_gemini_server.py 的 http://127.0.0.1:8765)；
+            未指定時讀取環境變數 GEMINI_API_ENDPOINT，兩者皆無則連 Google 官方服務。
+        image_strategy:
+            "inline"   - HYBRID / VISION 頁的圖片與 Prompt 一起送出，單次呼叫完成擷取。
+            "describe" - 先以 Vision 模型把圖片轉成文字描述，再做第二次擷取呼叫。
+        """
+        if image_strategy not in IMAGE_STRATEGIES:
+            raise ValueError(f"image_strategy must be one of {IMAGE_STRATEGIES}, got {image_strategy!r}")
         load_dotenv()
+        if replay_latency is None:
+            replay_latency = os.getenv("GEMINI_CASSETTE_LATENCY", "") in ("1", "true", "yes")
+        self._cassette = open_cassette(
+            cassette_path or os.getenv("GEMINI_CASSETTE"),
+            cassette_mode or os.getenv("GEMINI_CASSETTE_MODE"),
+            replay_latency=replay_latency,
+        )
+        replaying = self._cassette is not None and self._cassette.mode == "replay"
+
         api_key = api_key or os.getenv("GOOGLE_API_KEY")
-        if not api_key:
+        api_endpoint = api_endpoint or os.getenv("GEMINI_API_ENDPOINT")
+        if replaying:
+            # 重播時不會真正送出請求，只需要能建立 GenerativeModel 物件
+            genai.configure(api_key=api_key or "offline")
+        elif api_endpoint:
+            # 替身 / 代理端點不驗證金鑰，走 REST transport 才能使用 http:// 位址
+            genai.configure(
+                api_key=api_key or "offline",
+                transport="rest",
+                client_options={"api_endpoint": api_endpoint},
+            )
+        elif not api_key:
             raise RuntimeError("Environment variable GOOGLE_API_KEY not set.")
-        
-        genai.configure(api_key=api_key)
+        else:
+            genai.configure(api_key=api_key)
         self._model = genai.GenerativeModel(model_name)
         # Vision 模型可以用更強的 Pro 版本，或共用 Flash
         self._vision_model = (
@@ -32,8 +299,198 @@ class GeminiClient:
             if vision_model_name
             else self._model
         )
+        self._escalation_model = (
+            genai.GenerativeModel(escalation_model_name) if escalation_model_name else None
+        )
+        self._confidence_threshold = confidence_threshold
+        self.hedge_policy = (
+            HedgePolicy(hedge_percentile, budget_ratio=hedge_budget) if hedge_percentile else None
+        )
+        self._hedge_pool = ThreadPoolExecutor(max_workers=16) if self.hedge_policy else None
+        self._image_strategy = image_strategy
+        self._max_retries = max_retries
+        self._max_continuations = max_continuations
+        self._retry_backoff = retry_backoff
+        self.limiter = limiter
+        self._max_prompt_tokens = max_prompt_tokens
+        self._focused_dictionary = focused_dictionary
+        # 每次呼叫的 token / 延遲 / 重試紀錄
+        self.usage = UsageTracker(keep_records=track_usage)
+
+    def _call_model(
+        self,
+        model: "genai.GenerativeModel",
+        parts: List[Any],
+        generation_config: "genai.types.GenerationConfig",
+        *,
+        kind: str,
+        page_index: Optional[int] = None,
+        mode: Optional[str] = None,
+    ) -> ModelReply:
+        """
+        所有 generate_content 的統一出口：
+        遇到配額/暫時性錯誤時以指數退避重試，並把 token、圖片大小、延遲與重試次數記到 self.usage；
+        有設定 cassette 時，依模式錄製或重播回應。
+        """
+        image_bytes = sum(
+            len(p["data"]) for p in parts if isinstance(p, dict) and "data" in p
+        )
+        usage_tags = dict(model=model.model_name, kind=kind, page_index=page_index, mode=mode)
+        fp = (
+            request_fingerprint(model.model_name, parts, generation_config)
+            if self._cassette is not None
+            else ""
+        )
+
+        if self._cassette is not None and self._cassette.mode == "replay":
+            entry = self._cassette.lookup(fp)
+            if self._cassette.replay_latency:
+                time.sleep(entry["latency_s"])
+            reply = ModelReply(
+                text=entry["text"],
+                prompt_tokens=entry["prompt_tokens"],
+                output_tokens=entry["output_tokens"],
+                finish_reason=entry["finish_reason"],
+                latency_s=entry["latency_s"] if self._cassette.replay_latency else 0.0,
+            )
+            self.usage.record(
+                **usage_tags,
+                prompt_tokens=reply.prompt_tokens,
+                output_tokens=reply.output_tokens,
+                image_bytes=image_bytes,
+                latency_s=reply.latency_s,
+                retries=0,
+            )
+            return reply
+
+        retries = 0
+        start = time.perf_counter()
+        while True:
+            try:
+                response, hedged = self._generate(model, parts, generation_config)
+                break
+            except _RETRYABLE_ERRORS:
+                if retries >= self._max_retries:
+                    self.usage.record(
+                        **usage_tags,
+                        prompt_tokens=0,
+                        output_tokens=0,
+                        image_bytes=image_bytes,
+                        latency_s=time.perf_counter() - start,
+                        retries=retries,
+                        ok=False,
+                    )
+                    raise
+                time.sleep(self._retry_backoff * (2**retries))
+                retries += 1
+
+        reply = _reply_from_response(response, time.perf_counter() - start)
+        self.usage.record(
+            **usage_tags,
+            prompt_tokens=reply.prompt_tokens,
+            output_tokens=reply.output_tokens,
+            image_bytes=image_bytes,
+            latency_s=reply.latency_s,
+            retries=retries,
+        )
+        if hedged:
+            # 被放棄的那一個請求同樣會計費：以相同的 prompt tokens 記一筆，輸出 tokens 無從得知記為 0
+            self.usage.record(
+                **{**usage_tags, "kind": "hedge_duplicate"},
+                prompt_tokens=reply.prompt_tokens,
+                output_tokens=0,
+                image_bytes=image_bytes,
+                latency_s=0.0,
+                retries=0,
+            )
+        if self._cassette is not None:
+            self._cassette.append(
+                fp,
+                {
+                    "model": model.model_name.split("/")[-1],
+                    "kind": kind,
+                    "text": reply.text,
+                    "finish_reason": reply.finish_reason,
+                    "prompt_tokens": reply.prompt_tokens,
+                    "output_tokens": reply.output_tokens,
+                    "latency_s": round(reply.latency_s, 3),
+                },
+            )
+        return reply
 
-    def _describe_images(self, images: List[bytes]) -> str:
+    def _generate(
+        self,
+        model: "genai.GenerativeModel",
+        parts: List[Any],
+        generation_config: "genai.types.GenerationConfig",
+    ) -> tuple[Any, bool]:
+        """
+        實際送出 generate_content；啟用 hedging 時在背景執行緒送出，
+        超過延遲門檻就再送一個備援請求，回傳 (先成功的 response, 是否送出過備援)。
+        同步 SDK 無法中斷進行中的請求，落後的那一個只會被放棄、結果丟棄。
+        每個請求各自佔用 limiter 的一個名額，直到該請求本身完成 (被放棄的請求仍在進行時也不釋放)。
+        """
+        limiter = self.limiter
+        if self.hedge_policy is None or self._hedge_pool is None:
+            if limiter is None:
+                return model.generate_content(parts, generation_config=generation_config), False
+            with limiter.slot():
+                return model.generate_content(parts, generation_config=generation_config), False
+
+        policy = self.hedge_policy
+        delay = policy.hedge_delay()
+        if limiter is not None:
+            limiter.acquire()
+        start = time.perf_counter()
+        try:
+            primary = self._hedge_pool.submit(
+                model.generate_content, parts, generation_config=generation_config
+            )
+        except BaseException:
+            if limiter is not None:
+                limiter.release()
+            raise
+        if limiter is not None:
+            primary.add_done_callback(lambda _: limiter.release())
+        done, _ = wait([primary], timeout=delay)
+        # 備援請求也要遵守 process 內的併發上限：沒有空位時不送備援 (不插隊等待)
+        slot = not done and (limiter is None or limiter.try_acquire())
+        if not slot or not policy.try_acquire():
+            if slot and limiter is not None:
+                limiter.release()
+            response = primary.result()
+            policy.observe(time.perf_counter() - start)
+            return response, False
+
+        backup = self._hedge_pool.submit(
+            model.generate_content, parts, generation_config=generation_config
+        )
+        if limiter is not None:
+            # 被放棄的請求仍在進行，完成 (或取消) 後才釋放名額
+            backup.add_done_callback(lambda _: limiter.release())
+        pending = {primary, backup}
+        first_error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if future is backup:
+                        policy.record_win()
+                    policy.observe(time.perf_counter() - start)
+                    return future.result(), True
+                first_error = first_error or future.exception()
+        assert first_error is not None
+        raise first_error
+
+    def _describe_images(
+        self,
+        images: List[bytes],
+        *,
+        page_index: Optional[int] = None,
+        mode: Optional[str] = None,
+    ) -> str:
         """
         使用 Vision 模型將圖表「翻譯」成文字。
         **關鍵：強制要求忽略 PDF 文字層的亂序，改用視覺對齊。**
@@ -61,11 +518,15 @@ class GeminiClient:
             parts.append({"mime_type": "image/png", "data": img})
 
         # 使用 temperature=0.0 以獲得最客觀的數據讀取
-        response = self._vision_model.generate_content(
-            parts, 
-            generation_config=genai.types.GenerationConfig(temperature=0.0)
+        reply = self._call_model(
+            self._vision_model,
+            parts,
+            genai.types.GenerationConfig(temperature=0.0),
+            kind="describe_images",
+            page_index=page_index,
+            mode=mode,
         )
-        return response.text or ""
+        return reply.text
 
     def extract_goals_from_page(
         self,
@@ -73,71 +534,223 @@ class GeminiClient:
         page_text: str,
         images: List[bytes],
         current_year: int,
-        mode: str = "TEXT"  # [新增] 接收來自 extractor 的模式
+        mode: str = "TEXT",  # [新增] 接收來自 extractor 的模式
+        page_index: Optional[int] = None,  # 僅用於用量統計標註
     ) -> List[Dict[str, Any]]:
+        """回傳通過 Schema 驗證的目標列表；詳細的驗證問題請改用 extract_page。"""
+        return self.extract_page(
+            page_text=page_text,
+            images=images,
+            current_year=current_year,
+            mode=mode,
+            page_index=page_index,
+        ).items
+
+    def extract_page(
+        self,
+        *,
+        page_text: str,
+        images: List[bytes],
+        current_year: int,
+        mode: str = "TEXT",
+        page_index: Optional[int] = None,
+        hint: str = "",
+    ) -> PageExtraction:
         """
         核心方法：
-        1. 若是 HYBRID，先看圖產生描述。
-        2. 將 文字 + 描述 + 警告 組合後，填入 prompt.py 的樣板。
-        3. 讓 LLM 輸出 JSON。
+        1. 圖片策略 "inline"（預設）：HYBRID / VISION 頁把 Prompt + 頁面文字 + 整頁截圖一次送出，單次呼叫直接回 JSON。
+        2. 圖片策略 "describe"：舊流程，先用 Vision 模型看圖產生描述，再把 文字 + 描述 + 警告 填入 prompt.py 的樣板。
+        3. 以 response_schema 要求 LLM 輸出 JSON，本地再嚴格驗證；輸出被截斷時補發續寫請求。
+        4. Prompt 估算超過 max_prompt_tokens 時先壓縮頁面文字，仍過長則切段分別擷取後合併 (prompt_chunks)。
         """
+        use_images = mode in ("HYBRID", "VISION") and bool(images)
+        inline_images = use_images and self._image_strategy == "inline"
         image_desc = ""
-        
-        # 步驟 1: 只有在 HYBRID 模式且有圖片時，才呼叫 Vision Model
-        if mode == "HYBRID" and images:
-            image_desc = self._describe_images(images)
-
-        # 步驟 2: 組合最終要送給 LLM 的 context
-        merged_content_parts: List[str] = []
-
-        # [系統警告]：若是 HYBRID，告訴主模型不要太相信原始文字的順序
-        if mode == "HYBRID" and images:
-            merged_content_parts.append(
-                "⚠️ [SYSTEM WARNING]: This page contains Charts/Graphs with potentially jumbled text layers. "
-                "Please PRIORITIZE the information in the '# Image-derived Details' section below "
-                "for any trend data, year-value alignment, or chart interpretation."
+
+        # 步驟 1: describe 策略下，HYBRID / VISION 頁先呼叫 Vision Model 產生圖表描述
+        if use_images and not inline_images:
+            image_desc = self._describe_images(images, page_index=page_index, mode=mode)
+
+        # 步驟 2 + 3: 組合 context（警告 + 文字 + 圖片描述）並填入 prompt.py 的樣板；過長時壓縮 / 切段
+        requests = build_page_requests(
+            page_text=page_text,
+            images=images,
+            current_year=current_year,
+            use_images=use_images,
+            inline_images=inline_images,
+            image_desc=image_desc,
+            hint=hint,
+            max_prompt_tokens=self._max_prompt_tokens,
+            # 圖表中的領域無法由文字層判斷，有圖片的頁面一律使用完整字典
+            focus_areas=(
+                tag_text(page_text).focus_areas() or None
+                if self._focused_dictionary and not use_images
+                else None
+            ),
+        )
+        extractions = [
+            self._extract_request(
+                parts,
+                inline_images=inline_images and i == 0,
+                chart_derived=use_images,
+                current_year=current_year,
+                page_index=page_index,
+                mode=mode,
             )
+            for i, parts in enumerate(requests)
+        ]
+        if len(extractions) == 1:
+            return extractions[0]
+        return PageExtraction(
+            items=[item for e in extractions for item in e.items],
+            problems=[problem for e in extractions for problem in e.problems],
+            model=extractions[-1].model,
+            escalation_reason=next((e.escalation_reason for e in extractions if e.escalation_reason), ""),
+            prompt_chunks=len(extractions),
+        )
 
-        merged_content_parts.append(f"# Raw Page Text\n{page_text.strip()}")
-        
-        if image_desc:
-            merged_content_parts.append(
-                f"\n# Image-derived Details (High Confidence for Charts)\n{image_desc.strip()}"
+    def _extract_request(
+        self,
+        parts: List[Any],
+        *,
+        inline_images: bool,
+        chart_derived: bool,
+        current_year: int,
+        page_index: Optional[int],
+        mode: Optional[str],
+    ) -> PageExtraction:
+        # 步驟 4: 送出請求（inline 圖片時走 Vision 模型，未另外指定時即為同一個模型）
+        model = self._vision_model if inline_images else self._model
+        kind = "extract_multimodal" if inline_images else "extract"
+        try:
+            extraction = self._extract_once(
+                model, parts, kind=kind, current_year=current_year, page_index=page_index, mode=mode
             )
+        except GoalResponseError as e:
+            if self._escalation_model is None:
+                raise
+            extraction = PageExtraction(problems=[f"快速模型輸出無效: {e}"])
+            reason = "invalid_output"
+        else:
+            reason = self._escalation_reason(extraction, chart_derived=chart_derived)
 
-        final_content = "\n".join(merged_content_parts)
+        # 步驟 6 (cascade): 快速模型結果可疑時，改由較強模型重跑同一份請求
+        if self._escalation_model is not None and reason:
+            escalated = self._extract_once(
+                self._escalation_model,
+                parts,
+                kind="escalation",
+                current_year=current_year,
+                page_index=page_index,
+                mode=mode,
+            )
+            escalated.escalation_reason = reason
+            return escalated
+        return extraction
 
-        # 步驟 3: 呼叫 prompt.py 中的函數來產生最終 Prompt
-        # 這裡的 final_content 已經包含了 警告 + 文字 + 圖片描述
-        prompt = get_audit_prompt(current_year=current_year, content=final_content)
+    def _extract_once(
+        self,
+        model: "genai.GenerativeModel",
+        parts: List[Any],
+        *,
+        kind: str,
+        current_year: int,
+        page_index: Optional[int],
+        mode: Optional[str],
+    ) -> PageExtraction:
+        generation_config = genai.types.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=GOAL_RESPONSE_SCHEMA,
+            temperature=0.1,
+        )
+        reply = self._call_model(
+            model, parts, generation_config, kind=kind, page_index=page_index, mode=mode
+        )
 
-        # 步驟 4: 送出請求
-        response = self._model.generate_content(
-            [prompt],
-            generation_config=genai.types.GenerationConfig(
-                response_mime_type="application/json",
-                temperature=0.1
-            ),
+        # 步驟 5: JSON 解析 + Schema 驗證
+        raw_items = self._parse_with_continuation(
+            reply, model, parts, generation_config, page_index=page_index, mode=mode
         )
+        items, problems = validate_goal_items(raw_items, report_year=current_year)
+        return PageExtraction(items=items, problems=problems, model=model.model_name.split("/")[-1])
 
-        raw_text = response.text or "[]"
+    def _escalation_reason(self, extraction: PageExtraction, *, chart_derived: bool) -> str:
+        """回傳升級原因；空字串代表快速模型的結果可直接採用。"""
+        if extraction.problems:
+            return "validation"
+        confidences = [
+            item["Confidence"] for item in extraction.items if item.get("Confidence") is not None
+        ]
+        if confidences and min(confidences) < self._confidence_threshold:
+            return "low_confidence"
+        if chart_derived and any(item.get("Progress_History") for item in extraction.items):
+            return "chart_data"
+        return ""
 
-        # 步驟 5: JSON 解析 (維持不變)
+    def _parse_with_continuation(
+        self,
+        reply: ModelReply,
+        model: "genai.GenerativeModel",
+        parts: List[Any],
+        generation_config: "genai.types.GenerationConfig",
+        *,
+        page_index: Optional[int],
+        mode: Optional[str],
+    ) -> List[Any]:
+        """
+        解析模型輸出；若輸出被截斷，保留已完整的項目，並只請模型補上「剩餘」的目標，
+        最多 self._max_continuations 次。仍無法取得完整 JSON 時丟出 GoalResponseError。
+        """
         try:
-            data = json.loads(raw_text)
-        except json.JSONDecodeError:
+            return parse_goal_response(reply.text, finish_reason=reply.finish_reason)
+        except GoalResponseError as err:
+            if not err.truncated:
+                raise
+
+        items = salvage_goal_items(reply.text)
+        for _ in range(self._max_continuations):
+            cont_parts = [parts[0] + _continuation_note(items)] + list(parts[1:])
+            cont = self._call_model(
+                model,
+                cont_parts,
+                generation_config,
+                kind="continuation",
+                page_index=page_index,
+                mode=mode,
+            )
             try:
-                obj = json.loads(raw_text)
-                for key in ("items", "data", "results"):
-                    if key in obj and isinstance(obj[key], list):
-                        return obj[key]
-                if isinstance(obj, dict): return [obj]
-                if isinstance(obj, list): return obj
-            except Exception:
-                return []
-
-        if isinstance(data, dict): return [data]
-        if isinstance(data, list): return data
-        return []
-
-__all__ = ["GeminiClient"]
\ No newline at end of file
+                return items + parse_goal_response(cont.text, finish_reason=cont.finish_reason)
+            except GoalResponseError as err:
+                if not err.truncated:
+                    raise
+                items += salvage_goal_items(cont.text)
+
+        raise GoalResponseError(
+            f"第 {page_index} 頁輸出在 {self._max_continuations} 次續寫後仍被截斷",
+            raw_text=reply.text,
+            truncated=True,
+        )
+
+
+def _continuation_note(received: List[Any]) -> str:
+    """續寫請求：列出已收到的目標，要求模型只輸出剩下的部分。"""
+    lines = [
+        "",
+        "# Continuation Request",
+        f"你上一次的輸出過長而被截斷，以下 {len(received)} 筆目標已完整接收，**請勿重複輸出**。",
+        "請只輸出尚未輸出的其餘目標（同樣是 JSON List）；若已沒有其他目標，請輸出 []。",
+    ]
+    for item in received:
+        if isinstance(item, dict):
+            lines.append(f"- {str(item.get('Original_Goal_Text', ''))[:120]}")
+    return "\n".join(lines)
+
+
+__all__ = [
+    "GeminiClient",
+    "IMAGE_STRATEGIES",
+    "ModelReply",
+    "PageExtraction",
+    "build_page_parts",
+    "build_page_requests",
+]
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""
+Hedged requests：壓低少數卡住數十秒的呼叫所造成的尾端延遲。
+
+`HedgePolicy` 追蹤最近 N 次成功呼叫的延遲；當一次呼叫超過指定百分位數 (例如 p95) 仍未回應，
+就送出一個完全相同的備援請求，採用先回來的結果。
+為避免成本失控，備援請求數量上限為「總呼叫數 × budget_ratio」。
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class HedgePolicy:
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        *,
+        budget_ratio: float = 0.1,
+        min_samples: int = 20,
+        min_delay_s: float = 1.0,
+        window: int = 200,
+    ) -> None:
+        """
+        percentile: 超過最近延遲的第幾百分位數就送出備援請求
+        budget_ratio: 備援請求佔總呼叫數的上限比例
+        min_samples: 累積多少筆延遲樣本後才開始 hedge（樣本太少時百分位數不可靠）
+        min_delay_s: 觸發門檻的下限，避免在全部很快時也亂發備援
+        window: 只用最近多少筆延遲計算百分位數
+        """
+        if not 0 < percentile < 100:
+            raise ValueError("percentile must be between 0 and 100")
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.min_delay_s = min_delay_s
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+
+    def observe(self, latency_s: float) -> None:
+        with self._lock:
+            self._latencies.append(latency_s)
+
+    def hedge_delay(self) -> Optional[float]:
+        """本次呼叫應在幾秒後送出備援；樣本不足時回傳 None（不 hedge）。每次呼叫前呼叫一次。"""
+        with self._lock:
+            self._calls += 1
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+            k = min(len(ordered) - 1, int(self.percentile / 100 * len(ordered)))
+            return max(self.min_delay_s, ordered[k])
+
+    def try_acquire(self) -> bool:
+        """檢查 hedge 預算；允許時計入一次備援請求。"""
+        with self._lock:
+            if self._hedges + 1 > self.budget_ratio * self._calls:
+                return False
+            self._hedges += 1
+            return True
+
+    def record_win(self) -> None:
+        with self._lock:
+            self._hedge_wins += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "calls": self._calls,
+                "hedges": self._hedges,
+                "hedge_wins": self._hedge_wins,
+                "hedge_rate": self._hedges / self._calls if self._calls else 0.0,
+            }
+
+
+__all__ = ["HedgePolicy"]
@@ -0,0 +1,156 @@
+"""
+逐頁 checkpoint journal (JSONL, append-only)。
+
+每頁擷取完成就寫入一行並 fsync，程式中斷 (Ctrl-C / 配額用盡 / 當機) 時已付費的頁面不會遺失。
+每行都帶有 PDF sha256、Prompt 版本與報告年份；`--resume` 時只沿用三者皆相同、且狀態為 ok 的頁面。
+最終輸出 JSON 由 journal 依頁碼組裝而成。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+def file_sha256(path: Path | str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def journal_path_for(output_path: Path) -> Path:
+    """輸出 JSON 旁的 journal 路徑，例如 All_json/2023.json -> All_json/2023.journal.jsonl。"""
+    return output_path.with_name(f"{output_path.stem}.journal.jsonl")
+
+
+class RunJournal:
+    """
+    resume=False 時清空舊 journal 重新開始；resume=True 時讀入既有紀錄並繼續追加。
+    同一頁若有多筆紀錄，以最後一筆為準。
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        *,
+        pdf_sha256: str,
+        prompt_version: str,
+        report_year: int,
+        resume: bool = False,
+    ) -> None:
+        self.path = Path(path)
+        self.pdf_sha256 = pdf_sha256
+        self.prompt_version = prompt_version
+        self.report_year = report_year
+        self._lock = threading.Lock()
+        self._records: Dict[int, Dict[str, Any]] = {}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if resume and self.path.is_file():
+            self._load()
+        else:
+            self.path.write_text("", encoding="utf-8")
+
+    def _matches(self, record: Dict[str, Any]) -> bool:
+        return (
+            record.get("pdf_sha256") == self.pdf_sha256
+            and record.get("prompt_version") == self.prompt_version
+            and record.get("report_year") == self.report_year
+        )
+
+    def _truncate_torn_tail(self) -> None:
+        """中斷時可能留下沒有換行結尾的半行；截回最後一個換行，之後的 append 才不會接在半行後面。"""
+        with self.path.open("rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _load(self) -> None:
+        self._truncate_torn_tail()
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 中斷時可能留下寫到一半的最後一行，直接略過
+                    continue
+                if self._matches(record):
+                    self._records[int(record["page_index"])] = record
+
+    def done_pages(self) -> List[int]:
+        """已成功完成、resume 時可略過的頁碼。"""
+        with self._lock:
+            return sorted(i for i, r in self._records.items() if r["status"] == "ok")
+
+    def get(self, page_index: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._records.get(page_index)
+
+    def append(
+        self,
+        page_index: int,
+        *,
+        mode: str,
+        items: List[Dict[str, Any]],
+        status: str = "ok",
+        error: Optional[str] = None,
+        **extra: Any,
+    ) -> None:
+        record: Dict[str, Any] = {
+            "pdf_sha256": self.pdf_sha256,
+            "prompt_version": self.prompt_version,
+            "report_year": self.report_year,
+            "page_index": page_index,
+            "mode": mode,
+            "status": status,
+            "items": items,
+        }
+        if error:
+            record["error"] = error
+        record.update(extra)
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._records[page_index] = record
+
+    def assemble_items(self) -> List[Dict[str, Any]]:
+        """依頁碼順序組裝所有成功頁面的目標 (舊版 journal 的目標補上 Source_Page / Source_Mode)。"""
+        with self._lock:
+            records = sorted(self._records.values(), key=lambda r: r["page_index"])
+        items: List[Dict[str, Any]] = []
+        for r in records:
+            if r["status"] == "ok":
+                items.extend(
+                    {
+                        **item,
+                        "Source_Page": item.get("Source_Page", r["page_index"]),
+                        "Source_Mode": item.get("Source_Mode", r["mode"]),
+                    }
+                    for item in r["items"]
+                )
+        return items
+
+    def failed_pages(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {"page_index": r["page_index"], "mode": r["mode"], "error": r.get("error", "")}
+                for r in sorted(self._records.values(), key=lambda r: r["page_index"])
+                if r["status"] != "ok"
+            ]
+
+
+__all__ = ["RunJournal", "file_sha256", "journal_path_for"]
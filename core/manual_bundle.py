@@ -0,0 +1,413 @@
+"""
+手動處理模式 (免 API) 的批次匯出 / 匯入。
+
+逐頁複製 Prompt 與截圖到聊天介面，200 頁的報告要點上百次；這裡一次把所有 Prompt 與 PNG
+打包成 zip 或 JSONL，再把貼回的回應整批合併成目標 JSON：
+
+- 匯出：每個 Prompt 有固定的 prompt id (例如 `p0012`、多頁合併 `p0012-0014`、過長切段 `p0012.2`)。
+  zip 內含 `prompts/<id>.txt`、`images/pageNNNN.png`、`manifest.json` 與待填寫的
+  `responses_template.jsonl`；JSONL 每行一個 Prompt，圖片以 base64 內嵌。
+- 多頁合併 (pages_per_prompt > 1)：相鄰頁面在 token 上限內合成一個 Prompt，
+  每頁以 `--- Page N ---` 標示，並要求模型為每筆目標加上 `Source_Page`。
+- 匯入：`responses_template.jsonl` 填上 `response` 後上傳，或在 zip 中加入 `responses/<id>.txt`。
+  聊天介面常見的 ```json 區塊與前後說明文字會自動去除；每筆目標以 validate_goal_items 驗證，
+  並補上 `Source_Page` (0-based page_index) / `Source_Mode`，可直接交給 core.merge / core.splice。
+"""
+
+from __future__ import annotations
+
+import base64
+import io
+import json
+import re
+import zipfile
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .prompt import (
+    DEFAULT_MAX_PROMPT_TOKENS,
+    PROMPT_VERSION,
+    AuditPrompt,
+    compile_audit_prompt,
+    estimate_text_tokens,
+)
+from .schema import GoalResponseError, parse_goal_response, salvage_goal_items, validate_goal_items
+
+_IMAGE_NOTE = (
+    "⚠️ [USER INSTRUCTION]: I have uploaded an image corresponding to this page. "
+    "Please combine the visual trend information from the image with the text below."
+)
+_LAYOUT_WARNING = (
+    "⚠️ [SYSTEM WARNING]: The PDF text layer might be disordered. "
+    "Rely on the image for 'Year-Value' alignment in charts."
+)
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.S)
+
+
+@dataclass
+class ManualPrompt:
+    """一個要貼給聊天介面的 Prompt。pages 為 0-based page_index；images 為 (檔名, PNG bytes)。"""
+
+    prompt_id: str
+    pages: List[int]
+    modes: List[str]
+    prompt: str
+    tokens: int
+    images: List[Tuple[str, bytes]] = field(default_factory=list)
+    part: int = 1
+    parts: int = 1
+
+    @property
+    def pages_label(self) -> str:
+        numbers = [p + 1 for p in self.pages]
+        if len(numbers) > 1 and numbers == list(range(numbers[0], numbers[-1] + 1)):
+            return f"{numbers[0]}-{numbers[-1]}"
+        return ", ".join(str(n) for n in numbers)
+
+    def manifest_entry(self) -> Dict[str, Any]:
+        return {
+            "prompt_id": self.prompt_id,
+            "pages": [p + 1 for p in self.pages],
+            "modes": self.modes,
+            "part": self.part,
+            "parts": self.parts,
+            "tokens": self.tokens,
+            "prompt_file": f"prompts/{self.prompt_id}.txt",
+            "images": [f"images/{name}" for name, _ in self.images],
+        }
+
+
+def page_notes(page: Dict[str, Any]) -> List[str]:
+    """手動模式的圖片提示：HYBRID / VISION 頁需連同截圖一起上傳。"""
+    if page.get("mode") in ("HYBRID", "VISION") and page.get("images"):
+        return [_IMAGE_NOTE, _LAYOUT_WARNING]
+    return []
+
+
+def _image_names(page: Dict[str, Any]) -> List[Tuple[str, bytes]]:
+    n = page["page_index"] + 1
+    images = page.get("images") or []
+    if page.get("mode") not in ("HYBRID", "VISION"):
+        return []
+    if len(images) == 1:
+        return [(f"page{n:04d}.png", images[0])]
+    return [(f"page{n:04d}_{k}.png", img) for k, img in enumerate(images, start=1)]
+
+
+def _single_page_prompts(
+    audit_prompt: AuditPrompt, page: Dict[str, Any], max_tokens: int
+) -> List[ManualPrompt]:
+    """單頁 Prompt (與逐頁預覽相同)；過長時先壓縮，仍超過則切段，圖片只隨第 1 段。"""
+    notes = page_notes(page)
+    overhead = "\n\n".join(notes + ["# Raw Page Text\n"])
+    chunks = audit_prompt.split_content(
+        page["text"].strip(), max_tokens=max_tokens, reserved_tokens=estimate_text_tokens(overhead)
+    )
+    base_id = f"p{page['page_index'] + 1:04d}"
+    prompts = []
+    for n, chunk in enumerate(chunks, start=1):
+        content = "\n\n".join(notes + [f"# Raw Page Text\n{chunk}"])
+        prompts.append(
+            ManualPrompt(
+                prompt_id=base_id if len(chunks) == 1 else f"{base_id}.{n}",
+                pages=[page["page_index"]],
+                modes=[page["mode"]],
+                prompt=audit_prompt.render(content),
+                tokens=audit_prompt.estimate_tokens(content),
+                images=_image_names(page) if n == 1 else [],
+                part=n,
+                parts=len(chunks),
+            )
+        )
+    return prompts
+
+
+def _packed_content(pages: List[Dict[str, Any]]) -> str:
+    numbers = ", ".join(str(p["page_index"] + 1) for p in pages)
+    header = (
+        f"# Page Bundle (pages {numbers})\n"
+        "This prompt contains several report pages, each starting with a `--- Page N ---` marker. "
+        'For every goal, add a field "Source_Page": N with the number of the page marker it came from.'
+    )
+    parts = [header]
+    if any(page_notes(p) for p in pages):
+        parts.append(
+            "⚠️ [USER INSTRUCTION]: Screenshots of the pages marked [Image attached] are uploaded in page order. "
+            "Please combine the visual trend information from the images with the text below."
+        )
+        parts.append(_LAYOUT_WARNING)
+    for page in pages:
+        names = ", ".join(name for name, _ in _image_names(page))
+        attached = f" [Image attached: {names}]" if names else ""
+        parts.append(f"--- Page {page['page_index'] + 1} ({page['mode']}){attached} ---\n{page['text'].strip()}")
+    return "\n\n".join(parts)
+
+
+def _packed_prompt(audit_prompt: AuditPrompt, pages: List[Dict[str, Any]]) -> ManualPrompt:
+    content = _packed_content(pages)
+    first, last = pages[0]["page_index"] + 1, pages[-1]["page_index"] + 1
+    return ManualPrompt(
+        prompt_id=f"p{first:04d}-{last:04d}",
+        pages=[p["page_index"] for p in pages],
+        modes=[p["mode"] for p in pages],
+        prompt=audit_prompt.render(content),
+        tokens=audit_prompt.estimate_tokens(content),
+        images=[img for p in pages for img in _image_names(p)],
+    )
+
+
+def build_manual_prompts(
+    pages: Iterable[Dict[str, Any]],
+    report_year: int,
+    *,
+    max_tokens: int = DEFAULT_MAX_PROMPT_TOKENS,
+    pages_per_prompt: int = 1,
+) -> List[ManualPrompt]:
+    """
+    依頁面順序產生 Prompt。pages_per_prompt > 1 時，相鄰頁面在 max_tokens 內最多合併這麼多頁；
+    單頁就超過上限的頁面單獨成為 (壓縮 / 切段後的) Prompt。
+    """
+    audit_prompt = compile_audit_prompt(report_year)
+    prompts: List[ManualPrompt] = []
+    group: List[Dict[str, Any]] = []
+
+    def _fits(candidate: List[Dict[str, Any]]) -> bool:
+        return audit_prompt.estimate_tokens(_packed_content(candidate)) <= max_tokens
+
+    def _flush() -> None:
+        if len(group) == 1:
+            prompts.extend(_single_page_prompts(audit_prompt, group[0], max_tokens))
+        elif group:
+            prompts.append(_packed_prompt(audit_prompt, group))
+        group.clear()
+
+    for page in pages:
+        if pages_per_prompt <= 1:
+            prompts.extend(_single_page_prompts(audit_prompt, page, max_tokens))
+            continue
+        if group and len(group) < pages_per_prompt and _fits(group + [page]):
+            group.append(page)
+            continue
+        _flush()
+        group.append(page)
+    _flush()
+    return prompts
+
+
+def _responses_template(prompts: List[ManualPrompt]) -> str:
+    return "".join(
+        json.dumps(
+            {"prompt_id": p.prompt_id, "pages": [i + 1 for i in p.pages], "modes": p.modes, "response": ""},
+            ensure_ascii=False,
+        )
+        + "\n"
+        for p in prompts
+    )
+
+
+def build_bundle_zip(prompts: List[ManualPrompt], report_year: int) -> bytes:
+    """prompts/ + images/ + manifest.json + responses_template.jsonl (同一頁的圖片只寫一次)。"""
+    manifest = {
+        "report_year": report_year,
+        "prompt_version": PROMPT_VERSION,
+        "prompts": [p.manifest_entry() for p in prompts],
+    }
+    buffer = io.BytesIO()
+    written: Set[str] = set()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for p in prompts:
+            zf.writestr(f"prompts/{p.prompt_id}.txt", p.prompt)
+            for name, data in p.images:
+                if name not in written:
+                    # PNG 已壓縮，不再 deflate
+                    zf.writestr(f"images/{name}", data, compress_type=zipfile.ZIP_STORED)
+                    written.add(name)
+        zf.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+        zf.writestr("responses_template.jsonl", _responses_template(prompts))
+    return buffer.getvalue()
+
+
+def _jsonl_line(
+    entry: Dict[str, Any], report_year: int, prompt_version: str, prompt: str, images: List[Tuple[str, bytes]]
+) -> str:
+    entry = {k: v for k, v in entry.items() if k != "prompt_file"}
+    entry.update(
+        report_year=report_year,
+        prompt_version=prompt_version,
+        prompt=prompt,
+        images=[{"name": name, "png_base64": base64.b64encode(data).decode("ascii")} for name, data in images],
+    )
+    return json.dumps(entry, ensure_ascii=False)
+
+
+def build_bundle_jsonl(prompts: List[ManualPrompt], report_year: int) -> str:
+    """每行一個 Prompt，圖片以 base64 內嵌 ({name, png_base64})。"""
+    lines = [_jsonl_line(p.manifest_entry(), report_year, PROMPT_VERSION, p.prompt, p.images) for p in prompts]
+    return "\n".join(lines) + "\n"
+
+
+def bundle_zip_to_jsonl(data: bytes) -> str:
+    """
+    由 build_bundle_zip 的 zip 產生與 build_bundle_jsonl 相同的 JSONL。
+    UI 只保留 zip，使用者要 JSONL 時才轉換，PNG 不必以原始 bytes 與 base64 各存一份。
+    """
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        manifest = json.loads(zf.read("manifest.json").decode("utf-8"))
+        lines = [
+            _jsonl_line(
+                entry,
+                manifest["report_year"],
+                manifest["prompt_version"],
+                zf.read(entry["prompt_file"]).decode("utf-8"),
+                [(name[len("images/"):], zf.read(name)) for name in entry["images"]],
+            )
+            for entry in manifest["prompts"]
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def parse_pasted_response(text: str) -> List[Any]:
+    """
+    解析從聊天介面複製回來的回應：優先取 ```json 區塊，否則從第一個 `[` / `{` 開始解析；
+    JSON 被截斷時取出完整的元素。無法解析時丟出 GoalResponseError。
+    """
+    fenced = _FENCE.search(text or "")
+    body = (fenced.group(1) if fenced else text or "").strip()
+    try:
+        return parse_goal_response(body)
+    except GoalResponseError as e:
+        starts = [i for i in (body.find("["), body.find("{")) if i >= 0]
+        if not starts:
+            raise
+        start = min(starts)
+        try:
+            data, _ = json.JSONDecoder().raw_decode(body, start)
+        except json.JSONDecodeError:
+            items = salvage_goal_items(body[start:])
+            if not items:
+                raise e
+            return items
+        return data if isinstance(data, list) else [data]
+
+
+def _read_jsonl(text: str) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def load_response_bundle(data: bytes) -> List[Dict[str, Any]]:
+    """
+    讀取貼回的回應：{prompt_id, pages (1-based), modes, response} 的 list。
+    接受 JSONL (responses_template.jsonl 或匯出的 JSONL 加上 response 欄位)，
+    或 zip (內含 responses.jsonl / responses_template.jsonl，或 manifest.json + responses/<prompt_id>.txt|.json)。
+    """
+    if not zipfile.is_zipfile(io.BytesIO(data)):
+        return _read_jsonl(data.decode("utf-8-sig"))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        names = set(zf.namelist())
+        entries: Dict[str, Dict[str, Any]] = {}
+        if "manifest.json" in names:
+            manifest = json.loads(zf.read("manifest.json").decode("utf-8"))
+            for p in manifest.get("prompts", []):
+                entries[p["prompt_id"]] = {
+                    "prompt_id": p["prompt_id"],
+                    "pages": p["pages"],
+                    "modes": p.get("modes", []),
+                    "response": "",
+                }
+        for jsonl_name in ("responses_template.jsonl", "responses.jsonl"):
+            if jsonl_name in names:
+                for entry in _read_jsonl(zf.read(jsonl_name).decode("utf-8-sig")):
+                    if entry.get("response") or entry["prompt_id"] not in entries:
+                        entries[entry["prompt_id"]] = entry
+        for name in sorted(names):
+            match = re.fullmatch(r"responses/(.+)\.(?:txt|json)", name)
+            if match and match.group(1) in entries:
+                entries[match.group(1)]["response"] = zf.read(name).decode("utf-8-sig")
+    return list(entries.values())
+
+
+@dataclass
+class ImportedResponses:
+    """
+    items: 驗證後的目標 (帶 Source_Page / Source_Mode)，依頁碼排序
+    covered_pages: 有回應的頁面 (0-based)，可作為 core.splice 的替換範圍
+    missing: 尚未貼上回應的 prompt id
+    failed: 無法解析的回應 ({prompt_id, error})
+    problems: 驗證時被修正或丟棄的欄位說明 ({prompt_id, problem})
+    """
+
+    items: List[Dict[str, Any]] = field(default_factory=list)
+    covered_pages: Set[int] = field(default_factory=set)
+    missing: List[str] = field(default_factory=list)
+    failed: List[Dict[str, Any]] = field(default_factory=list)
+    problems: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def _source_page_index(source: Any) -> Optional[int]:
+    """模型回填的 Source_Page (1-based，可能是數字或 "14" 這類字串) 轉成 page_index；無法解析時回傳 None。"""
+    if isinstance(source, (int, float)):
+        return int(source) - 1
+    try:
+        return int(str(source).strip()) - 1
+    except ValueError:
+        return None
+
+
+def merge_responses(entries: Iterable[Dict[str, Any]], report_year: int) -> ImportedResponses:
+    """把各 Prompt 的回應合併成一份目標 JSON。切段 Prompt 的各段皆有回應時，該頁才算完整涵蓋。"""
+    result = ImportedResponses()
+    incomplete: Set[int] = set()
+    for entry in entries:
+        prompt_id = entry["prompt_id"]
+        pages = [int(n) - 1 for n in entry.get("pages") or []]
+        modes = dict(zip(pages, entry.get("modes") or []))
+        text = entry.get("response") or ""
+        if not text.strip():
+            result.missing.append(prompt_id)
+            incomplete.update(pages)
+            continue
+        try:
+            raw_items = parse_pasted_response(text)
+        except GoalResponseError as e:
+            result.failed.append({"prompt_id": prompt_id, "error": str(e)})
+            incomplete.update(pages)
+            continue
+
+        items, problems = validate_goal_items(raw_items, report_year=report_year)
+        result.problems.extend({"prompt_id": prompt_id, "problem": p} for p in problems)
+        for item in items:
+            # 多頁 Prompt 由模型回填頁碼 (1-based)；無法對應時歸到第一頁
+            source = item.get("Source_Page")
+            page_index = _source_page_index(source)
+            if page_index not in pages:
+                if len(pages) > 1:
+                    result.problems.append(
+                        {
+                            "prompt_id": prompt_id,
+                            "problem": f"Source_Page 無法對應 ({source!r})，歸到第 {pages[0] + 1} 頁",
+                        }
+                    )
+                page_index = pages[0] if pages else None
+            item["Source_Page"] = page_index
+            item["Source_Mode"] = modes.get(page_index)
+            result.items.append(item)
+        result.covered_pages.update(pages)
+
+    result.covered_pages -= incomplete
+    result.items.sort(key=lambda item: (item["Source_Page"] is None, item["Source_Page"] or 0))
+    return result
+
+
+__all__ = [
+    "ImportedResponses",
+    "ManualPrompt",
+    "build_bundle_jsonl",
+    "build_bundle_zip",
+    "build_manual_prompts",
+    "bundle_zip_to_jsonl",
+    "load_response_bundle",
+    "merge_responses",
+    "page_notes",
+    "parse_pasted_response",
+]
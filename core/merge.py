@@ -0,0 +1,122 @@
+"""
+報告內重複目標的合併。
+
+同一個承諾常在摘要表、章節內文、附錄與 GRI 索引各被擷取一次，重複的列會讓 JSON 膨脹，
+也讓 `calculate_risk` 對同一目標重複計算。`GoalMergeIndex` 以正規化後的
+(Focus Area, Metric, Scope, Target_Deadline, Target_Value) 作為 hash key，
+每筆目標只做一次 dict 查詢，整份報告線性時間完成：
+
+- 第一次出現的目標作為代表，其餘合併進來
+- Progress_History 取聯集 (同年度同數值只留一筆，依年度排序)
+- Confidence 取最大值；Baseline_Year 等欄位為空時以後來者補上
+- `Source_Pages` 記錄所有來源頁 (0-based page_index)，`Merged_Count` 為合併的筆數
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .cleaning import clean_value, clean_year
+
+_NON_WORD = re.compile(r"[^0-9a-z一-鿿+]+")
+# 代表項為空時可由其他來源補上的欄位
+_FILLABLE_FIELDS = ("Baseline_Year", "Target_Value", "Target_Deadline")
+
+MergeKey = Tuple[Any, ...]
+
+
+def _norm_text(value: Any) -> str:
+    return _NON_WORD.sub(" ", str(value or "").lower()).strip()
+
+
+def _norm_value(value: Any) -> Any:
+    number, is_percentage, _ = clean_value(value)
+    if number is not None:
+        return (round(abs(number), 6), is_percentage)
+    return _norm_text(value)
+
+
+def merge_key(item: Dict[str, Any]) -> MergeKey:
+    return (
+        _norm_text(item.get("Standardized_Focus_Area")),
+        _norm_text(item.get("Standardized_Metric")),
+        _norm_text(item.get("Scope")),
+        clean_year(item.get("Target_Deadline")),
+        _norm_value(item.get("Target_Value")),
+    )
+
+
+def _history_key(point: Dict[str, Any]) -> Tuple[Any, Any]:
+    return clean_year(point.get("Year")), _norm_value(point.get("Value"))
+
+
+class GoalMergeIndex:
+    def __init__(self) -> None:
+        self._index: Dict[MergeKey, Dict[str, Any]] = {}
+        # 各代表項已收錄的 Progress_History 點 / 來源頁 (集合，避免重複掃描)
+        self._history_seen: Dict[MergeKey, set] = {}
+        self._pages_seen: Dict[MergeKey, set] = {}
+        self.total_items = 0
+
+    def add(self, item: Dict[str, Any], page_index: Optional[int] = None) -> None:
+        """page_index 未指定時使用 item 的 Source_Page。"""
+        self.total_items += 1
+        page = page_index if page_index is not None else item.get("Source_Page")
+        key = merge_key(item)
+        merged = self._index.get(key)
+        if merged is None:
+            merged = dict(item)
+            merged["Progress_History"] = []
+            merged["Source_Pages"] = []
+            merged["Merged_Count"] = 0
+            self._index[key] = merged
+            self._history_seen[key] = set()
+            self._pages_seen[key] = set()
+        else:
+            for f in _FILLABLE_FIELDS:
+                if merged.get(f) in (None, "") and item.get(f) not in (None, ""):
+                    merged[f] = item[f]
+            confidences = [c for c in (merged.get("Confidence"), item.get("Confidence")) if c is not None]
+            merged["Confidence"] = max(confidences) if confidences else None
+
+        merged["Merged_Count"] += item.get("Merged_Count", 1)
+        pages = item.get("Source_Pages") or ([page] if page is not None else [])
+        for p in pages:
+            if p not in self._pages_seen[key]:
+                self._pages_seen[key].add(p)
+                merged["Source_Pages"].append(p)
+        for point in item.get("Progress_History") or []:
+            hk = _history_key(point)
+            if hk not in self._history_seen[key]:
+                self._history_seen[key].add(hk)
+                merged["Progress_History"].append(point)
+
+    def items(self) -> List[Dict[str, Any]]:
+        """合併後的目標，依第一次出現的順序。"""
+        out = []
+        for merged in self._index.values():
+            merged["Progress_History"].sort(key=lambda p: clean_year(p.get("Year")) or 0)
+            merged["Source_Pages"].sort()
+            out.append(merged)
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "items": self.total_items,
+            "merged_items": len(self._index),
+            "removed": self.total_items - len(self._index),
+        }
+
+
+def merge_goal_items(
+    items: Iterable[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """合併重複目標，回傳 (合併後目標, 統計)。"""
+    index = GoalMergeIndex()
+    for item in items:
+        index.add(item)
+    return index.items(), index.stats()
+
+
+__all__ = ["GoalMergeIndex", "merge_goal_items", "merge_key"]
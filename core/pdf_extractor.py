@@ -149,7 +149,7 @@
 
 import fitz  # PyMuPDF
 import numpy as np
-from typing import Any, Dict, List
+from typing import Any, Collection, Dict, Iterator, List, Optional, Sequence, Set
 
 def analyze_page_metrics(page: fitz.Page) -> Dict[str, Any]:
     """
@@ -250,35 +250,88 @@ def analyze_page_metrics(page: fitz.Page) -> Dict[str, Any]:
         "text_len": text_len
     }
 
-def extract_mixed_content(pdf_path: str) -> List[Dict[str, Any]]:
-    pages_data: List[Dict[str, Any]] = []
-    doc = fitz.open(pdf_path)
-    
-    for i in range(len(doc)):
-        page = doc.load_page(i)
-        metrics = analyze_page_metrics(page)
-        mode = metrics["mode"]
-        
-        final_text = ""
-        final_images = []
-
-        if mode == "VISION":
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-            final_images.append(pix.tobytes("png"))
-            final_text = "[System: Scanned Page / Image Detected]"
-        elif mode == "HYBRID":
-            final_text = page.get_text()
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-            final_images.append(pix.tobytes("png"))
-        else:
-            final_text = page.get_text()
+def page_layer_text(page: Dict[str, Any]) -> str:
+    """
+    頁面原本的文字層：core.boilerplate / core.compaction 改寫 `text` 時會以 `original_text` 保留原文。
+    跨年度索引與數值驗證一律使用原文，結果才不會隨前處理選項改變。
+    VISION 頁的 text 只是掃描頁提示字串，沒有文字層，回傳空字串。
+    """
+    if page.get("mode") == "VISION":
+        return ""
+    return page.get("original_text", page.get("text", ""))
+
+
+def count_pages(pdf_path: str) -> int:
+    with fitz.open(pdf_path) as doc:
+        return len(doc)
+
+def extract_mixed_content(
+    pdf_path: str, only_pages: Optional[Collection[int]] = None
+) -> List[Dict[str, Any]]:
+    """
+    only_pages: 若提供，只分析 / 渲染這些頁 (0-based page index)，其餘頁直接略過。
+    """
+    return list(iter_mixed_content(pdf_path, only_pages))
 
-        pages_data.append({
-            "page_index": i,
-            "text": final_text,
-            "images": final_images,
-            "mode": mode
-        })
 
-    doc.close()
-    return pages_data
\ No newline at end of file
+def iter_mixed_content(
+    pdf_path: str,
+    only_pages: Optional[Collection[int]] = None,
+    page_order: Optional[Sequence[int]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    與 extract_mixed_content 相同，但逐頁產出，不必等整份 PDF 渲染完。
+    page_order: 依此順序產出頁面 (例如依目標相關度排序，見 core.budget)；未指定時依頁碼順序。
+    """
+    # 中途停止迭代 (例如 Ctrl-C) 時也會關閉文件
+    with fitz.open(pdf_path) as doc:
+        for i in page_order if page_order is not None else range(len(doc)):
+            if only_pages is not None and i not in only_pages:
+                continue
+            page = doc.load_page(i)
+            metrics = analyze_page_metrics(page)
+            mode = metrics["mode"]
+
+            final_text = ""
+            final_images = []
+
+            if mode == "VISION":
+                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
+                final_images.append(pix.tobytes("png"))
+                final_text = "[System: Scanned Page / Image Detected]"
+            elif mode == "HYBRID":
+                final_text = page.get_text()
+                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
+                final_images.append(pix.tobytes("png"))
+            else:
+                final_text = page.get_text()
+
+            yield {
+                "page_index": i,
+                "text": final_text,
+                "images": final_images,
+                "mode": mode,
+                # 文字框 (x0, y0, x1, y1, word, block, line, word_no)，供 core.verify 比對數字
+                "words": page.get_text("words"),
+            }
+
+
+def parse_page_ranges(spec: str) -> Set[int]:
+    """
+    解析使用者輸入的頁碼 (以 1 為起始)，例如 "5" 或 "3-7,10"，回傳 0-based page index 集合。
+    無法解析的片段直接略過。
+    """
+    pages: Set[int] = set()
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                start_s, end_s = part.split("-", 1)
+                pages.update(p - 1 for p in range(int(start_s), int(end_s) + 1))
+            else:
+                pages.add(int(part) - 1)
+        except ValueError:
+            continue
+    return pages
@@ -0,0 +1,161 @@
+"""
+PDF → Markdown 快速轉換：以 PyMuPDF 文字層逐頁轉換，多個 worker process 平行處理。
+
+- 每頁開頭加上 `<!-- Page N -->` 頁碼標記 (core.chunking 依此切段並標示頁碼範圍)
+- 字級明顯大於內文的行轉成 Markdown 標題 (`#` / `##` / `###`)，其餘依文字區塊分段
+- 以檔案 SHA-256 快取結果：同一份 PDF 第二次轉換直接讀檔
+- `iter_markdown_pages` 依頁碼順序逐頁產出，UI 可以邊轉換邊顯示
+
+MarkItDown 仍可作為相容模式 (`convert_with_markitdown`)，未安裝時才會報錯。
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from .journal import file_sha256
+
+PAGE_MARKER = "<!-- Page {} -->"
+# 每個 worker 一次處理的頁數 (每批只開一次檔案)
+_PAGES_PER_TASK = 8
+_WHITESPACE = re.compile(r"[ \t]+")
+
+
+def default_cache_dir() -> Path:
+    return Path(os.getenv("ESG_MARKDOWN_CACHE", ".cache/markdown"))
+
+
+def _body_font_size(blocks: List[dict]) -> float:
+    """以字元數加權的字級中位數視為內文字級。"""
+    sizes: List[float] = []
+    for block in blocks:
+        for line in block.get("lines", []):
+            for span in line["spans"]:
+                sizes.extend([round(span["size"], 1)] * len(span["text"].strip()))
+    return statistics.median(sizes) if sizes else 0.0
+
+
+def _heading_level(size: float, body: float, text: str) -> int:
+    if body <= 0 or len(text) > 120:
+        return 0
+    ratio = size / body
+    if ratio >= 1.8:
+        return 1
+    if ratio >= 1.4:
+        return 2
+    if ratio >= 1.15:
+        return 3
+    return 0
+
+
+def page_to_markdown(page: fitz.Page, page_number: int) -> str:
+    """單頁文字層 → Markdown (page_number 為 1-based)。"""
+    blocks = [b for b in page.get_text("dict")["blocks"] if b.get("type", 0) == 0]
+    body = _body_font_size(blocks)
+    out: List[str] = [PAGE_MARKER.format(page_number)]
+    for block in blocks:
+        paragraph: List[str] = []
+        for line in block.get("lines", []):
+            text = _WHITESPACE.sub(" ", "".join(span["text"] for span in line["spans"])).strip()
+            if not text:
+                continue
+            size = max(span["size"] for span in line["spans"])
+            level = _heading_level(size, body, text)
+            if level:
+                if paragraph:
+                    out.append(" ".join(paragraph))
+                    paragraph = []
+                out.append(f"{'#' * level} {text}")
+            else:
+                paragraph.append(text)
+        if paragraph:
+            out.append(" ".join(paragraph))
+    return "\n\n".join(out)
+
+
+def _convert_pages(pdf_path: str, page_indices: List[int]) -> List[Tuple[int, str]]:
+    """worker：開一次檔案，轉換一批頁面 (0-based)。"""
+    with fitz.open(pdf_path) as doc:
+        return [(i, page_to_markdown(doc.load_page(i), i + 1)) for i in page_indices]
+
+
+def iter_markdown_pages(
+    pdf_path: str,
+    *,
+    workers: Optional[int] = None,
+) -> Iterator[Tuple[int, int, str]]:
+    """
+    依頁碼順序逐頁產出 (page_index, total_pages, markdown)。
+    workers: process 數，預設 min(CPU 數, 批次數)；1 代表在目前 process 循序轉換。
+    """
+    with fitz.open(pdf_path) as doc:
+        total = len(doc)
+    batches = [list(range(i, min(i + _PAGES_PER_TASK, total))) for i in range(0, total, _PAGES_PER_TASK)]
+    workers = workers or min(os.cpu_count() or 1, len(batches) or 1)
+
+    if workers <= 1 or len(batches) <= 1:
+        for batch in batches:
+            for i, md in _convert_pages(pdf_path, batch):
+                yield i, total, md
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # 依送出順序取結果：前面的批次完成就能先顯示，後面的批次同時在其他 process 轉換
+        futures = [pool.submit(_convert_pages, pdf_path, batch) for batch in batches]
+        for future in futures:
+            for i, md in future.result():
+                yield i, total, md
+
+
+def convert_pdf_to_markdown(
+    pdf_path: str,
+    *,
+    workers: Optional[int] = None,
+    cache_dir: Optional[Path] = None,
+    on_page: Optional[Callable[[int, int, str], None]] = None,
+) -> Tuple[str, bool]:
+    """
+    回傳 (Markdown, 是否命中快取)。
+    on_page(page_index, total_pages, page_markdown)：每轉好一頁呼叫一次 (命中快取時不呼叫)。
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    cache_path = cache_dir / f"{file_sha256(pdf_path)}.md"
+    if cache_path.is_file():
+        return cache_path.read_text(encoding="utf-8"), True
+
+    pages: Dict[int, str] = {}
+    for i, total, md in iter_markdown_pages(pdf_path, workers=workers):
+        pages[i] = md
+        if on_page is not None:
+            on_page(i, total, md)
+    markdown = "\n\n".join(pages[i] for i in sorted(pages))
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".md.tmp")
+    tmp_path.write_text(markdown, encoding="utf-8")
+    tmp_path.replace(cache_path)
+    return markdown, False
+
+
+def convert_with_markitdown(pdf_path: str) -> str:
+    """相容模式：整份交給 MarkItDown (需安裝 markitdown[pdf])。"""
+    from markitdown import MarkItDown
+
+    return MarkItDown().convert(pdf_path).text_content
+
+
+__all__ = [
+    "PAGE_MARKER",
+    "convert_pdf_to_markdown",
+    "convert_with_markitdown",
+    "default_cache_dir",
+    "iter_markdown_pages",
+    "page_to_markdown",
+]
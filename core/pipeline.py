@@ -0,0 +1,242 @@
+"""
+PDF 頁面 → 目標 JSON 的共用擷取流程。
+
+CLI (`esg_goal_miner.py`) 與 Streamlit JSON 頁籤共用同一套逐頁呼叫邏輯，
+確保頁面模式 (TEXT / HYBRID / VISION)、頁碼等資訊都會正確傳給 GeminiClient。
+"""
+
+from __future__ import annotations
+
+import copy
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .budget import ReportBudget
+from .compaction import has_goal_signal
+from .dedup import page_fingerprint
+from .dictionary import tag_text
+from .gemini_client import GeminiClient
+from .journal import RunJournal
+from .pdf_extractor import page_layer_text
+from .reuse import PriorPageIndex, diff_hint
+from .schema import GoalResponseError
+from .usage import usage_scope
+from .verify import verify_goal_items
+
+
+@dataclass
+class PipelineResult:
+    """
+    items: 所有頁面合格的目標
+    failed_pages: 無法取得合法 JSON 的頁面 ({page_index, mode, error})，可只針對這些頁重跑
+    problems: 驗證時被修正或丟棄的欄位說明 ({page_index, problem})
+    escalated_pages: cascade 模式下改由較強模型處理的頁面 ({page_index, mode, reason})
+    processed_pages: 本次實際送出請求的頁數 (不含重複頁)
+    deduplicated_pages: 內容與先前頁面完全相同、直接沿用結果的頁面 ({page_index, duplicate_of})
+    unverified_pages: 有數值在頁面上找不到的頁面 ({page_index, mode, issues})，只需針對這些頁重新擷取
+    reused_pages: 與前一年報告幾乎相同、直接沿用前一年結果的頁面 ({page_index, report_year, prior_page_index, distance})
+    skipped_pages: 未送出請求的頁面 ({page_index, mode, reason})，例如文字頁完全沒有字典詞彙 (no_esg_terms)
+        或預算不足 (budget)
+    degraded_pages: 因預算吃緊而降級送出的頁面 ({page_index, mode, degradations})，見 core.budget
+    """
+
+    items: List[Dict[str, Any]] = field(default_factory=list)
+    failed_pages: List[Dict[str, Any]] = field(default_factory=list)
+    problems: List[Dict[str, Any]] = field(default_factory=list)
+    escalated_pages: List[Dict[str, Any]] = field(default_factory=list)
+    processed_pages: int = 0
+    deduplicated_pages: List[Dict[str, Any]] = field(default_factory=list)
+    reused_pages: List[Dict[str, Any]] = field(default_factory=list)
+    unverified_pages: List[Dict[str, Any]] = field(default_factory=list)
+    skipped_pages: List[Dict[str, Any]] = field(default_factory=list)
+    degraded_pages: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def escalation_rate(self) -> float:
+        return len(self.escalated_pages) / self.processed_pages if self.processed_pages else 0.0
+
+
+def extract_goals_from_pages(
+    client: GeminiClient,
+    pages: Iterable[Dict[str, Any]],
+    report_year: int,
+    journal: Optional[RunJournal] = None,
+    prior_index: Optional[PriorPageIndex] = None,
+    use_diff_hint: bool = False,
+    route_by_dictionary: bool = False,
+    budget: Optional[ReportBudget] = None,
+) -> PipelineResult:
+    """
+    逐頁呼叫 `GeminiClient.extract_page`，並補上 Report_Year。
+
+    參數:
+        client: 已初始化的 GeminiClient
+        pages: `extract_mixed_content` 的輸出，或逐頁產出的 iterator (例如 core.prefetch.PagePrefetcher)；
+            只依序讀取一次，不會保留頁面圖片
+        report_year: 報告年份
+        journal: 若提供，每頁完成 (或失敗) 後立即寫入 checkpoint
+        prior_index: 若提供，先查詢前一年相似頁面 (core.reuse)，可沿用時不呼叫 LLM
+        use_diff_hint: 相似但有變動的頁面，在 Prompt 中附上與前一年的文字差異
+        route_by_dictionary: 純文字頁 (TEXT) 若完全沒有命中 core.dictionary 的任何詞彙，
+            且沒有百分比 / 數量單位 / 基準年 / 目標用語 (core.compaction.has_goal_signal)，
+            視為與 ESG 目標無關而不送出 (記在 skipped_pages)；有圖片的頁面一律送出
+        budget: 若提供，每頁送出前依剩餘預算決定原樣送出、降級 (不送圖片 / 壓縮文字) 或略過；
+            略過的頁面不寫入 journal，之後可用 resume 補跑。pages 可依相關度排序 (core.budget)，
+            回傳的 items 一律依頁碼排列
+
+    內容完全相同的頁面 (見 core.dedup) 只送出一次；其餘頁面複製結果，
+    每筆目標加上 `Duplicate_Of_Page` (原始頁的 page_index)。
+    每筆目標都帶有 `Source_Page` (來源頁的 page_index) 與 `Source_Mode` (TEXT / HYBRID / VISION)，
+    供 core.merge 記錄合併來源、core.splice 局部重新擷取。
+    """
+    result = PipelineResult()
+    # 內容指紋 -> 第一次出現的 page_index
+    first_seen: Dict[str, int] = {}
+    # 原始頁的處理結果：(items, error)；error 不為 None 代表該頁失敗
+    outcomes: Dict[int, Tuple[List[Dict[str, Any]], Optional[str]]] = {}
+
+    for page in pages:
+        page_index = page["page_index"]
+        mode = page.get("mode", "TEXT")
+
+        fingerprint = page_fingerprint(page)
+        if fingerprint in first_seen:
+            source = first_seen[fingerprint]
+            _fan_out(result, journal, page_index, mode, source, outcomes[source])
+            continue
+        first_seen[fingerprint] = page_index
+
+        if (
+            route_by_dictionary
+            and mode == "TEXT"
+            and not tag_text(page["text"])
+            and not has_goal_signal(page["text"])
+        ):
+            result.skipped_pages.append({"page_index": page_index, "mode": mode, "reason": "no_esg_terms"})
+            if journal is not None:
+                journal.append(page_index, mode=mode, items=[], skipped="no_esg_terms")
+            outcomes[page_index] = ([], None)
+            continue
+
+        hint = ""
+        match = prior_index.lookup(page, report_year=report_year) if prior_index is not None else None
+        if match is not None and match.reusable:
+            items = match.reused_items(report_year)
+            for item in items:
+                item["Source_Page"] = page_index
+                item["Source_Mode"] = mode
+            result.reused_pages.append(
+                {
+                    "page_index": page_index,
+                    "report_year": match.record["report_year"],
+                    "prior_page_index": match.record["page_index"],
+                    "distance": match.distance,
+                }
+            )
+            result.items.extend(items)
+            if journal is not None:
+                journal.append(
+                    page_index,
+                    mode=mode,
+                    items=items,
+                    reused_from={
+                        "report_year": match.record["report_year"],
+                        "page_index": match.record["page_index"],
+                    },
+                )
+            outcomes[page_index] = (items, None)
+            continue
+        if match is not None and use_diff_hint:
+            hint = diff_hint(match.record["text"], page_layer_text(page))
+
+        request_page = page
+        if budget is not None:
+            planned = budget.plan(page, report_year)
+            if planned is None:
+                result.skipped_pages.append({"page_index": page_index, "mode": mode, "reason": "budget"})
+                # 未處理的頁面不作為重複頁的來源
+                del first_seen[fingerprint]
+                continue
+            request_page, degradations = planned
+            if degradations:
+                result.degraded_pages.append(
+                    {"page_index": page_index, "mode": mode, "degradations": degradations}
+                )
+
+        result.processed_pages += 1
+        try:
+            with usage_scope() as page_usage:
+                try:
+                    extraction = client.extract_page(
+                        page_text=request_page["text"],
+                        images=request_page["images"],
+                        current_year=report_year,
+                        mode=mode,
+                        page_index=page_index,
+                        hint=hint,
+                    )
+                finally:
+                    if budget is not None:
+                        budget.charge(page_usage.records)
+        except GoalResponseError as e:
+            result.failed_pages.append({"page_index": page_index, "mode": mode, "error": str(e)})
+            if journal is not None:
+                journal.append(page_index, mode=mode, items=[], status="failed", error=str(e))
+            outcomes[page_index] = ([], str(e))
+            continue
+
+        if extraction.escalation_reason:
+            result.escalated_pages.append(
+                {"page_index": page_index, "mode": mode, "reason": extraction.escalation_reason}
+            )
+        result.problems.extend(
+            {"page_index": page_index, "problem": p} for p in extraction.problems
+        )
+        # 本地數值驗證：為每筆目標加上 Verification，找不到數字的頁面列出供重跑。
+        # 比對頁面原本的文字層 (移除樣板 / 壓縮前)；掃描頁沒有文字層，標記 not_verifiable
+        issues = verify_goal_items(extraction.items, page_layer_text(page), page.get("words"), mode=mode)
+        if issues:
+            result.unverified_pages.append({"page_index": page_index, "mode": mode, "issues": issues})
+        for item in extraction.items:
+            item.setdefault("Report_Year", report_year)
+            item["Source_Page"] = page_index
+            item["Source_Mode"] = mode
+            result.items.append(item)
+        if journal is not None:
+            journal.append(page_index, mode=mode, items=extraction.items)
+        outcomes[page_index] = (extraction.items, None)
+
+    if budget is not None:
+        # 依相關度排序處理時，恢復頁碼順序 (穩定排序，同頁維持原順序)
+        result.items.sort(key=lambda item: item["Source_Page"])
+    return result
+
+
+def _fan_out(
+    result: PipelineResult,
+    journal: Optional[RunJournal],
+    page_index: int,
+    mode: str,
+    source: int,
+    outcome: Tuple[List[Dict[str, Any]], Optional[str]],
+) -> None:
+    """把原始頁的結果複製給重複頁。"""
+    source_items, error = outcome
+    result.deduplicated_pages.append({"page_index": page_index, "duplicate_of": source})
+    if error is not None:
+        result.failed_pages.append({"page_index": page_index, "mode": mode, "error": error})
+        if journal is not None:
+            journal.append(page_index, mode=mode, items=[], status="failed", error=error, duplicate_of=source)
+        return
+
+    items = copy.deepcopy(source_items)
+    for item in items:
+        item["Duplicate_Of_Page"] = source
+        item["Source_Page"] = page_index
+        item["Source_Mode"] = mode
+    result.items.extend(items)
+    if journal is not None:
+        journal.append(page_index, mode=mode, items=items, duplicate_of=source)
+
+
+__all__ = ["PipelineResult", "extract_goals_from_pages"]
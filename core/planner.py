@@ -0,0 +1,209 @@
+"""
+Dry-run 規劃：在呼叫 Gemini 之前估算一份報告會用掉多少呼叫、圖片、tokens、成本與時間。
+
+與實際執行使用同一套路由 (`analyze_page_metrics`) 與 Prompt (`build_page_parts` → `get_audit_prompt`)，
+但不渲染全尺寸截圖、不連網：圖片大小以小縮圖推估、image tokens 依頁面尺寸計算，每份報告只需數百毫秒。
+
+估算規則：
+- 文字 tokens：ASCII 約 4 字元 / token，CJK 等非 ASCII 字元約 1 字元 / token。
+- 圖片 tokens：Gemini 以 768x768 tile 計，每個 tile 258 tokens (兩邊都 <= 384px 時只算 258)。
+- 圖片大小：以 0.5 倍解析度快速渲染縮圖，PNG 大小依像素比例放大再乘上壓縮修正係數 (經驗值)。
+- 輸出 tokens 與每次呼叫延遲使用固定假設值，可由參數調整 (例如改用過去 usage.json 的 p50)。
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+import fitz  # PyMuPDF
+
+from .gemini_client import build_page_requests
+from .pdf_extractor import analyze_page_metrics
+from .prompt import DEFAULT_MAX_PROMPT_TOKENS, estimate_text_tokens
+from .usage import estimate_cost
+
+# extract_mixed_content 以 2 倍解析度渲染截圖
+_RENDER_ZOOM = 2
+_THUMBNAIL_ZOOM = 0.5
+# PNG 大小隨像素數略低於線性成長，放大縮圖大小時乘上的修正係數
+_PNG_SCALE_FACTOR = 0.5
+_IMAGE_TILE_PX = 768
+_IMAGE_TILE_TOKENS = 258
+
+DEFAULT_OUTPUT_TOKENS = 400
+# 單次呼叫的預估延遲 (秒)，依呼叫種類
+DEFAULT_LATENCY_S = {"extract": 3.0, "extract_multimodal": 6.0, "describe_images": 5.0}
+
+
+def estimate_image_tokens(width_px: int, height_px: int) -> int:
+    if width_px <= 384 and height_px <= 384:
+        return _IMAGE_TILE_TOKENS
+    tiles = math.ceil(width_px / _IMAGE_TILE_PX) * math.ceil(height_px / _IMAGE_TILE_PX)
+    return tiles * _IMAGE_TILE_TOKENS
+
+
+def _page_calls(
+    page: fitz.Page,
+    page_index: int,
+    *,
+    report_year: int,
+    image_strategy: str,
+    output_tokens: int,
+    max_prompt_tokens: Optional[int],
+) -> Dict[str, Any]:
+    """單頁的路由結果與預估呼叫 (與 GeminiClient.extract_page 的分支一致)。"""
+    metrics = analyze_page_metrics(page)
+    mode = metrics["mode"]
+    text = "[System: Scanned Page / Image Detected]" if mode == "VISION" else page.get_text()
+    use_images = mode in ("HYBRID", "VISION")
+    inline_images = use_images and image_strategy == "inline"
+
+    width_px = int(page.rect.width * _RENDER_ZOOM)
+    height_px = int(page.rect.height * _RENDER_ZOOM)
+    image_bytes = 0
+    if use_images:
+        thumbnail = page.get_pixmap(matrix=fitz.Matrix(_THUMBNAIL_ZOOM, _THUMBNAIL_ZOOM)).tobytes("png")
+        image_bytes = int(len(thumbnail) * (_RENDER_ZOOM / _THUMBNAIL_ZOOM) ** 2 * _PNG_SCALE_FACTOR)
+    image_tokens = estimate_image_tokens(width_px, height_px) if use_images else 0
+
+    requests = build_page_requests(
+        page_text=text,
+        images=[],
+        current_year=report_year,
+        use_images=use_images,
+        inline_images=inline_images,
+        # describe 策略下第二次呼叫會帶入圖表描述，長度約等於一次輸出
+        image_desc="x" * (output_tokens * 4) if use_images and not inline_images else "",
+        max_prompt_tokens=max_prompt_tokens,
+    )
+
+    calls: List[Dict[str, Any]] = []
+    if use_images and not inline_images:
+        calls.append(
+            {"kind": "describe_images", "prompt_tokens": image_tokens + 50, "image_bytes": image_bytes}
+        )
+    # 過長的頁面會切成多個請求 (GeminiClient 同樣規則)，圖片只附在第一個
+    for i, parts in enumerate(requests):
+        prompt_tokens = estimate_text_tokens(parts[0])
+        if inline_images and i == 0:
+            calls.append(
+                {
+                    "kind": "extract_multimodal",
+                    "prompt_tokens": prompt_tokens + image_tokens,
+                    "image_bytes": image_bytes,
+                }
+            )
+        else:
+            calls.append({"kind": "extract", "prompt_tokens": prompt_tokens, "image_bytes": 0})
+
+    return {
+        "page_index": page_index,
+        "mode": mode,
+        "reason": metrics["reason"],
+        "calls": calls,
+    }
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {
+        "pages": 0,
+        "calls": 0,
+        "prompt_tokens": 0,
+        "output_tokens": 0,
+        "image_bytes": 0,
+        "cost_usd": 0.0,
+        "duration_s": 0.0,
+    }
+
+
+def plan_report(
+    pdf_path: Path | str,
+    report_year: int,
+    *,
+    pages_filter: Optional[Set[int]] = None,
+    image_strategy: str = "inline",
+    model_name: str = "gemini-2.5-flash-lite",
+    output_tokens: int = DEFAULT_OUTPUT_TOKENS,
+    latency_s: Optional[Dict[str, float]] = None,
+    max_prompt_tokens: Optional[int] = DEFAULT_MAX_PROMPT_TOKENS,
+) -> Dict[str, Any]:
+    """
+    回傳 {"totals", "by_mode", "pages", ...}；totals / by_mode 的欄位:
+    pages, calls, prompt_tokens, output_tokens, image_bytes, cost_usd, duration_s (循序執行的預估時間)。
+    """
+    latency = {**DEFAULT_LATENCY_S, **(latency_s or {})}
+    start = time.perf_counter()
+    totals = _empty_totals()
+    by_mode: Dict[str, Dict[str, Any]] = defaultdict(_empty_totals)
+    pages: List[Dict[str, Any]] = []
+
+    with fitz.open(str(pdf_path)) as doc:
+        total_pages = len(doc)
+        for i in range(total_pages):
+            if pages_filter and i not in pages_filter:
+                continue
+            page_plan = _page_calls(
+                doc.load_page(i),
+                i,
+                report_year=report_year,
+                image_strategy=image_strategy,
+                output_tokens=output_tokens,
+                max_prompt_tokens=max_prompt_tokens,
+            )
+            row = {"page_index": i, "mode": page_plan["mode"], "reason": page_plan["reason"]}
+            row.update(_empty_totals())
+            row["pages"] = 1
+            for call in page_plan["calls"]:
+                row["calls"] += 1
+                row["prompt_tokens"] += call["prompt_tokens"]
+                row["output_tokens"] += output_tokens
+                row["image_bytes"] += call["image_bytes"]
+                row["cost_usd"] += estimate_cost(model_name, call["prompt_tokens"], output_tokens)
+                row["duration_s"] += latency.get(call["kind"], latency["extract"])
+            pages.append(row)
+            for agg in (totals, by_mode[row["mode"]]):
+                for key in agg:
+                    agg[key] += row[key]
+
+    for agg in [totals, *by_mode.values()]:
+        agg["cost_usd"] = round(agg["cost_usd"], 6)
+        agg["duration_s"] = round(agg["duration_s"], 1)
+
+    return {
+        "pdf": str(pdf_path),
+        "report_year": report_year,
+        "model": model_name,
+        "image_strategy": image_strategy,
+        "total_pages": total_pages,
+        "totals": totals,
+        "by_mode": dict(sorted(by_mode.items())),
+        "pages": pages,
+        "planning_time_s": round(time.perf_counter() - start, 3),
+    }
+
+
+def plan_summary_path(output_path: Path) -> Path:
+    """輸出 JSON 旁的 dry-run 規劃路徑，例如 All_json/2023.json -> All_json/2023.plan.json。"""
+    return output_path.with_name(f"{output_path.stem}.plan.json")
+
+
+def write_plan(plan: Dict[str, Any], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(plan, f, ensure_ascii=False, indent=2)
+
+
+__all__ = [
+    "DEFAULT_LATENCY_S",
+    "DEFAULT_OUTPUT_TOKENS",
+    "estimate_image_tokens",
+    "estimate_text_tokens",
+    "plan_report",
+    "plan_summary_path",
+    "write_plan",
+]
@@ -0,0 +1,108 @@
+"""
+頁面渲染與 LLM 呼叫的 producer / consumer 管線。
+
+`PagePrefetcher` 在背景執行緒以 `iter_mixed_content` 逐頁分析 / 渲染，放進有上限的 queue；
+擷取流程 (consumer) 在等待 Gemini 回應的同時，下一頁已經在渲染。
+queue 滿時 producer 會停下來等待 (backpressure)，同時在記憶體中的截圖最多 maxsize 頁。
+整份報告的耗時因此接近 max(渲染時間, LLM 時間)，而不是兩者相加。
+
+    with PagePrefetcher(pdf_path, only_pages=todo, maxsize=4) as pages:
+        result = extract_goals_from_pages(client, pages, report_year)
+    print(pages.stats())
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import Any, Collection, Dict, Iterator, Optional, Sequence
+
+from .pdf_extractor import iter_mixed_content
+
+_DONE = object()
+
+
+class PagePrefetcher:
+    def __init__(
+        self,
+        pdf_path: str,
+        only_pages: Optional[Collection[int]] = None,
+        *,
+        maxsize: int = 4,
+        page_order: Optional[Sequence[int]] = None,
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self._pdf_path = str(pdf_path)
+        self._only_pages = only_pages
+        self._page_order = page_order
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._render_s = 0.0
+        self._wait_s = 0.0
+        self._pages = 0
+
+    def _put(self, item: Any) -> bool:
+        """放入 queue；consumer 已停止時放棄，回傳 False。"""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self) -> None:
+        try:
+            pages = iter_mixed_content(self._pdf_path, self._only_pages, self._page_order)
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                page = next(pages, _DONE)
+                self._render_s += time.perf_counter() - start
+                if not self._put(page) or page is _DONE:
+                    break
+        except BaseException as e:  # noqa: BLE001 - 交給 consumer 端重新拋出
+            self._put(e)
+
+    def start(self) -> "PagePrefetcher":
+        self._thread = threading.Thread(target=self._produce, name="page-prefetch", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "PagePrefetcher":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if self._thread is None:
+            self.start()
+        while True:
+            start = time.perf_counter()
+            item = self._queue.get()
+            self._wait_s += time.perf_counter() - start
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            self._pages += 1
+            yield item
+
+    def stats(self) -> Dict[str, float]:
+        """render_s: 背景渲染總耗時；wait_s: 擷取流程等待渲染的時間 (越接近 0 代表重疊得越好)。"""
+        return {
+            "pages": self._pages,
+            "render_s": round(self._render_s, 3),
+            "wait_s": round(self._wait_s, 3),
+        }
+
+
+__all__ = ["PagePrefetcher"]
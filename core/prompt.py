@@ -1,11 +1,69 @@
-def get_audit_prompt(current_year: int, content: str) -> str:
-    """
-    產生 ESG 漂綠稽核用的 LLM Prompt。
+import hashlib
+import json
+import math
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Tuple
 
-    參數:
-        current_year: 報告年份
-        content: Markdown 或文字形式的報告內容
-    """
+from .compaction import compact_text
+from .dictionary import render_dictionary_section
+
+# Gemini `response_schema`：與下方 Prompt 中的「Output JSON Schema」一一對應。
+# 模型端依此強制輸出結構，本地端再由 core.schema.validate_goal_items 做嚴格驗證。
+_HISTORY_POINT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "Year": {"type": "INTEGER"},
+        "Value": {"type": "STRING"},
+    },
+    "required": ["Year", "Value"],
+}
+
+GOAL_ITEM_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "Report_Year": {"type": "INTEGER"},
+        "Standardized_Focus_Area": {"type": "STRING"},
+        "Standardized_Metric": {"type": "STRING"},
+        "Scope": {"type": "STRING"},
+        "Original_Goal_Text": {"type": "STRING"},
+        "Target_Deadline": {"type": "INTEGER", "nullable": True},
+        "Target_Value": {"type": "STRING", "nullable": True},
+        "Baseline_Year": {"type": "STRING", "nullable": True},
+        "Progress_History": {"type": "ARRAY", "items": _HISTORY_POINT_SCHEMA},
+        "Confidence": {"type": "NUMBER"},
+    },
+    "required": [
+        "Report_Year",
+        "Standardized_Focus_Area",
+        "Standardized_Metric",
+        "Scope",
+        "Original_Goal_Text",
+        "Target_Deadline",
+        "Target_Value",
+        "Baseline_Year",
+        "Progress_History",
+        "Confidence",
+    ],
+}
+
+GOAL_RESPONSE_SCHEMA = {"type": "ARRAY", "items": GOAL_ITEM_SCHEMA}
+
+
+# 單次請求 Prompt 的 token 上限 (本地估算值)，超過時先壓縮、仍超過再切成多段請求
+DEFAULT_MAX_PROMPT_TOKENS = int(os.getenv("GEMINI_MAX_PROMPT_TOKENS", "24000"))
+
+
+def estimate_text_tokens(text: str) -> int:
+    """本地 token 估算：ASCII 約 4 字元 / token，CJK 等非 ASCII 字元約 1 字元 / token。"""
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return math.ceil(ascii_chars / 4) + (len(text) - ascii_chars)
+
+
+def _render_template(current_year: int, content: str, focus_areas: Optional[Tuple[str, ...]] = None) -> str:
+    dictionary_section = render_dictionary_section(focus_areas)
     # 注意：這裡使用 {{ }} 來轉義 JSON 的大括號，以便 f-string 正確運作
     template = f"""
 # Role
@@ -20,46 +78,7 @@ def get_audit_prompt(current_year: int, content: str) -> str:
 # Task 1: Extraction & Standardization (提取與標準化)
 請將提取出的目標映射到以下的標準化階層結構。如果不完全匹配，請選擇語意最接近的選項。
 
-## 📚 Standardized ESG Dictionary (標準化字典)
-
-### 1. 🌍 Focus Area: Climate (氣候變遷)
-   - **Target Metrics**: 
-     - `Absolute GHG Reduction` (溫室氣體絕對減量)
-     - `Net Zero` (淨零排放)
-     - `Renewable Energy` (再生能源比例)
-     - `Energy Efficiency` (能源使用效率)
-   - **Typical Scopes**: `Scope 1+2`, `Scope 3`, `Value Chain`, `Global Operations`
-   - **Strict Formatting Rule**: 
-     - 當目標涉及 Scope 1 與 Scope 2 時，Output Scope 欄位請**嚴格**填入 `Scope 1+2`。
-     - **禁止**在 Scope 欄位加入地區、子公司或括號註記 (例如：**不要寫** `Scope 1+2 (Taiwan Operations)` 或 `Scope 1+2 (Company only)`，一律刪除括號內容，只保留 `Scope 1+2`)。
-
-### 2. 📦 Focus Area: Packaging (包裝與循環經濟)
-   - **Target Metrics**: 
-     - `Recycled Content` (再生料使用比例, e.g., rPET)
-     - `Virgin Plastic Reduction` (原生塑膠減量)
-     - `Packaging Design` (可回收/可堆肥設計, e.g., Recyclability)
-     - `Reuse Models` (重複使用模式/減量)
-     - `Waste to Landfill` (廢棄物掩埋率)
-   - **Typical Scopes**: `Plastic Packaging`, `Beverage Containers`, `Food Packaging`, `Global Portfolio`
-
-### 3. 💧 Focus Area: Water (水資源)
-   - **Target Metrics**: 
-     - `Water Replenishment` (水資源回補)
-     - `Water Use Efficiency` (用水效率/強度)
-   - **Typical Scopes**: `High Water-Risk Areas`, `Manufacturing Operations`
-
-### 4. 🌱 Focus Area: Agriculture (永續農業)
-   - **Target Metrics**: 
-     - `Regenerative Agriculture` (再生農業採用面積)
-     - `Sustainably Sourced` (永續採購比例)
-   - **Typical Scopes**: `Key Ingredients`, `Direct Supply Chain`
-
-### 5. 👥 Focus Area: Human Rights & Social (人權與社會)
-   - **Target Metrics**: 
-     - `Gender Diversity` (性別多樣性/管理層比例)
-     - `Safety` (工傷率/安全事故)
-     - `Human Rights Audit` (人權盡職調查)
-   - **Typical Scopes**: `Global Workforce`, `Management Roles`, `Tier 1 Suppliers`
+{dictionary_section}
 # Task 2: Data Cleaning Rules (資料清洗規則)
 1. **歷史進度與趨勢數據抽取 (Progress_History)**:
    - 當圖表或表格中出現「年度 + 數值」的趨勢線或長條圖 (例如 2005~2030 年排放量趨勢)，請**盡可能抽取所有可以辨識的年度與對應數值**。
@@ -98,7 +117,10 @@ def get_audit_prompt(current_year: int, content: str) -> str:
     "Baseline_Year": "String (若有提及基準年則填入，否則 null)",
     "Progress_History": [
        {{ "Year": Number, "Value": "String" }}
-    ]
+    ],
+
+    // 你對本筆擷取（特別是數值、年份與基準年）正確性的信心，0~1；圖表判讀不確定或文字層錯亂時請給低分
+    "Confidence": Number (e.g., 0.9)
   }}
 ]
 
@@ -109,3 +131,132 @@ def get_audit_prompt(current_year: int, content: str) -> str:
     return template
 
 
+def _hard_split(text: str, max_tokens: int) -> List[str]:
+    """單一段落仍超過上限時，依 estimate_text_tokens 的字元權重硬切。"""
+    pieces: List[str] = []
+    start = 0
+    cost = 0.0
+    for i, ch in enumerate(text):
+        weight = 0.25 if ord(ch) < 128 else 1.0
+        if cost + weight > max_tokens - 1 and i > start:
+            pieces.append(text[start:i])
+            start, cost = i, 0.0
+        cost += weight
+    pieces.append(text[start:])
+    return pieces
+
+
+@dataclass(frozen=True)
+class AuditPrompt:
+    """
+    預先展開的稽核 Prompt：靜態部分 (角色、字典、清洗規則、Schema) 每個年份只產生一次，
+    每頁只需把內容接在 prefix 之後。由 `compile_audit_prompt` 建立並快取。
+    """
+
+    current_year: int
+    prefix: str
+    suffix: str
+    prefix_tokens: int
+
+    def render(self, content: str) -> str:
+        return f"{self.prefix}{content}{self.suffix}"
+
+    def estimate_tokens(self, content: str) -> int:
+        """完整 Prompt 的估算 tokens (靜態部分已預先計算)。"""
+        return self.prefix_tokens + estimate_text_tokens(content)
+
+    def split_content(
+        self,
+        text: str,
+        *,
+        max_tokens: int = DEFAULT_MAX_PROMPT_TOKENS,
+        reserved_tokens: int = 0,
+    ) -> List[str]:
+        """
+        讓 render(...) 後的 Prompt 不超過 max_tokens：
+        1. 放得下 → 原樣回傳 [text]
+        2. 以 core.compaction 保留數值脈絡句子後放得下 → [壓縮後文字]
+        3. 仍放不下 → 依段落 (必要時硬切) 切成多段，每段各自成為一次請求
+
+        reserved_tokens: 同一請求中 text 以外的內容 (警告、圖表描述等) 的估算 tokens。
+        """
+        budget = max_tokens - self.prefix_tokens - reserved_tokens
+        if budget <= 0:
+            raise ValueError(
+                f"max_tokens={max_tokens} 小於 Prompt 固定部分 ({self.prefix_tokens + reserved_tokens} tokens)"
+            )
+        if estimate_text_tokens(text) <= budget:
+            return [text]
+        text = compact_text(text, min_chars=0)
+        if estimate_text_tokens(text) <= budget:
+            return [text]
+
+        chunks: List[str] = []
+        current: List[str] = []
+        current_tokens = 0
+        for paragraph in re.split(r"\n(?=\s*\n)|\n(?=#)", text):
+            tokens = estimate_text_tokens(paragraph) + 1
+            if tokens > budget:
+                pieces = _hard_split(paragraph, budget)
+            else:
+                pieces = [paragraph]
+            for piece in pieces:
+                tokens = estimate_text_tokens(piece) + 1
+                if current and current_tokens + tokens > budget:
+                    chunks.append("\n".join(current).strip("\n"))
+                    current, current_tokens = [], 0
+                current.append(piece)
+                current_tokens += tokens
+        if current:
+            chunks.append("\n".join(current).strip("\n"))
+        return [c for c in chunks if c.strip()] or [""]
+
+
+@lru_cache(maxsize=128)
+def compile_audit_prompt(current_year: int, focus_areas: Optional[Tuple[str, ...]] = None) -> AuditPrompt:
+    """
+    focus_areas: 只在字典段落列出這些領域 (core.dictionary.FOCUS_AREAS 的子集，依字典順序的 tuple)；
+    None 代表完整字典。
+    """
+    # 模板以 "{content}\n" 結尾：內容前的部分為 prefix
+    empty = _render_template(current_year, "", focus_areas)
+    prefix, suffix = empty[:-1], empty[-1:]
+    return AuditPrompt(
+        current_year=current_year,
+        prefix=prefix,
+        suffix=suffix,
+        prefix_tokens=estimate_text_tokens(empty),
+    )
+
+
+def get_audit_prompt(current_year: int, content: str) -> str:
+    """
+    產生 ESG 漂綠稽核用的 LLM Prompt。
+
+    參數:
+        current_year: 報告年份
+        content: Markdown 或文字形式的報告內容
+    """
+    return compile_audit_prompt(current_year).render(content)
+
+
+# Prompt 模板 + response schema 的版本指紋：任何一方修改都會改變，
+# 供 checkpoint journal 判斷既有頁面結果是否仍可沿用。
+PROMPT_VERSION = hashlib.sha256(
+    (
+        get_audit_prompt(current_year=0, content="")
+        + json.dumps(GOAL_RESPONSE_SCHEMA, sort_keys=True)
+    ).encode("utf-8")
+).hexdigest()[:12]
+
+
+__all__ = [
+    "AuditPrompt",
+    "DEFAULT_MAX_PROMPT_TOKENS",
+    "GOAL_ITEM_SCHEMA",
+    "GOAL_RESPONSE_SCHEMA",
+    "PROMPT_VERSION",
+    "compile_audit_prompt",
+    "estimate_text_tokens",
+    "get_audit_prompt",
+]
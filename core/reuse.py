@@ -0,0 +1,204 @@
+"""
+跨年度相似頁面沿用：同一家公司的年報大多數目標頁逐年只更新少數數字。
+
+`PriorPageIndex` 是一個 JSONL 索引檔，記錄先前處理過的每一頁 (報告年份、頁碼、頁面文字、SimHash 與擷取結果)。
+索引與查詢一律使用頁面原本的文字層 (`page_layer_text`)，不受 --strip-boilerplate / --compact 等前處理影響。
+處理新報告時，每一頁先查詢較早年份的相似頁面：
+
+- TEXT 頁與前一年的頁面幾乎相同 (SimHash 漢明距離 <= max_distance) 且頁面上所有數字都沒變
+  → 直接沿用先前的擷取結果，不呼叫 LLM；每筆目標標記 `Reused_From`。
+- 其他相似頁面 (數字有更新，或含圖表的 HYBRID / VISION 頁) → 仍送 LLM，可選擇附上與前一年的文字差異提示。
+
+索引以 SimHash 的 8 個 8-bit 區段分桶，漢明距離 <= 7 的頁面必定至少落在同一個桶中，查詢不需掃描整個索引。
+"""
+
+from __future__ import annotations
+
+import copy
+import difflib
+import hashlib
+import json
+import re
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .dedup import normalize_page_text
+from .pdf_extractor import page_layer_text
+
+# 中日韓文字沒有空白斷詞，每個字單獨成為一個 token (shingle 後即字元 n-gram)，
+# 其餘文字依連續的英數字切詞，中英文頁面的 token 數與 SimHash 距離才能用同一組門檻
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_TOKEN = re.compile(rf"[{_CJK}]|[^\W{_CJK}]+", re.UNICODE)
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*%?")
+_BANDS = 8
+_BAND_BITS = 8
+# 太短的頁面 (封面、分隔頁) SimHash 不可靠，不參與沿用
+_MIN_TOKENS = 20
+
+
+def simhash(text: str, *, shingle: int = 3) -> int:
+    """64-bit SimHash，特徵為正規化文字的連續 `shingle` 個詞 (中文為連續 `shingle` 個字)。"""
+    tokens = _TOKEN.findall(normalize_page_text(text).lower())
+    if len(tokens) < shingle:
+        tokens = tokens + [""] * (shingle - len(tokens))
+    weights = [0] * 64
+    for i in range(len(tokens) - shingle + 1):
+        feature = " ".join(tokens[i : i + shingle]).encode("utf-8")
+        h = int.from_bytes(hashlib.blake2b(feature, digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def page_numbers(text: str) -> Counter:
+    """頁面上出現的數字 (頁碼行已移除)，用來判斷是否只有文字 / 排版變動。"""
+    return Counter(_NUMBER.findall(normalize_page_text(text)))
+
+
+def diff_hint(prior_text: str, current_text: str, *, max_lines: int = 40) -> str:
+    """與前一年相似頁面的逐行差異，放進 Prompt 提醒模型注意更新的數字。"""
+    prior_lines = [l.strip() for l in prior_text.splitlines() if l.strip()]
+    current_lines = [l.strip() for l in current_text.splitlines() if l.strip()]
+    changes = [
+        line
+        for line in difflib.unified_diff(prior_lines, current_lines, lineterm="", n=0)
+        if line[:1] in "+-" and not line.startswith(("+++", "---"))
+    ]
+    if len(changes) > max_lines:
+        changes = changes[:max_lines] + [f"... ({len(changes) - max_lines} more changed lines)"]
+    return "\n".join(changes)
+
+
+@dataclass
+class PriorMatch:
+    """
+    record: 索引中的前一年頁面 ({report_year, page_index, mode, text, simhash, items})
+    distance: SimHash 漢明距離
+    reusable: True 代表可直接沿用擷取結果
+    """
+
+    record: Dict[str, Any]
+    distance: int
+    reusable: bool
+
+    def reused_items(self, report_year: int) -> List[Dict[str, Any]]:
+        items = copy.deepcopy(self.record["items"])
+        for item in items:
+            item["Report_Year"] = report_year
+            item["Reused_From"] = {
+                "report_year": self.record["report_year"],
+                "page_index": self.record["page_index"],
+            }
+        return items
+
+
+class PriorPageIndex:
+    """先前報告的頁面索引 (JSONL)。同一份 PDF 同一頁重複加入時以最後一筆為準。"""
+
+    def __init__(self, path: Path | str, *, max_distance: int = 6) -> None:
+        if not 0 <= max_distance <= _BANDS - 1:
+            raise ValueError(f"max_distance must be between 0 and {_BANDS - 1}")
+        self.path = Path(path)
+        self.max_distance = max_distance
+        self._records: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self._buckets: Dict[Tuple[int, int], List[Tuple[str, int]]] = {}
+        if self.path.is_file():
+            with self.path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._insert(json.loads(line))
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @staticmethod
+    def _bands(value: int) -> List[Tuple[int, int]]:
+        mask = (1 << _BAND_BITS) - 1
+        return [(b, (value >> (b * _BAND_BITS)) & mask) for b in range(_BANDS)]
+
+    def _insert(self, record: Dict[str, Any]) -> None:
+        key = (record["pdf_sha256"], record["page_index"])
+        if key not in self._records:
+            for band in self._bands(record["simhash"]):
+                self._buckets.setdefault(band, []).append(key)
+        self._records[key] = record
+
+    def lookup(self, page: Dict[str, Any], *, report_year: int) -> Optional[PriorMatch]:
+        """在較早年份的頁面中找最相似的一頁；沒有足夠相似的頁面時回傳 None。"""
+        text = page_layer_text(page)
+        if len(_TOKEN.findall(text)) < _MIN_TOKENS:
+            return None
+        fingerprint = simhash(text)
+        best: Optional[Tuple[int, int, Dict[str, Any]]] = None
+        seen: set = set()
+        for band in self._bands(fingerprint):
+            for key in self._buckets.get(band, []):
+                if key in seen:
+                    continue
+                seen.add(key)
+                record = self._records[key]
+                if record["report_year"] >= report_year:
+                    continue
+                distance = hamming_distance(fingerprint, record["simhash"])
+                if distance > self.max_distance:
+                    continue
+                # 距離相同時優先最近一年的報告
+                rank = (distance, -record["report_year"])
+                if best is None or rank < best[:2]:
+                    best = (distance, -record["report_year"], record)
+        if best is None:
+            return None
+
+        distance, _, record = best
+        reusable = (
+            page.get("mode", "TEXT") == "TEXT"
+            and record.get("mode") == "TEXT"
+            and page_numbers(text) == page_numbers(record["text"])
+        )
+        return PriorMatch(record=record, distance=distance, reusable=reusable)
+
+    def add_page(
+        self,
+        *,
+        pdf_sha256: str,
+        report_year: int,
+        page: Dict[str, Any],
+        items: List[Dict[str, Any]],
+    ) -> None:
+        """把一頁加入索引並追加寫入檔案；同一份 PDF 的同一頁已以相同內容收錄時不重複寫入。"""
+        text = page_layer_text(page)
+        if len(_TOKEN.findall(text)) < _MIN_TOKENS:
+            return
+        fingerprint = simhash(text)
+        existing = self._records.get((pdf_sha256, page["page_index"]))
+        if existing is not None and existing["simhash"] == fingerprint:
+            return
+        record = {
+            "pdf_sha256": pdf_sha256,
+            "report_year": report_year,
+            "page_index": page["page_index"],
+            "mode": page.get("mode", "TEXT"),
+            "simhash": fingerprint,
+            "text": text,
+            "items": items,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._insert(record)
+
+
+__all__ = [
+    "PriorMatch",
+    "PriorPageIndex",
+    "diff_hint",
+    "hamming_distance",
+    "page_numbers",
+    "simhash",
+]
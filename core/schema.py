@@ -0,0 +1,200 @@
+"""
+LLM 目標 JSON 的解析與嚴格驗證。
+
+對應 core.prompt.GOAL_ITEM_SCHEMA：
+- `parse_goal_response(text)`：解析模型輸出；無法解析時丟出 GoalResponseError，並標記是否疑似被截斷。
+- `salvage_goal_items(text)`：從被截斷的 JSON array 中救回已完整輸出的物件。
+- `validate_goal_items(items)`：逐筆驗證 / 正規化型別，回傳 (合格項目, 問題列表)。
+"""
+
+from __future__ import annotations
+
+import ast
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cleaning import clean_year
+from .prompt import GOAL_ITEM_SCHEMA
+
+_REQUIRED_TEXT_FIELDS = (
+    "Standardized_Focus_Area",
+    "Standardized_Metric",
+    "Scope",
+    "Original_Goal_Text",
+)
+
+
+class GoalResponseError(ValueError):
+    """模型輸出無法解析為目標 JSON list。"""
+
+    def __init__(self, message: str, *, raw_text: str = "", truncated: bool = False) -> None:
+        super().__init__(message)
+        self.raw_text = raw_text
+        self.truncated = truncated
+
+
+def parse_goal_response(text: str, *, finish_reason: str = "STOP") -> List[Any]:
+    """
+    將模型輸出解析為 list。
+
+    - JSON array → 直接回傳。
+    - 單一 object → 包成 [object]。
+    - 其他情況丟出 GoalResponseError；finish_reason 為 MAX_TOKENS 或錯誤位置落在字串尾端時標記 truncated。
+    """
+    stripped = (text or "").strip()
+    if not stripped:
+        if finish_reason == "MAX_TOKENS":
+            raise GoalResponseError("模型輸出為空 (MAX_TOKENS)", raw_text=text, truncated=True)
+        return []
+
+    try:
+        data = json.loads(stripped)
+    except json.JSONDecodeError as e:
+        truncated = finish_reason == "MAX_TOKENS" or e.pos >= len(stripped) - 1
+        raise GoalResponseError(
+            f"JSON 解析失敗: {e.msg} (pos {e.pos}/{len(stripped)})",
+            raw_text=text,
+            truncated=truncated,
+        ) from e
+
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        return [data]
+    raise GoalResponseError(f"預期 JSON list，實際為 {type(data).__name__}", raw_text=text)
+
+
+def salvage_goal_items(text: str) -> List[Any]:
+    """從截斷的 JSON array（例如 `[{...}, {...}, {"Scope": "Sc`）中取出所有完整的元素。"""
+    decoder = json.JSONDecoder()
+    stripped = (text or "").strip()
+    if not stripped.startswith("["):
+        return []
+
+    items: List[Any] = []
+    pos = 1
+    while pos < len(stripped):
+        while pos < len(stripped) and stripped[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(stripped) or stripped[pos] == "]":
+            break
+        try:
+            obj, pos = decoder.raw_decode(stripped, pos)
+        except json.JSONDecodeError:
+            break
+        items.append(obj)
+    return items
+
+
+def _as_optional_str(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text or text.lower() in ("none", "null", "n/a"):
+        return None
+    # 2020.0 之類的浮點年份轉回整數字串
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return text
+
+
+def _as_confidence(value: Any) -> Optional[float]:
+    """Confidence 正規化到 0~1；百分比寫法 (85 / "85%") 自動換算，無法解析回 None。"""
+    try:
+        conf = float(str(value).replace("%", "").strip())
+    except (TypeError, ValueError):
+        return None
+    if conf > 1:
+        conf /= 100
+    return min(max(conf, 0.0), 1.0)
+
+
+def _normalize_history(value: Any) -> Tuple[List[Dict[str, Any]], int]:
+    """回傳 (合格的歷史點, 被丟棄的點數)。"""
+    if value is None:
+        return [], 0
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            try:
+                value = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                return [], 1
+    if not isinstance(value, list):
+        return [], 1
+
+    history: List[Dict[str, Any]] = []
+    dropped = 0
+    for point in value:
+        if not isinstance(point, dict):
+            dropped += 1
+            continue
+        year = clean_year(point.get("Year"))
+        raw_value = _as_optional_str(point.get("Value"))
+        if year is None or raw_value is None:
+            dropped += 1
+            continue
+        history.append({"Year": year, "Value": raw_value})
+    return history, dropped
+
+
+def validate_goal_items(
+    items: List[Any], *, report_year: Optional[int] = None
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    依 GOAL_ITEM_SCHEMA 驗證並正規化每一筆目標。
+
+    - 必填文字欄位缺漏或非字串 → 整筆丟棄並記錄問題。
+    - 年份 / 數值欄位做型別正規化（"2030" → 2030、2020 → "2020"）。
+    - Progress_History 中格式錯誤的點會被移除並記錄。
+    - 未定義於 Schema 的欄位原樣保留，方便後續流程附加 metadata。
+    """
+    valid: List[Dict[str, Any]] = []
+    problems: List[str] = []
+    properties = GOAL_ITEM_SCHEMA["properties"]
+
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            problems.append(f"item {i}: 不是 JSON object ({type(item).__name__})")
+            continue
+
+        missing = [
+            f
+            for f in _REQUIRED_TEXT_FIELDS
+            if not isinstance(item.get(f), str) or not item.get(f).strip()
+        ]
+        if missing:
+            problems.append(f"item {i}: 缺少必填欄位 {', '.join(missing)}")
+            continue
+
+        out = dict(item)
+        for f in _REQUIRED_TEXT_FIELDS:
+            out[f] = item[f].strip()
+
+        out["Report_Year"] = clean_year(item.get("Report_Year")) or report_year
+        out["Target_Deadline"] = clean_year(item.get("Target_Deadline"))
+        if item.get("Target_Deadline") not in (None, "", "null") and out["Target_Deadline"] is None:
+            problems.append(f"item {i}: Target_Deadline 無法解析 ({item.get('Target_Deadline')!r})")
+        out["Target_Value"] = _as_optional_str(item.get("Target_Value"))
+        out["Baseline_Year"] = _as_optional_str(item.get("Baseline_Year"))
+        out["Confidence"] = _as_confidence(item.get("Confidence"))
+
+        history, dropped = _normalize_history(item.get("Progress_History"))
+        out["Progress_History"] = history
+        if dropped:
+            problems.append(f"item {i}: Progress_History 移除 {dropped} 個格式錯誤的點")
+
+        for key in properties:
+            out.setdefault(key, None)
+        valid.append(out)
+
+    return valid, problems
+
+
+__all__ = [
+    "GoalResponseError",
+    "parse_goal_response",
+    "salvage_goal_items",
+    "validate_goal_items",
+]
@@ -0,0 +1,60 @@
+"""
+指定頁面的局部重新擷取：把新結果替換進既有的目標 JSON。
+
+每筆目標都帶有 `Source_Page` (0-based page_index) 與 `Source_Mode`；
+合併過的目標 (core.merge) 另有 `Source_Pages`。替換規則：
+- 來源頁全部落在重新擷取頁面內的舊目標 → 移除
+- 合併目標只有部分來源頁被重新擷取 → 保留，從 Source_Pages 移除這些頁
+- 沒有任何來源頁資訊的舊目標無法判斷，原樣保留並計入 `unknown_source`
+新目標依來源頁插入，整體維持頁碼順序。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Collection, Dict, List, Tuple
+
+
+def _source_pages(item: Dict[str, Any]) -> List[int]:
+    if item.get("Source_Pages"):
+        return list(item["Source_Pages"])
+    if item.get("Source_Page") is not None:
+        return [item["Source_Page"]]
+    return []
+
+
+def _sort_page(item: Dict[str, Any]) -> float:
+    pages = _source_pages(item)
+    return min(pages) if pages else float("inf")
+
+
+def splice_page_items(
+    existing: List[Dict[str, Any]],
+    new_items: List[Dict[str, Any]],
+    pages: Collection[int],
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """回傳 (替換後的目標, 統計 {removed, trimmed, added, unknown_source})。"""
+    pages = set(pages)
+    kept: List[Dict[str, Any]] = []
+    stats = {"removed": 0, "trimmed": 0, "added": len(new_items), "unknown_source": 0}
+    for item in existing:
+        sources = _source_pages(item)
+        if not sources:
+            stats["unknown_source"] += 1
+            kept.append(item)
+            continue
+        remaining = [p for p in sources if p not in pages]
+        if not remaining:
+            stats["removed"] += 1
+            continue
+        if len(remaining) < len(sources):
+            item = {**item, "Source_Pages": remaining}
+            if item.get("Source_Page") in pages:
+                item["Source_Page"] = remaining[0]
+            stats["trimmed"] += 1
+        kept.append(item)
+
+    # sorted 為穩定排序：同頁的目標維持原本 / 新擷取的順序
+    return sorted(kept + list(new_items), key=_sort_page), stats
+
+
+__all__ = ["splice_page_items"]
@@ -0,0 +1,194 @@
+"""
+Gemini 呼叫用量統計。
+
+每一次模型呼叫都記錄一筆：prompt / output tokens、送出的圖片 bytes、延遲、重試次數，
+並標註頁碼、頁面模式 (TEXT / HYBRID / VISION) 與呼叫種類 (extract / describe_images)。
+`UsageTracker.summary()` 依 mode / model / kind / page 彙總，供 CLI 寫檔與 Streamlit 顯示。
+
+多個 Streamlit session 共用同一個 GeminiClient 時，以 `usage_scope()` 另外收集「這一次執行」的紀錄。
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 每百萬 tokens 的美元定價 (input, output)，依 Google AI Studio 付費層公告價格。
+# 未列出的模型成本記為 0，避免錯估；需要時直接在此補上。
+MODEL_PRICING: Dict[str, tuple[float, float]] = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-1.5-flash": (0.075, 0.30),
+}
+
+_SUM_FIELDS = (
+    "calls",
+    "failed_calls",
+    "retries",
+    "prompt_tokens",
+    "output_tokens",
+    "image_bytes",
+    "latency_s",
+    "cost_usd",
+)
+
+
+def estimate_cost(model_name: str, prompt_tokens: int, output_tokens: int) -> float:
+    """依 MODEL_PRICING 估算單次呼叫成本 (USD)。"""
+    price_in, price_out = MODEL_PRICING.get(model_name.split("/")[-1], (0.0, 0.0))
+    return (prompt_tokens * price_in + output_tokens * price_out) / 1_000_000
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def _aggregate(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    agg: Dict[str, Any] = {f: 0 for f in _SUM_FIELDS}
+    latencies: List[float] = []
+    for r in records:
+        agg["calls"] += 1
+        agg["failed_calls"] += 0 if r["ok"] else 1
+        agg["retries"] += r["retries"]
+        agg["prompt_tokens"] += r["prompt_tokens"]
+        agg["output_tokens"] += r["output_tokens"]
+        agg["image_bytes"] += r["image_bytes"]
+        agg["latency_s"] += r["latency_s"]
+        agg["cost_usd"] += r["cost_usd"]
+        latencies.append(r["latency_s"])
+    agg["latency_s"] = round(agg["latency_s"], 3)
+    agg["cost_usd"] = round(agg["cost_usd"], 6)
+    agg["latency_p50_s"] = round(_percentile(latencies, 50), 3)
+    agg["latency_p90_s"] = round(_percentile(latencies, 90), 3)
+    agg["latency_max_s"] = round(max(latencies), 3) if latencies else 0.0
+    return agg
+
+
+class UsageTracker:
+    """
+    執行緒安全的呼叫紀錄器，一個 GeminiClient 對應一個。
+
+    keep_records=False 時本身不保留紀錄，只轉記到進行中的 usage_scope()：
+    給長時間存活、由多個 session 共用的 client 使用，避免紀錄隨呼叫次數無限增長。
+    """
+
+    def __init__(self, keep_records: bool = True) -> None:
+        self._records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._keep_records = keep_records
+
+    def record(
+        self,
+        *,
+        model: str,
+        kind: str,
+        page_index: Optional[int],
+        mode: Optional[str],
+        prompt_tokens: int,
+        output_tokens: int,
+        image_bytes: int,
+        latency_s: float,
+        retries: int,
+        ok: bool = True,
+    ) -> Dict[str, Any]:
+        model = model.split("/")[-1]
+        entry = {
+            "model": model,
+            "kind": kind,
+            "page_index": page_index,
+            "mode": mode,
+            "prompt_tokens": int(prompt_tokens),
+            "output_tokens": int(output_tokens),
+            "image_bytes": int(image_bytes),
+            "latency_s": round(float(latency_s), 3),
+            "retries": int(retries),
+            "ok": ok,
+            "cost_usd": estimate_cost(model, prompt_tokens, output_tokens),
+        }
+        if self._keep_records:
+            with self._lock:
+                self._records.append(entry)
+        for scoped in _active_scopes.get():
+            if scoped is not self:
+                with scoped._lock:
+                    scoped._records.append(entry)
+        return entry
+
+    @property
+    def records(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._records)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+    def summary(self) -> Dict[str, Any]:
+        """彙總目前所有紀錄：totals + by_mode / by_model / by_kind + 逐頁明細。"""
+        records = self.records
+        grouped: Dict[str, Dict[str, List[Dict[str, Any]]]] = {
+            "by_mode": defaultdict(list),
+            "by_model": defaultdict(list),
+            "by_kind": defaultdict(list),
+        }
+        pages: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+        for r in records:
+            grouped["by_mode"][r["mode"] or "UNKNOWN"].append(r)
+            grouped["by_model"][r["model"]].append(r)
+            grouped["by_kind"][r["kind"]].append(r)
+            pages[r["page_index"]].append(r)
+
+        summary: Dict[str, Any] = {"totals": _aggregate(records)}
+        for key, groups in grouped.items():
+            summary[key] = {name: _aggregate(lst) for name, lst in sorted(groups.items())}
+
+        page_rows: List[Dict[str, Any]] = []
+        for page_index, lst in sorted(
+            pages.items(), key=lambda kv: (kv[0] is None, kv[0] if kv[0] is not None else 0)
+        ):
+            row = {"page_index": page_index, "mode": lst[0]["mode"]}
+            row.update(_aggregate(lst))
+            page_rows.append(row)
+        summary["pages"] = page_rows
+        return summary
+
+    def write_summary(self, path: Path) -> Dict[str, Any]:
+        summary = self.summary()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        return summary
+
+
+_active_scopes: ContextVar[Tuple[UsageTracker, ...]] = ContextVar("usage_scopes", default=())
+
+
+@contextmanager
+def usage_scope() -> Iterator[UsageTracker]:
+    """區塊內 (同一執行緒 / context) 所有 UsageTracker.record 也會記到回傳的 tracker。"""
+    tracker = UsageTracker()
+    token = _active_scopes.set(_active_scopes.get() + (tracker,))
+    try:
+        yield tracker
+    finally:
+        _active_scopes.reset(token)
+
+
+def usage_summary_path(output_path: Path) -> Path:
+    """輸出 JSON 旁的用量摘要路徑，例如 All_json/2023.json -> All_json/2023.usage.json。"""
+    return output_path.with_name(f"{output_path.stem}.usage.json")
+
+
+__all__ = ["MODEL_PRICING", "UsageTracker", "estimate_cost", "usage_scope", "usage_summary_path"]
@@ -0,0 +1,131 @@
+"""
+LLM 擷取數值的本地驗證：檢查 Target_Value / Baseline_Year / Progress_History 的數字是否真的出現在頁面上。
+
+數字一律以 `core.cleaning.clean_value` 的規則正規化 (千分位、會計負數、百分比)，
+百分比還原為「百分之幾」的數字後比較絕對值，因此 "50%"、"50 %"、"-50%" 與頁面上的 "50" 視為相同。
+頁面數字來源：
+- 文字層：頁面原本的文字 (core.pdf_extractor.page_layer_text，不受移除樣板 / 壓縮影響)
+- 文字框 (PyMuPDF words)：每個文字框本身，以及同一行相鄰的文字框合併，找回被拆開的數字 (例如 "1 000"、"50" + "%")
+
+每筆目標加上 `Verification`，例如
+    {"Target_Value": "verified", "Baseline_Year": "unverified", "Progress_History": "partial"}
+狀態：verified / unverified / partial (歷史資料部分吻合) / not_numeric (無數字可比對) / missing (欄位為空) /
+not_verifiable (VISION 頁 (掃描頁 / 整頁圖表) 或沒有文字層也沒有文字框的頁面，無從比對)。
+只有含 unverified / partial 的頁面需要再花一次呼叫重新擷取；not_verifiable 重新擷取也無法改善，不列入。
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+from .cleaning import clean_value
+
+VERIFIED_FIELDS = ("Target_Value", "Baseline_Year", "Progress_History")
+_NEEDS_REVIEW = ("unverified", "partial")
+
+_NUMBER_TOKEN = re.compile(r"\(?[-+]?\d[\d,]*(?:\.\d+)?\s*%?\)?")
+_THREE_DIGITS = re.compile(r"^\d{3}(?:[.,]\d+)?%?$")
+_SPACE_THOUSANDS = re.compile(r"(?<=\d)[ \u00a0\u202f](?=\d{3}\b)")
+
+
+def _canonical(raw: Any) -> Optional[float]:
+    value, is_percentage, _ = clean_value(_SPACE_THOUSANDS.sub(",", str(raw)))
+    if value is None:
+        return None
+    if is_percentage:
+        value *= 100
+    return round(abs(value), 6)
+
+
+def _numbers_in(text: str) -> Set[float]:
+    found: Set[float] = set()
+    for token in _NUMBER_TOKEN.findall(text or ""):
+        value = _canonical(token)
+        if value is not None:
+            found.add(value)
+    return found
+
+
+def page_number_set(text: str, words: Optional[Sequence[Sequence[Any]]] = None) -> Set[float]:
+    """
+    頁面上所有數字的正規化集合。
+
+    words: PyMuPDF `page.get_text("words")` 的輸出 (x0, y0, x1, y1, word, block_no, line_no, word_no)。
+    """
+    numbers = _numbers_in(text)
+    if words:
+        for word in words:
+            numbers |= _numbers_in(word[4])
+        for prev, cur in zip(words, words[1:]):
+            if (prev[5], prev[6]) != (cur[5], cur[6]):
+                continue
+            numbers |= _numbers_in(f"{prev[4]}{cur[4]}")
+            numbers |= _numbers_in(f"{prev[4]} {cur[4]}")
+            # 以空白作為千分位 ("1 000")
+            if _THREE_DIGITS.match(cur[4]):
+                numbers |= _numbers_in(f"{prev[4]},{cur[4]}")
+    return numbers
+
+
+def _check(raw: Any, numbers: Set[float]) -> str:
+    if raw is None or str(raw).strip() == "":
+        return "missing"
+    value = _canonical(raw)
+    if value is None:
+        return "not_numeric"
+    return "verified" if value in numbers else "unverified"
+
+
+def _check_history(history: Iterable[Dict[str, Any]], numbers: Set[float]) -> str:
+    points = list(history or [])
+    if not points:
+        return "missing"
+    results = []
+    for point in points:
+        year_ok = _check(point.get("Year"), numbers) == "verified"
+        value_status = _check(point.get("Value"), numbers)
+        results.append(year_ok and value_status in ("verified", "not_numeric"))
+    if all(results):
+        return "verified"
+    return "partial" if any(results) else "unverified"
+
+
+def verify_goal_items(
+    items: List[Dict[str, Any]],
+    page_text: str,
+    words: Optional[Sequence[Sequence[Any]]] = None,
+    *,
+    mode: Optional[str] = None,
+) -> List[str]:
+    """
+    就地為每筆目標加上 `Verification`，回傳需要複查的說明 (空 list 代表全部通過)。
+    VISION 頁的數值是模型從圖片讀出的，頁首 / 頁尾殘留的少量文字框無法佐證，
+    與 page_text、words 都是空的頁面一樣，有值的欄位標記為 not_verifiable。
+    """
+    verifiable = mode != "VISION" and (bool((page_text or "").strip()) or bool(words))
+    numbers = page_number_set(page_text, words)
+    issues: List[str] = []
+    for i, item in enumerate(items):
+        verification = {
+            "Target_Value": _check(item.get("Target_Value"), numbers),
+            "Baseline_Year": _check(item.get("Baseline_Year"), numbers),
+            "Progress_History": _check_history(item.get("Progress_History"), numbers),
+        }
+        if not verifiable:
+            verification = {
+                f: "not_verifiable" if status in _NEEDS_REVIEW or status == "verified" else status
+                for f, status in verification.items()
+            }
+        item["Verification"] = verification
+        bad = [f for f, status in verification.items() if status in _NEEDS_REVIEW]
+        if bad:
+            issues.append(f"item {i} ({item.get('Standardized_Metric')}): 頁面上找不到 {', '.join(bad)} 的數字")
+    return issues
+
+
+__all__ = [
+    "VERIFIED_FIELDS",
+    "page_number_set",
+    "verify_goal_items",
+]
@@ -7,6 +7,37 @@ ESG-Goal-Miner
     cd pepsico
     python esg_goal_miner.py --pdf pdf/2023-ESG-Performance-Metrics.pdf --year 2023 --output All_json/2023.json
 
+事前估算（不呼叫 API；依路由估算呼叫數、tokens、圖片大小、成本與時間）:
+
+    python esg_goal_miner.py --pdf ... --year 2023 --output All_json/2023.json --dry-run [--pages 3-7,10]
+
+離線壓力測試（不消耗 API 額度）:
+
+    python tools/fake_gemini_server.py --port 8765 --latency lognormal:0.7,0.5 --rate-429 0.05
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8765 python esg_goal_miner.py --pdf ... --year 2023 --output ...
+
+可重現的 benchmark（先錄製一次真實回應，之後全部離線重播）:
+
+    python esg_goal_miner.py --pdf ... --year 2023 --output ... --cassette bench/2023.jsonl.gz --cassette-mode record
+    python esg_goal_miner.py --pdf ... --year 2023 --output ... --cassette bench/2023.jsonl.gz --replay-latency
+
+單份報告的預算上限（超出前依目標相關度排序處理，預算吃緊時不送圖片 / 壓縮文字，最後略過剩餘頁面）:
+
+    python esg_goal_miner.py --pdf ... --year 2023 --output All_json/2023.json --max-calls 40 --max-tokens 300000
+
+局部重新擷取（只重跑有問題的頁面，替換既有輸出中這些頁的目標；每筆目標帶有 Source_Page / Source_Mode）:
+
+    python esg_goal_miner.py --pdf ... --year 2023 --output All_json/2023.json --splice --pages 12,15
+
+批次模式（Gemini Batch API，適合不急著要結果的整批回填；可一次放入多份報告）:
+
+    python esg_goal_miner.py --batch submit --job jobs/backfill.jsonl \
+        --pdf pdf/2022.pdf --year 2022 --output All_json/2022.json \
+        --pdf pdf/2023.pdf --year 2023 --output All_json/2023.json
+    python esg_goal_miner.py --batch collect --job jobs/backfill.jsonl --wait
+
+    # 只產生 job 檔 (不送出)：--batch prepare；離線測試：GEMINI_BATCH_ENDPOINT 指向 tools/fake_gemini_server.py
+
 輸入:
     - 一份 ESG PDF 報告
     - 報告年份 current_year（手動指定，避免自動判斷出錯）
@@ -14,6 +45,9 @@ ESG-Goal-Miner
 輸出:
     - 一個 JSON 檔案，內容為整份報告所有頁面中偵測到的「承諾目標」列表。
       結構遵守 core.prompt.get_audit_prompt 定義的 Schema。
+    - 同目錄下的 `<output>.usage.json`：逐頁 / 逐模式 / 逐模型的 token、圖片大小、延遲與成本統計。
+    - 同目錄下的 `<output>.journal.jsonl`：逐頁 checkpoint；中斷後加上 `--resume` 重跑即可略過已完成頁面。
+    - 指定 `--prior-index` 時：與前一年幾乎相同的頁面直接沿用前一年的結果，本次頁面也會加入索引供明年使用。
 """
 
 from __future__ import annotations
@@ -21,38 +55,289 @@ from __future__ import annotations
 import argparse
 import json
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Iterable, Iterator
 
-from core.gemini_client import GeminiClient
-from core.pdf_extractor import extract_mixed_content
+from core.batch import (
+    BatchPendingError,
+    BatchReport,
+    collect_batch_job,
+    prepare_batch_job,
+    submit_batch_job,
+)
+from core.boilerplate import detect_boilerplate, strip_boilerplate
+from core.budget import ReportBudget, rank_pages_by_relevance
+from core.cassette import CASSETTE_MODES
+from core.compaction import CompactionStats, compact_pages
+from core.gemini_client import IMAGE_STRATEGIES, GeminiClient
+from core.journal import RunJournal, file_sha256, journal_path_for
+from core.merge import merge_goal_items
+from core.pdf_extractor import count_pages, page_layer_text, parse_page_ranges
+from core.pipeline import extract_goals_from_pages
+from core.planner import plan_report, plan_summary_path, write_plan
+from core.prefetch import PagePrefetcher
+from core.prompt import DEFAULT_MAX_PROMPT_TOKENS, PROMPT_VERSION
+from core.reuse import PriorPageIndex
+from core.splice import splice_page_items
+from core.usage import usage_summary_path
 
 
-def run_esg_goal_miner(pdf_path: Path, report_year: int, output_path: Path) -> None:
-    pages = extract_mixed_content(str(pdf_path))
+def run_esg_goal_miner(
+    pdf_path: Path,
+    report_year: int,
+    output_path: Path,
+    client: GeminiClient | None = None,
+    resume: bool = False,
+    prior_index: PriorPageIndex | None = None,
+    use_diff_hint: bool = False,
+    pages_filter: set[int] | None = None,
+    prefetch: int = 4,
+    strip_headers: bool = False,
+    compact: bool = False,
+    route_by_dictionary: bool = False,
+    merge_duplicates: bool = False,
+    budget: ReportBudget | None = None,
+) -> None:
+    pdf_sha256 = file_sha256(pdf_path)
+    journal = RunJournal(
+        journal_path_for(output_path),
+        pdf_sha256=pdf_sha256,
+        prompt_version=PROMPT_VERSION,
+        report_year=report_year,
+        resume=resume,
+    )
+    done = set(journal.done_pages())
+    todo = [
+        i
+        for i in range(count_pages(str(pdf_path)))
+        if i not in done and (not pages_filter or i in pages_filter)
+    ]
+    if done:
+        print(f"[ESG-Goal-Miner] resume: 沿用 journal 中已完成的 {len(done)} 頁，剩餘 {len(todo)} 頁")
 
-    client = GeminiClient()
-    all_items: List[Dict[str, Any]] = []
+    # 有預算上限時先處理目標相關度高的頁面，預算用完時略過的是最不重要的頁面
+    page_order = rank_pages_by_relevance(str(pdf_path), set(todo)) if budget is not None else None
+    # 渲染在背景執行緒先跑 (最多領先 prefetch 頁)，與 Gemini 呼叫重疊
+    prefetcher = PagePrefetcher(str(pdf_path), only_pages=set(todo), maxsize=prefetch, page_order=page_order)
+    # prior_index 只需要頁面原本的文字層，不保留截圖
+    seen_pages: list[dict] = []
 
-    for page in pages:
-        text: str = page["text"]
-        images: List[bytes] = page["images"]
+    def _remember(pages: Iterable[dict]) -> Iterator[dict]:
+        for page in pages:
+            seen_pages.append(
+                {"page_index": page["page_index"], "text": page_layer_text(page), "mode": page["mode"]}
+            )
+            yield page
 
-        page_items = client.extract_goals_from_page(
-            page_text=text,
-            images=images,
-            current_year=report_year,
+    # 頁首 / 頁尾樣板：先以文字層掃過整份文件 (不渲染)，再逐頁移除
+    boilerplate = detect_boilerplate(str(pdf_path), only_pages=set(todo)) if strip_headers else None
+    pages = strip_boilerplate(prefetcher, boilerplate) if boilerplate is not None else prefetcher
+    # 長篇敘事頁只保留含數值 / 指標的句子與前後文
+    compaction = CompactionStats() if compact else None
+    if compaction is not None:
+        pages = compact_pages(pages, compaction)
+
+    client = client or GeminiClient()
+    try:
+        with prefetcher:
+            result = extract_goals_from_pages(
+                client,
+                _remember(pages),
+                report_year,
+                journal=journal,
+                prior_index=prior_index,
+                use_diff_hint=use_diff_hint,
+                route_by_dictionary=route_by_dictionary,
+                budget=budget,
+            )
+    except KeyboardInterrupt:
+        raise SystemExit(
+            f"[ESG-Goal-Miner] 已中斷，已完成的頁面保存在 {journal.path}；加上 --resume 重跑即可接續。"
         )
+    if prior_index is not None:
+        for page in seen_pages:
+            record = journal.get(page["page_index"])
+            if record is not None and record["status"] == "ok":
+                prior_index.add_page(
+                    pdf_sha256=pdf_sha256, report_year=report_year, page=page, items=record["items"]
+                )
 
-        for item in page_items:
-            if isinstance(item, dict):
-                item.setdefault("Report_Year", report_year)
-                all_items.append(item)
+    # 最終輸出一律由 journal 組裝，包含本次與先前 (resume) 完成的頁面
+    all_items = journal.assemble_items()
+    merge_stats = None
+    if merge_duplicates:
+        all_items, merge_stats = merge_goal_items(all_items)
 
     output_path.parent.mkdir(parents=True, exist_ok=True)
     with output_path.open("w", encoding="utf-8") as f:
         json.dump(all_items, f, ensure_ascii=False, indent=2)
 
     print(f"[ESG-Goal-Miner] 共寫出 {len(all_items)} 筆目標至: {output_path}")
+    if merge_stats is not None:
+        print(
+            f"[ESG-Goal-Miner] merge: {merge_stats['items']} 筆目標合併為 {merge_stats['merged_items']} 筆 "
+            f"(Source_Pages 記錄來源頁)"
+        )
+    if result.problems:
+        print(f"[ESG-Goal-Miner] Schema 驗證修正/丟棄 {len(result.problems)} 處，例如: {result.problems[0]}")
+    if result.failed_pages:
+        pages_1based = ",".join(str(p["page_index"] + 1) for p in result.failed_pages)
+        print(f"[ESG-Goal-Miner] ⚠️ {len(result.failed_pages)} 頁無法取得合法 JSON，請重跑頁碼: {pages_1based}")
+
+    if result.unverified_pages:
+        pages_1based = ",".join(str(p["page_index"] + 1) for p in result.unverified_pages)
+        print(
+            f"[ESG-Goal-Miner] verify: {len(result.unverified_pages)} 頁有數值在頁面上找不到 "
+            f"(Verification 欄位)，建議只重新擷取頁碼: {pages_1based}"
+        )
+
+    dictionary_skipped = [p for p in result.skipped_pages if p["reason"] == "no_esg_terms"]
+    if dictionary_skipped:
+        print(f"[ESG-Goal-Miner] dictionary: {len(dictionary_skipped)} 頁文字頁沒有任何 ESG 字典詞彙或目標數值，未送出")
+
+    if budget is not None:
+        spent = budget.to_dict()
+        print(
+            f"[ESG-Goal-Miner] budget: 已用 {spent['spent_calls']} 次呼叫 / {spent['spent_tokens']:,} tokens / "
+            f"圖片 {spent['spent_image_bytes'] / 1e6:.1f} MB；{len(result.degraded_pages)} 頁降級送出"
+        )
+        budget_skipped = sorted(p["page_index"] for p in result.skipped_pages if p["reason"] == "budget")
+        if budget_skipped:
+            pages_1based = ",".join(str(i + 1) for i in budget_skipped)
+            print(
+                f"[ESG-Goal-Miner] ⚠️ budget: 預算不足，{len(budget_skipped)} 頁未送出 (頁碼 {pages_1based})；"
+                f"加大預算後以 --resume 補跑"
+            )
+
+    if result.deduplicated_pages:
+        print(
+            f"[ESG-Goal-Miner] dedup: {len(result.deduplicated_pages)} 頁內容與其他頁完全相同，"
+            f"直接沿用結果 (目標標記 Duplicate_Of_Page)"
+        )
+
+    if result.reused_pages:
+        print(
+            f"[ESG-Goal-Miner] reuse: {len(result.reused_pages)} 頁與前一年報告幾乎相同，"
+            f"沿用先前結果 (目標標記 Reused_From)；實際送出 {result.processed_pages} 頁"
+        )
+
+    if result.escalated_pages:
+        escalation = client.usage.summary()["by_kind"].get("escalation", {})
+        print(
+            f"[ESG-Goal-Miner] cascade: {len(result.escalated_pages)}/{result.processed_pages} 頁升級至較強模型 "
+            f"({result.escalation_rate:.0%})，升級呼叫累計延遲 {escalation.get('latency_s', 0):.1f}s"
+        )
+
+    if client.hedge_policy is not None:
+        hedge = client.hedge_policy.stats()
+        print(
+            f"[ESG-Goal-Miner] hedging: 送出 {hedge['hedges']} 個備援請求 ({hedge['hedge_rate']:.1%})，"
+            f"其中 {hedge['hedge_wins']} 個先回應"
+        )
+
+    if boilerplate is not None:
+        boilerplate_path = output_path.with_name(f"{output_path.stem}.boilerplate.json")
+        with boilerplate_path.open("w", encoding="utf-8") as f:
+            json.dump(boilerplate.to_dict(), f, ensure_ascii=False, indent=2)
+        print(
+            f"[ESG-Goal-Miner] boilerplate: {len(boilerplate.patterns)} 種頁首 / 頁尾樣板，"
+            f"從 {len(boilerplate.removed)} 頁移除 {boilerplate.removed_chars} 字元；紀錄: {boilerplate_path}"
+        )
+
+    if compaction is not None:
+        print(
+            f"[ESG-Goal-Miner] compact: {compaction.compacted_pages}/{compaction.pages} 頁壓縮，"
+            f"{compaction.original_chars} -> {compaction.compacted_chars} 字元 (剩 {compaction.ratio:.0%})"
+        )
+
+    overlap = prefetcher.stats()
+    print(
+        f"[ESG-Goal-Miner] pipeline: 背景渲染 {overlap['render_s']:.1f}s，擷取流程等待渲染 {overlap['wait_s']:.1f}s"
+    )
+
+    usage_path = usage_summary_path(output_path)
+    totals = client.usage.write_summary(usage_path)["totals"]
+    print(
+        f"[ESG-Goal-Miner] 共 {totals['calls']} 次呼叫 (重試 {totals['retries']})，"
+        f"tokens {totals['prompt_tokens']} in / {totals['output_tokens']} out，"
+        f"圖片 {totals['image_bytes'] / 1e6:.1f} MB，累計延遲 {totals['latency_s']:.1f}s，"
+        f"估計成本 ${totals['cost_usd']:.4f}；明細: {usage_path}"
+    )
+
+
+def run_splice(
+    pdf_path: Path,
+    report_year: int,
+    output_path: Path,
+    pages: set[int],
+    client: GeminiClient | None = None,
+    *,
+    merge_duplicates: bool = False,
+) -> None:
+    """只重新擷取指定頁面，替換既有輸出 JSON 中這些頁的目標 (依 Source_Page / Source_Pages)。"""
+    if not output_path.is_file():
+        raise SystemExit(f"--splice 需要既有的輸出 JSON: {output_path}")
+    with output_path.open("r", encoding="utf-8") as f:
+        existing = json.load(f)
+
+    client = client or GeminiClient()
+    with PagePrefetcher(str(pdf_path), only_pages=pages) as prefetcher:
+        result = extract_goals_from_pages(client, prefetcher, report_year)
+    if result.failed_pages:
+        failed = ",".join(str(p["page_index"] + 1) for p in result.failed_pages)
+        raise SystemExit(f"[ESG-Goal-Miner] splice: 頁碼 {failed} 無法取得合法 JSON，未修改 {output_path}")
+
+    items, stats = splice_page_items(existing, result.items, pages)
+    if merge_duplicates:
+        items, _ = merge_goal_items(items)
+    tmp_path = output_path.with_suffix(output_path.suffix + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False, indent=2)
+    tmp_path.replace(output_path)
+
+    pages_1based = ",".join(str(p + 1) for p in sorted(pages))
+    print(
+        f"[ESG-Goal-Miner] splice: 重新擷取頁碼 {pages_1based}，移除 {stats['removed']} 筆、"
+        f"新增 {stats['added']} 筆目標 (另有 {stats['trimmed']} 筆合併目標移除來源頁)；共 {len(items)} 筆寫回 {output_path}"
+    )
+    if stats["unknown_source"]:
+        print(
+            f"[ESG-Goal-Miner] ⚠️ {stats['unknown_source']} 筆既有目標沒有 Source_Page，無法判斷來源頁，已原樣保留"
+        )
+    totals = client.usage.summary()["totals"]
+    print(f"[ESG-Goal-Miner] 共 {totals['calls']} 次呼叫，估計成本 ${totals['cost_usd']:.4f}")
+
+
+def run_dry_run(
+    pdf_path: Path,
+    report_year: int,
+    output_path: Path,
+    *,
+    pages_filter: set[int] | None = None,
+    image_strategy: str = "inline",
+    max_prompt_tokens: int | None = DEFAULT_MAX_PROMPT_TOKENS,
+) -> None:
+    plan = plan_report(
+        pdf_path,
+        report_year,
+        pages_filter=pages_filter,
+        image_strategy=image_strategy,
+        max_prompt_tokens=max_prompt_tokens,
+    )
+    totals = plan["totals"]
+    print(
+        f"[ESG-Goal-Miner] dry-run: {totals['pages']}/{plan['total_pages']} 頁，"
+        f"{totals['calls']} 次呼叫，tokens 約 {totals['prompt_tokens']:,} in / {totals['output_tokens']:,} out，"
+        f"圖片約 {totals['image_bytes'] / 1e6:.1f} MB，估計成本 ${totals['cost_usd']:.4f}，"
+        f"預估耗時 {totals['duration_s']:.0f}s (規劃耗時 {plan['planning_time_s']:.2f}s)"
+    )
+    for mode, agg in plan["by_mode"].items():
+        print(
+            f"    {mode:<7} {agg['pages']:>4} 頁  {agg['calls']:>4} 次呼叫  "
+            f"{agg['prompt_tokens']:>9,} tokens  {agg['image_bytes'] / 1e6:>6.1f} MB  ${agg['cost_usd']:.4f}"
+        )
+    plan_path = plan_summary_path(output_path)
+    write_plan(plan, plan_path)
+    print(f"[ESG-Goal-Miner] 逐頁規劃: {plan_path}")
 
 
 def _parse_args() -> argparse.Namespace:
@@ -60,33 +345,325 @@ def _parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--pdf",
         type=str,
-        required=True,
-        help="輸入 PDF 檔案路徑，例如: pdf/2023-ESG-Performance-Metrics.pdf",
+        action="append",
+        help="輸入 PDF 檔案路徑，例如: pdf/2023-ESG-Performance-Metrics.pdf（批次模式可重複指定多份）",
     )
     parser.add_argument(
         "--year",
         type=int,
-        required=True,
-        help="報告年份 (current_year)，例如 2023",
+        action="append",
+        help="報告年份 (current_year)，例如 2023；與 --pdf 依序對應",
     )
     parser.add_argument(
         "--output",
         type=str,
-        required=True,
-        help="輸出 JSON 檔案路徑，例如: All_json/2023.json",
+        action="append",
+        help="輸出 JSON 檔案路徑，例如: All_json/2023.json；與 --pdf 依序對應",
+    )
+    parser.add_argument(
+        "--image-strategy",
+        choices=IMAGE_STRATEGIES,
+        default="inline",
+        help="HYBRID/VISION 頁的圖片處理方式：inline=圖片與 Prompt 單次送出 (預設)；describe=先看圖描述再擷取 (兩次呼叫)",
+    )
+    parser.add_argument(
+        "--cassette",
+        type=str,
+        default=None,
+        help="錄製/重播檔路徑 (.jsonl 或 .jsonl.gz)，用於可重現的 benchmark",
+    )
+    parser.add_argument(
+        "--cassette-mode",
+        choices=CASSETTE_MODES,
+        default="replay",
+        help="record=真實呼叫並錄下回應；replay=只從 cassette 回放，不連網 (預設)",
+    )
+    parser.add_argument(
+        "--replay-latency",
+        action="store_true",
+        help="重播時依錄製當下的延遲 sleep，模擬真實吞吐量",
+    )
+    parser.add_argument(
+        "--cascade-model",
+        type=str,
+        default=None,
+        help="啟用 cascade：快速模型結果未通過驗證、信心不足或含圖表數據時，改用此模型重跑，例如 gemini-2.5-flash",
+    )
+    parser.add_argument(
+        "--confidence-threshold",
+        type=float,
+        default=0.7,
+        help="cascade 升級的 Confidence 門檻 (0~1)，預設 0.7",
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        default=None,
+        help="啟用 hedged requests：呼叫超過最近延遲的此百分位數 (例如 95) 仍未回應時送出備援請求",
+    )
+    parser.add_argument(
+        "--hedge-budget",
+        type=float,
+        default=0.1,
+        help="備援請求佔總呼叫數的上限比例，預設 0.1",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="沿用 <output>.journal.jsonl 中同一份 PDF、同一 Prompt 版本已完成的頁面，只跑剩餘頁",
+    )
+    parser.add_argument(
+        "--pages",
+        type=str,
+        default=None,
+        help="只處理指定頁碼 (以 1 為起始)，例如: 5 或 3-7,10",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=4,
+        help="背景預先分析 / 渲染的頁數上限 (渲染與 API 呼叫重疊；越大越耗記憶體)，預設 4",
+    )
+    parser.add_argument(
+        "--strip-boilerplate",
+        action="store_true",
+        help="移除跨頁重複的頁首 / 頁尾 / 頁碼後再送出，移除紀錄寫入 <output>.boilerplate.json",
+    )
+    parser.add_argument(
+        "--max-prompt-tokens",
+        type=int,
+        default=DEFAULT_MAX_PROMPT_TOKENS,
+        help=(
+            "單次請求 Prompt 的估算 token 上限，超過時先壓縮頁面文字、仍超過再切成多個請求；"
+            f"0 代表不限制 (預設 {DEFAULT_MAX_PROMPT_TOKENS}，可用 GEMINI_MAX_PROMPT_TOKENS 調整)"
+        ),
+    )
+    parser.add_argument(
+        "--focused-dictionary",
+        action="store_true",
+        help="依本地字典比對結果，純文字頁的 Prompt 只列出命中的 ESG 領域 (縮短 Prompt)",
+    )
+    parser.add_argument(
+        "--route-by-dictionary",
+        action="store_true",
+        help="略過完全沒有 ESG 字典詞彙 (中英文同義詞) 的純文字頁，不送出請求",
+    )
+    parser.add_argument(
+        "--merge-duplicates",
+        action="store_true",
+        help="合併在多頁重複出現的相同目標 (Focus / Metric / Scope / Deadline / Value)，聯集 Progress_History 並記錄來源頁",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="長篇文字頁只保留含年份 / 百分比 / 數量 / 基準年 / 指標詞彙的句子與前後一句，並回報壓縮比例",
+    )
+    parser.add_argument(
+        "--max-calls",
+        type=int,
+        default=None,
+        help="本份報告的呼叫次數上限；預算吃緊時依序降級 (不送圖片 → 壓縮文字 → 略過)，頁面依目標相關度排序處理",
+    )
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        default=None,
+        help="本份報告的 tokens (prompt + output) 上限",
+    )
+    parser.add_argument(
+        "--max-image-mb",
+        type=float,
+        default=None,
+        help="本份報告送出的圖片總量上限 (MB)",
+    )
+    parser.add_argument(
+        "--splice",
+        action="store_true",
+        help="只重新擷取 --pages 指定的頁面，替換既有 --output JSON 中這些頁的目標 (依 Source_Page)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="不呼叫 API，只估算呼叫數、tokens、圖片大小、成本與耗時，並寫出 <output>.plan.json",
+    )
+    parser.add_argument(
+        "--prior-index",
+        type=str,
+        default=None,
+        help="跨年度頁面索引 (.jsonl)：沿用前一年幾乎相同頁面的結果，本次頁面也會加入索引",
+    )
+    parser.add_argument(
+        "--reuse-distance",
+        type=int,
+        default=6,
+        help="視為幾乎相同的 SimHash 漢明距離上限 (0~7)，預設 6",
+    )
+    parser.add_argument(
+        "--diff-hint",
+        action="store_true",
+        help="與前一年相似但數字有變動的頁面，在 Prompt 中附上逐行差異",
+    )
+    parser.add_argument(
+        "--batch",
+        choices=("prepare", "submit", "collect"),
+        default=None,
+        help="批次模式：prepare=只產生 job 檔；submit=(必要時先 prepare) 送出批次；collect=收取結果並寫出各報告 JSON",
+    )
+    parser.add_argument(
+        "--job",
+        type=str,
+        default=None,
+        help="批次 job 檔路徑 (.jsonl)，manifest / state 會寫在同目錄",
+    )
+    parser.add_argument(
+        "--batch-model",
+        type=str,
+        default="gemini-2.5-flash-lite",
+        help="批次模式使用的模型，預設 gemini-2.5-flash-lite",
+    )
+    parser.add_argument(
+        "--wait",
+        action="store_true",
+        help="collect 時持續輪詢直到所有批次完成",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=30.0,
+        help="collect --wait 的輪詢間隔秒數，預設 30",
     )
     return parser.parse_args()
 
 
+def _build_client(args: argparse.Namespace) -> GeminiClient:
+    return GeminiClient(
+        image_strategy=args.image_strategy,
+        cassette_path=args.cassette,
+        cassette_mode=args.cassette_mode if args.cassette else None,
+        replay_latency=args.replay_latency or None,
+        escalation_model_name=args.cascade_model,
+        confidence_threshold=args.confidence_threshold,
+        hedge_percentile=args.hedge_percentile,
+        hedge_budget=args.hedge_budget,
+        max_prompt_tokens=args.max_prompt_tokens or None,
+        focused_dictionary=args.focused_dictionary,
+    )
+
+
+def _build_budget(args: argparse.Namespace) -> ReportBudget | None:
+    if args.max_calls is None and args.max_tokens is None and args.max_image_mb is None:
+        return None
+    return ReportBudget(
+        max_calls=args.max_calls,
+        max_tokens=args.max_tokens,
+        max_image_bytes=int(args.max_image_mb * 1e6) if args.max_image_mb is not None else None,
+    )
+
+
+def _batch_reports(args: argparse.Namespace) -> list[BatchReport]:
+    pdfs, years, outputs = args.pdf or [], args.year or [], args.output or []
+    if not pdfs or not (len(pdfs) == len(years) == len(outputs)):
+        raise SystemExit("--pdf / --year / --output 必須成對指定（每份報告各一個）")
+    for pdf in pdfs:
+        if not Path(pdf).is_file():
+            raise SystemExit(f"找不到 PDF 檔案: {pdf}")
+    return [BatchReport(Path(p), y, Path(o)) for p, y, o in zip(pdfs, years, outputs)]
+
+
+def run_batch(args: argparse.Namespace) -> None:
+    if not args.job:
+        raise SystemExit("批次模式需要 --job")
+    job_path = Path(args.job)
+
+    if args.batch == "prepare" or (args.batch == "submit" and args.pdf):
+        manifest = prepare_batch_job(_batch_reports(args), job_path, model_name=args.batch_model)
+        n_pages = sum(len(r["pages"]) for r in manifest["reports"])
+        print(f"[ESG-Goal-Miner] batch: {len(manifest['reports'])} 份報告、{n_pages} 頁請求已寫入 {job_path}")
+    if args.batch == "submit":
+        state = submit_batch_job(job_path)
+        names = ", ".join(b["name"] for b in state["batches"])
+        print(f"[ESG-Goal-Miner] batch: 已送出 {len(state['batches'])} 個批次 ({names})；稍後以 --batch collect 收取")
+    if args.batch == "collect":
+        try:
+            results = collect_batch_job(job_path, wait=args.wait, poll_interval=args.poll_interval)
+        except BatchPendingError as e:
+            print(f"[ESG-Goal-Miner] batch: {e}")
+            raise SystemExit("[ESG-Goal-Miner] batch: 尚未完成，稍後再執行 collect（或加上 --wait）") from None
+        for report_id, r in results.items():
+            print(f"[ESG-Goal-Miner] {report_id}: 共寫出 {len(r['items'])} 筆目標至: {r['output']}")
+            if r["failed_pages"]:
+                pages_1based = ",".join(str(p["page_index"] + 1) for p in r["failed_pages"])
+                print(
+                    f"[ESG-Goal-Miner] ⚠️ {report_id}: {len(r['failed_pages'])} 頁無法取得合法 JSON "
+                    f"(頁碼 {pages_1based})，可用同樣的 --pdf/--year/--output 加上 --resume 線上補跑"
+                )
+            if r["unverified_pages"]:
+                pages_1based = ",".join(str(p["page_index"] + 1) for p in r["unverified_pages"])
+                print(
+                    f"[ESG-Goal-Miner] verify: {report_id}: {len(r['unverified_pages'])} 頁有數值在頁面上找不到 "
+                    f"(Verification 欄位)，建議只重新擷取頁碼: {pages_1based}"
+                )
+
+
 def main() -> None:
     args = _parse_args()
-    pdf_path = Path(args.pdf)
-    output_path = Path(args.output)
+    if args.batch:
+        run_batch(args)
+        return
+
+    if not (args.pdf and args.year and args.output):
+        raise SystemExit("需要 --pdf、--year 與 --output")
+    if len(args.pdf) > 1:
+        raise SystemExit("一次只能處理一份 PDF；多份報告請使用 --batch")
+    pdf_path = Path(args.pdf[0])
+    output_path = Path(args.output[0])
 
     if not pdf_path.is_file():
         raise SystemExit(f"找不到 PDF 檔案: {pdf_path}")
+    pages_filter = parse_page_ranges(args.pages) if args.pages else None
+
+    if args.splice:
+        if not pages_filter:
+            raise SystemExit("--splice 需要搭配 --pages 指定要重新擷取的頁碼")
+        run_splice(
+            pdf_path,
+            args.year[0],
+            output_path,
+            pages_filter,
+            _build_client(args),
+            merge_duplicates=args.merge_duplicates,
+        )
+        return
+
+    if args.dry_run:
+        run_dry_run(
+            pdf_path,
+            args.year[0],
+            output_path,
+            pages_filter=pages_filter,
+            image_strategy=args.image_strategy,
+            max_prompt_tokens=args.max_prompt_tokens or None,
+        )
+        return
 
-    run_esg_goal_miner(pdf_path=pdf_path, report_year=args.year, output_path=output_path)
+    run_esg_goal_miner(
+        pdf_path=pdf_path,
+        report_year=args.year[0],
+        output_path=output_path,
+        client=_build_client(args),
+        resume=args.resume,
+        prior_index=(
+            PriorPageIndex(args.prior_index, max_distance=args.reuse_distance) if args.prior_index else None
+        ),
+        use_diff_hint=args.diff_hint,
+        pages_filter=pages_filter,
+        prefetch=args.prefetch,
+        strip_headers=args.strip_boilerplate,
+        compact=args.compact,
+        route_by_dictionary=args.route_by_dictionary,
+        merge_duplicates=args.merge_duplicates,
+        budget=_build_budget(args),
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,434 @@
+"""
+離線 Gemini 替身伺服器 (壓力測試 / 吞吐量測試用)。
+
+實作 Gemini REST `models/{model}:generateContent`，回傳符合 core.prompt Schema 的目標 JSON，
+可設定延遲分布、錯誤率、429 比例、輸出截斷比例與 token 計數，完全不需要網路或 API 額度。
+
+用法:
+
+    python tools/fake_gemini_server.py --port 8765 --latency lognormal:0.7,0.5 --rate-429 0.05
+
+    # 另一個終端機：讓 GeminiClient 指向替身伺服器
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8765 python esg_goal_miner.py --pdf a.pdf --year 2023 --output out.json
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8765 streamlit run app.py
+
+    # 執行期統計
+    curl http://127.0.0.1:8765/stats
+
+    # 批次模式 (models/{model}:batchGenerateContent + batches/{id})，--batch-delay 控制多久後完成
+    GEMINI_BATCH_ENDPOINT=http://127.0.0.1:8765 python esg_goal_miner.py --batch submit --job jobs/2023.jsonl
+
+程式內使用 (測試):
+
+    with FakeGeminiServer(latency="fixed:0.05") as server:
+        client = GeminiClient(api_endpoint=server.url)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_GENERATE_PATH = re.compile(r"^/v1(?:beta)?/models/(?P<model>[^/:]+):generateContent$")
+_BATCH_CREATE_PATH = re.compile(r"^/v1(?:beta)?/models/(?P<model>[^/:]+):batchGenerateContent$")
+_BATCH_GET_PATH = re.compile(r"^/v1(?:beta)?/(?P<name>batches/[^/:]+)$")
+
+# 產生假資料用的 (Focus Area, Metric, Scope) 組合，對齊 core.prompt 的標準化字典
+_FAKE_GOALS: List[Tuple[str, str, str]] = [
+    ("Climate", "Absolute GHG Reduction", "Scope 1+2"),
+    ("Climate", "Net Zero", "Value Chain"),
+    ("Climate", "Renewable Energy", "Global Operations"),
+    ("Packaging", "Recycled Content", "Plastic Packaging"),
+    ("Packaging", "Virgin Plastic Reduction", "Plastic Packaging"),
+    ("Water", "Water Replenishment", "High Water-Risk Areas"),
+    ("Agriculture", "Regenerative Agriculture", "Key Ingredients"),
+    ("Human Rights & Social", "Gender Diversity", "Management Roles"),
+]
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    解析延遲分布設定，回傳 rng -> 秒數 的取樣函式。
+
+    支援:
+        fixed:S              固定 S 秒
+        uniform:A,B          A~B 秒均勻分布
+        normal:MEAN,SD       常態分布 (截斷於 0)
+        lognormal:MU,SIGMA   對數常態分布 (長尾，最接近真實 API)
+    """
+    kind, _, raw = spec.partition(":")
+    args = [float(x) for x in raw.split(",") if x.strip()]
+    if kind == "fixed" and len(args) == 1:
+        return lambda rng: args[0]
+    if kind == "uniform" and len(args) == 2:
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "normal" and len(args) == 2:
+        return lambda rng: max(0.0, rng.gauss(args[0], args[1]))
+    if kind == "lognormal" and len(args) == 2:
+        return lambda rng: rng.lognormvariate(args[0], args[1])
+    raise ValueError(f"無法解析延遲設定: {spec!r}")
+
+
+def _fake_goal(rng: random.Random, report_year: int) -> Dict[str, Any]:
+    focus, metric, scope = rng.choice(_FAKE_GOALS)
+    deadline = rng.choice([2025, 2030, 2040, 2050])
+    baseline = rng.choice([2015, 2018, 2020])
+    pct = rng.choice([10, 20, 25, 30, 50, 100])
+    history = [
+        {"Year": y, "Value": f"{round(pct * (y - baseline) / (deadline - baseline) * rng.uniform(0.5, 1.2), 1)}%"}
+        for y in range(baseline + 1, report_year + 1)
+    ]
+    return {
+        "Report_Year": report_year,
+        "Standardized_Focus_Area": focus,
+        "Standardized_Metric": metric,
+        "Scope": scope,
+        "Original_Goal_Text": f"Reduce {metric.lower()} by {pct}% by {deadline} vs. {baseline} baseline.",
+        "Target_Deadline": deadline,
+        "Target_Value": f"{pct}%",
+        "Baseline_Year": str(baseline),
+        "Progress_History": history,
+        "Confidence": round(rng.uniform(0.4, 1.0), 2),
+    }
+
+
+class _FakeGeminiHandler(BaseHTTPRequestHandler):
+    server: "_FakeHTTPServer"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        if self.server.config["verbose"]:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, grpc_status: str, message: str) -> None:
+        self._send_json(status, {"error": {"code": status, "message": message, "status": grpc_status}})
+
+    def do_GET(self) -> None:  # noqa: N802
+        path = self.path.split("?")[0]
+        batch_match = _BATCH_GET_PATH.match(path)
+        if path == "/stats":
+            self._send_json(200, self.server.snapshot_stats())
+        elif batch_match:
+            operation = self.server.get_batch(batch_match.group("name"))
+            if operation is None:
+                self._send_error(404, "NOT_FOUND", f"Unknown batch {batch_match.group('name')}")
+            else:
+                self._send_json(200, operation)
+        else:
+            self._send_error(404, "NOT_FOUND", f"Unknown path {self.path}")
+
+    def do_POST(self) -> None:  # noqa: N802
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b"{}"
+        path = self.path.split("?")[0]
+        match = _GENERATE_PATH.match(path)
+        batch_match = _BATCH_CREATE_PATH.match(path)
+        if not match and not batch_match:
+            self._send_error(404, "NOT_FOUND", f"Unknown path {self.path}")
+            return
+        try:
+            request = json.loads(raw or b"{}")
+        except json.JSONDecodeError:
+            self._send_error(400, "INVALID_ARGUMENT", "Request body is not JSON")
+            return
+        if batch_match:
+            status, payload = self.server.create_batch(batch_match.group("model"), request)
+        else:
+            status, payload = self.server.generate(match.group("model"), request)
+        if status == 200:
+            self._send_json(200, payload)
+        else:
+            self._send_error(status, payload["status"], payload["message"])
+
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: Dict[str, Any]) -> None:
+        super().__init__(address, _FakeGeminiHandler)
+        self.config = config
+        self._latency = parse_latency(config["latency"])
+        self._rng = random.Random(config["seed"])
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Any] = {
+            "requests": 0,
+            "ok": 0,
+            "errors_500": 0,
+            "errors_429": 0,
+            "in_flight": 0,
+            "max_in_flight": 0,
+            "prompt_tokens": 0,
+            "output_tokens": 0,
+            "batches": 0,
+            "batch_requests": 0,
+        }
+        self._batches: Dict[str, Dict[str, Any]] = {}
+
+    def snapshot_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats)
+
+    def _bump(self, **deltas: int) -> None:
+        with self._lock:
+            for k, v in deltas.items():
+                self._stats[k] += v
+            self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._stats["in_flight"])
+
+    def _count_prompt_tokens(self, request: Dict[str, Any]) -> int:
+        chars = 0
+        images = 0
+        for content in request.get("contents", []):
+            for part in content.get("parts", []):
+                if "text" in part:
+                    chars += len(part["text"])
+                elif "inlineData" in part or "inline_data" in part:
+                    images += 1
+        return int(chars / self.config["chars_per_token"]) + images * self.config["image_tokens"]
+
+    def generate(self, model: str, request: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        # 取樣在鎖內進行，固定 seed 時結果可重現
+        with self._lock:
+            delay = self._latency(self._rng)
+            roll = self._rng.random()
+            sub_seed = self._rng.getrandbits(32)
+        self._bump(requests=1, in_flight=1)
+        try:
+            time.sleep(delay)
+            if roll < self.config["rate_429"]:
+                self._bump(errors_429=1)
+                return 429, {"status": "RESOURCE_EXHAUSTED", "message": "Fake quota exceeded."}
+            if roll < self.config["rate_429"] + self.config["error_rate"]:
+                self._bump(errors_500=1)
+                return 500, {"status": "INTERNAL", "message": "Fake internal error."}
+
+            return 200, self._build_response(model, request, random.Random(sub_seed))
+        finally:
+            self._bump(in_flight=-1)
+
+    def _build_response(
+        self, model: str, request: Dict[str, Any], rng: random.Random
+    ) -> Dict[str, Any]:
+        """產生一個 GenerateContentResponse（不含延遲與錯誤注入，批次模式也共用）。"""
+        truncated = rng.random() < self.config["truncate_rate"]
+        gen_config = request.get("generationConfig") or request.get("generation_config") or {}
+        mime = gen_config.get("responseMimeType") or gen_config.get("response_mime_type")
+        if mime == "application/json":
+            n_items = rng.randint(0, self.config["max_items"])
+            text = json.dumps(
+                [_fake_goal(rng, self.config["report_year"]) for _ in range(n_items)],
+                ensure_ascii=False,
+            )
+        else:
+            text = "2020: 1,000\n2021: 950\n2022: 900\nTarget: 2030 50% vs. 2020 baseline."
+        if truncated:
+            # 模擬 max_output_tokens 用盡：輸出砍半
+            text = text[: max(1, len(text) // 2)]
+
+        prompt_tokens = self._count_prompt_tokens(request)
+        output_tokens = max(1, int(len(text) / self.config["chars_per_token"]))
+        self._bump(ok=1, prompt_tokens=prompt_tokens, output_tokens=output_tokens)
+        return {
+            "candidates": [
+                {
+                    "content": {"parts": [{"text": text}], "role": "model"},
+                    "finishReason": "MAX_TOKENS" if truncated else "STOP",
+                    "index": 0,
+                }
+            ],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens,
+            },
+            "modelVersion": model,
+        }
+
+
+    def create_batch(self, model: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """
+        模擬 inline 批次建立：立即回傳 operation，`batch_delay` 秒後 GET 才會看到結果。
+        每筆請求的輸出與線上模式共用 `_build_response`（不注入延遲 / 429 / 500）。
+        """
+        batch = body.get("batch") or {}
+        wrapped = ((batch.get("input_config") or batch.get("inputConfig") or {}).get("requests") or {})
+        entries = wrapped.get("requests") or []
+        if not entries:
+            return 400, {"status": "INVALID_ARGUMENT", "message": "Batch has no inline requests."}
+
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["batch_requests"] += len(entries)
+            name = f"batches/fake-{self._stats['batches']}"
+            seed = self._rng.getrandbits(32)
+        rng = random.Random(seed)
+        responses = []
+        for entry in entries:
+            request = entry.get("request") or {}
+            responses.append(
+                {
+                    "response": self._build_response(model, request, rng),
+                    "metadata": entry.get("metadata") or {},
+                }
+            )
+        with self._lock:
+            self._batches[name] = {
+                "model": model,
+                "display_name": batch.get("display_name") or batch.get("displayName") or name,
+                "ready_at": time.monotonic() + self.config["batch_delay"],
+                "responses": responses,
+            }
+        return 200, self.get_batch(name)
+
+    def get_batch(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            batch = self._batches.get(name)
+        if batch is None:
+            return None
+        done = time.monotonic() >= batch["ready_at"]
+        operation: Dict[str, Any] = {
+            "name": name,
+            "metadata": {
+                "@type": "type.googleapis.com/google.ai.generativelanguage.v1beta.GenerateContentBatch",
+                "model": f"models/{batch['model']}",
+                "displayName": batch["display_name"],
+                "state": "BATCH_STATE_SUCCEEDED" if done else "BATCH_STATE_RUNNING",
+            },
+            "done": done,
+        }
+        if done:
+            operation["response"] = {
+                "@type": "type.googleapis.com/google.ai.generativelanguage.v1beta.GenerateContentBatchOutput",
+                "inlinedResponses": {"inlinedResponses": batch["responses"]},
+            }
+        return operation
+
+
+class FakeGeminiServer:
+    """在背景執行緒啟動替身伺服器；可當 context manager 使用。"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        latency: str = "lognormal:0.5,0.6",
+        error_rate: float = 0.0,
+        rate_429: float = 0.0,
+        truncate_rate: float = 0.0,
+        max_items: int = 3,
+        report_year: int = 2024,
+        chars_per_token: float = 4.0,
+        image_tokens: int = 258,
+        seed: Optional[int] = None,
+        batch_delay: float = 2.0,
+        verbose: bool = False,
+    ) -> None:
+        parse_latency(latency)  # 先驗證設定
+        self._httpd = _FakeHTTPServer(
+            (host, port),
+            {
+                "latency": latency,
+                "error_rate": error_rate,
+                "rate_429": rate_429,
+                "truncate_rate": truncate_rate,
+                "max_items": max_items,
+                "report_year": report_year,
+                "chars_per_token": chars_per_token,
+                "image_tokens": image_tokens,
+                "seed": seed,
+                "batch_delay": batch_delay,
+                "verbose": verbose,
+            },
+        )
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def httpd(self) -> ThreadingHTTPServer:
+        return self._httpd
+
+    def stats(self) -> Dict[str, Any]:
+        return self._httpd.snapshot_stats()
+
+    def start(self) -> "FakeGeminiServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "FakeGeminiServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="離線 Gemini 替身伺服器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--latency",
+        default="lognormal:0.5,0.6",
+        help="延遲分布：fixed:S | uniform:A,B | normal:MEAN,SD | lognormal:MU,SIGMA (秒)",
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0, help="回傳 500 的機率")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="回傳 429 (配額不足) 的機率")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="回傳截斷輸出 (MAX_TOKENS) 的機率")
+    parser.add_argument("--max-items", type=int, default=3, help="每頁最多回傳幾筆假目標")
+    parser.add_argument("--report-year", type=int, default=2024)
+    parser.add_argument("--chars-per-token", type=float, default=4.0, help="文字 token 估算比例")
+    parser.add_argument("--image-tokens", type=int, default=258, help="每張圖片計入的 prompt tokens")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--batch-delay", type=float, default=2.0, help="批次工作建立後幾秒才完成")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(
+        args.host,
+        args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_429=args.rate_429,
+        truncate_rate=args.truncate_rate,
+        max_items=args.max_items,
+        report_year=args.report_year,
+        chars_per_token=args.chars_per_token,
+        image_tokens=args.image_tokens,
+        seed=args.seed,
+        batch_delay=args.batch_delay,
+        verbose=args.verbose,
+    )
+    print(f"[fake-gemini] listening on {server.url}  (GEMINI_API_ENDPOINT={server.url})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,16 @@
+import pandas as pd
 import streamlit as st
 
-from core.prompt import get_audit_prompt
+from core.chunking import build_prompt_zip, chunk_manifest, render_chunk_prompts, split_markdown
+from core.prompt import DEFAULT_MAX_PROMPT_TOKENS
+
+
+@st.cache_data(show_spinner=False)
+def _chunk_prompts(markdown: str, report_year: int, max_tokens: int):
+    """同一份 Markdown / 年份 / 上限只切一次 (翻頁時不重算)。"""
+    chunks = split_markdown(markdown, report_year, max_tokens=max_tokens)
+    prompts = render_chunk_prompts(chunks, report_year)
+    return chunks, prompts, chunk_manifest(chunks, prompts), build_prompt_zip(chunks, prompts)
 
 
 def render() -> None:
@@ -9,23 +19,49 @@ def render() -> None:
     st.markdown("將轉換後的內容結合標準化指令，產生可供 ChatGPT/Claude/Gemini 使用的 Prompt。")
 
     if st.session_state.get("markdown_content"):
-        final_prompt = get_audit_prompt(
-            st.session_state.get("report_year", 2024),
-            st.session_state["markdown_content"],
+        report_year = int(st.session_state.get("report_year", 2024))
+        max_tokens = st.number_input(
+            "每段 Prompt 的 token 上限（估算值；報告會依頁面與標題切成多段）",
+            min_value=2000,
+            max_value=1_000_000,
+            value=DEFAULT_MAX_PROMPT_TOKENS,
+            step=1000,
+            key="chunk_max_tokens",
+        )
+
+        chunks, prompts, manifest, zip_bytes = _chunk_prompts(
+            st.session_state["markdown_content"], report_year, int(max_tokens)
         )
 
         st.info(
-            "💡 請複製下方內容，貼給 LLM 模型，並將其回傳的 JSON 存檔供步驟三使用。"
+            f"💡 報告已切成 {len(chunks)} 段 Prompt。請逐段貼給 LLM 模型，"
+            "並將其回傳的 JSON 合併存檔供步驟三使用。"
         )
-        st.text_area("Prompt 預覽", final_prompt, height=400, key="prompt_preview")
+        with st.expander("段落清單"):
+            st.dataframe(pd.DataFrame(manifest), use_container_width=True)
 
-        st.download_button(
-            label="下載完整 Prompt (.txt)",
-            data=final_prompt,
-            file_name=f"Audit_Prompt_{st.session_state.get('report_year', 2024)}.txt",
+        # 一次只預覽一段，避免巨大的 text_area 卡住瀏覽器
+        selected = st.number_input(
+            "預覽第幾段", min_value=1, max_value=len(chunks), value=1, step=1, key="chunk_preview_index"
+        )
+        row = manifest[int(selected) - 1]
+        st.caption(f"{row['chunk_id']} {row['pages']}　約 {row['prompt_tokens']:,} tokens")
+        # 有 key 的 text_area 不會隨 value 更新，每次重繪前直接寫入目前這段
+        st.session_state["prompt_preview"] = prompts[int(selected) - 1]
+        st.text_area("Prompt 預覽", height=400, key="prompt_preview")
+
+        c1, c2 = st.columns(2)
+        c1.download_button(
+            label="下載此段 Prompt (.txt)",
+            data=prompts[int(selected) - 1],
+            file_name=f"Audit_Prompt_{row['chunk_id']}.txt",
             mime="text/plain",
         )
+        c2.download_button(
+            label="下載全部 Prompt (.zip)",
+            data=zip_bytes,
+            file_name=f"Audit_Prompts_{report_year}.zip",
+            mime="application/zip",
+        )
     else:
         st.warning("請先在步驟一上傳並轉換 PDF 報告。")
-
-
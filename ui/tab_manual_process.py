@@ -1,12 +1,22 @@
+import json
 import tempfile
 from pathlib import Path
-from typing import Optional, Set
 
+import pandas as pd
 import streamlit as st
 
 # 重用 core 的邏輯
-from core.pdf_extractor import extract_mixed_content
-from core.prompt import get_audit_prompt
+from core.manual_bundle import (
+    build_bundle_zip,
+    build_manual_prompts,
+    bundle_zip_to_jsonl,
+    load_response_bundle,
+    merge_responses,
+)
+from core.merge import merge_goal_items
+from core.pdf_extractor import extract_mixed_content, parse_page_ranges
+from core.prompt import DEFAULT_MAX_PROMPT_TOKENS
+from core.splice import splice_page_items
 
 # [新增] 匯入解鎖工具
 try:
@@ -24,6 +34,7 @@ def render() -> None:
         1. **上傳 PDF**：系統會解析每一頁的模式 (TEXT/HYBRID)。
         2. **預覽圖片**：針對圖表頁，您可以下載圖片或直接截圖。
         3. **複製 Prompt**：系統會自動組好包含 Schema 與文字的 Prompt，您只需複製並貼給 ChatGPT/Gemini (記得連同圖片一起上傳)。
+        4. **批次匯出 / 匯入**：一次下載所有 Prompt 與圖片 (zip / JSONL)，把回應填入 `responses_template.jsonl` 後上傳，合併成目標 JSON。
         """
     )
 
@@ -54,6 +65,31 @@ def render() -> None:
         key="pages_filter_manual",
     )
 
+    max_prompt_tokens = st.number_input(
+        "單一 Prompt 的 token 上限（估算值；超過時先壓縮頁面文字，仍超過則切成多段 Prompt）",
+        min_value=2000,
+        max_value=1_000_000,
+        value=DEFAULT_MAX_PROMPT_TOKENS,
+        step=1000,
+        key="max_prompt_tokens_manual",
+    )
+
+    pages_per_prompt = st.number_input(
+        "批次匯出時每個 Prompt 合併的頁數（1 = 每頁一個 Prompt；合併時仍受上方 token 上限限制）",
+        min_value=1,
+        max_value=20,
+        value=1,
+        key="pages_per_prompt_manual",
+    )
+    show_pages = st.checkbox(
+        "逐頁顯示截圖與 Prompt（頁數多時建議關閉，改用批次匯出）",
+        value=True,
+        key="show_pages_manual",
+    )
+
+    if "manual_bundle" not in st.session_state:
+        st.session_state.manual_bundle = None
+
     if uploaded_pdf is not None:
         if st.button("開始解析 (不消耗 API)"):
             with st.spinner("正在解析 PDF 結構與提取圖片..."):
@@ -78,23 +114,33 @@ def render() -> None:
                                 else:
                                     st.warning("⚠️ 解鎖失敗或無需解鎖，將使用原始檔案繼續處理。")
 
-                    # 2. 執行核心提取 (不呼叫 Gemini Client)
+                    # 2. 執行核心提取 (不呼叫 Gemini Client)；有頁碼過濾時只分析 / 渲染這些頁
                     # 注意：如果上面解鎖成功，這裡讀取的 tmp_path 已經是解鎖後的檔案
-                    pages = extract_mixed_content(str(tmp_path))
-                    
-                    # 3. 處理頁碼過濾
-                    pages_filter = _parse_pages_filter(pages_raw)
-                    if pages_filter:
-                        pages = [p for p in pages if int(p.get("page_index", -1)) in pages_filter]
-
-                    st.success(f"解析完成！顯示 {len(pages)} 個頁面。")
+                    pages_filter = parse_page_ranges(pages_raw) if pages_raw.strip() else None
+                    pages = extract_mixed_content(str(tmp_path), only_pages=pages_filter or None)
+
+                    # 3. 批次匯出：所有 Prompt 與圖片打包一次產生 (下載按鈕在按鈕區塊外，重新整理後仍可下載)。
+                    # 只保留 zip；JSONL (圖片 base64 內嵌) 在使用者要求時才由 zip 轉換
+                    bundle_prompts = build_manual_prompts(
+                        pages,
+                        int(report_year),
+                        max_tokens=int(max_prompt_tokens),
+                        pages_per_prompt=int(pages_per_prompt),
+                    )
+                    st.session_state.manual_bundle = {
+                        "name": f"{Path(uploaded_pdf.name).stem}_{int(report_year)}",
+                        "prompts": len(bundle_prompts),
+                        "pages": len(pages),
+                        "zip": build_bundle_zip(bundle_prompts, int(report_year)),
+                    }
+
+                    st.success(f"解析完成！共 {len(pages)} 個頁面、{len(bundle_prompts)} 個 Prompt。")
                     st.divider()
 
                     # 4. 逐頁顯示介面
-                    for p in pages:
+                    for p in pages if show_pages else []:
                         idx = p["page_index"] + 1
                         mode = p["mode"]
-                        text = p["text"]
                         images = p["images"]
 
                         # 設定顏色標記
@@ -110,36 +156,28 @@ def render() -> None:
                                 for img_bytes in images:
                                     st.image(img_bytes, caption=f"Page {idx} Screenshot", use_container_width=True)
                             
-                            # B. 組合 Prompt
-                            manual_content_parts = []
-                            
-                            # 加入手動模式專用提示
-                            if mode in ["HYBRID", "VISION"] and images:
-                                manual_content_parts.append(
-                                    "⚠️ [USER INSTRUCTION]: I have uploaded an image corresponding to this page. "
-                                    "Please combine the visual trend information from the image with the text below."
-                                )
-                                manual_content_parts.append(
-                                    "⚠️ [SYSTEM WARNING]: The PDF text layer might be disordered. "
-                                    "Rely on the image for 'Year-Value' alignment in charts."
-                                )
-                            
-                            manual_content_parts.append(f"# Raw Page Text\n{text.strip()}")
-                            
-                            # 產生最終完整 Prompt
-                            full_prompt = get_audit_prompt(
-                                current_year=report_year, 
-                                content="\n\n".join(manual_content_parts)
+                            # B. 組合 Prompt (含手動模式圖片提示)；過長的頁面文字先壓縮、仍超過再切段
+                            chunks = build_manual_prompts(
+                                [p], int(report_year), max_tokens=int(max_prompt_tokens)
                             )
 
                             # C. 顯示 Prompt 複製區
                             st.subheader("📋 複製 Prompt")
-                            st.text_area(
-                                label="請複製以下內容 (JSON Schema + Data)",
-                                value=full_prompt,
-                                height=250,
-                                key=f"prompt_area_{idx}"
-                            )
+                            if len(chunks) > 1:
+                                st.warning(
+                                    f"此頁文字過長，已切成 {len(chunks)} 段 Prompt，請分別貼給 AI（圖片只需隨第 1 段上傳）。"
+                                )
+                            for n, chunk in enumerate(chunks, start=1):
+                                suffix = f"（第 {n}/{len(chunks)} 段）" if len(chunks) > 1 else ""
+                                st.text_area(
+                                    label=(
+                                        f"請複製以下內容 (JSON Schema + Data){suffix}"
+                                        f" — 約 {chunk.tokens:,} tokens"
+                                    ),
+                                    value=chunk.prompt,
+                                    height=250,
+                                    key=f"prompt_area_{idx}" if n == 1 else f"prompt_area_{idx}_{n}",
+                                )
 
                 except Exception as e:
                     st.error(f"解析發生錯誤: {e}")
@@ -150,27 +188,89 @@ def render() -> None:
                     except Exception:
                         pass
 
-def _parse_pages_filter(pages_raw: str) -> Optional[Set[int]]:
-    """解析頁碼字串 (例如 "1, 3-5") 回傳 0-based index set"""
-    if not pages_raw.strip():
-        return None
-    
-    pages_filter = set()
-    for part in pages_raw.split(","):
-        part = part.strip()
-        if not part: continue
-        
-        if "-" in part:
-            try:
-                start_s, end_s = part.split("-", 1)
-                start, end = int(start_s), int(end_s)
-                for p in range(start, end + 1):
-                    pages_filter.add(p - 1)
-            except ValueError:
-                continue
-        else:
-            try:
-                pages_filter.add(int(part) - 1)
-            except ValueError:
-                continue
-    return pages_filter
\ No newline at end of file
+    bundle = st.session_state.manual_bundle
+    if bundle:
+        st.subheader("📦 批次匯出 Prompt 與圖片")
+        st.caption(
+            f"{bundle['pages']} 頁、{bundle['prompts']} 個 Prompt。zip 內含 prompts/、images/、manifest.json，"
+            "以及待填寫的 responses_template.jsonl（每行的 response 欄位貼上 AI 回覆）。"
+        )
+        d1, d2 = st.columns(2)
+        d1.download_button(
+            "📥 下載 zip (Prompt + PNG)",
+            data=bundle["zip"],
+            file_name=f"{bundle['name']}_manual_prompts.zip",
+            mime="application/zip",
+            key="download_bundle_zip_manual",
+        )
+        if d2.button("產生 JSONL (圖片以 base64 內嵌)", key="build_bundle_jsonl_manual"):
+            d2.download_button(
+                "📥 下載 JSONL",
+                data=bundle_zip_to_jsonl(bundle["zip"]),
+                file_name=f"{bundle['name']}_manual_prompts.jsonl",
+                mime="application/jsonl",
+                key="download_bundle_jsonl_manual",
+                on_click="ignore",
+            )
+
+    _render_response_import(int(report_year))
+
+
+def _render_response_import(report_year: int) -> None:
+    """上傳貼回的回應 (JSONL / zip)，合併成目標 JSON；可替換進既有目標 JSON 中對應頁面的目標。"""
+    st.subheader("📤 匯入 AI 回應並合併為目標 JSON")
+    responses_file = st.file_uploader(
+        "填好 response 的 responses_template.jsonl，或加入 responses/<prompt_id>.txt 的 zip",
+        type=["jsonl", "zip"],
+        key="responses_bundle_manual",
+    )
+    base_json = st.file_uploader(
+        "（選填）既有的目標 JSON：只替換有回應的頁面，其餘頁面保留",
+        type=["json"],
+        key="responses_base_json_manual",
+    )
+    merge_duplicates = st.checkbox(
+        "合併跨頁重複的相同目標（聯集 Progress_History，Source_Pages 記錄來源頁）",
+        value=False,
+        key="merge_duplicates_manual",
+    )
+    if responses_file is None or not st.button("合併回應", key="merge_responses_manual"):
+        return
+
+    try:
+        entries = load_response_bundle(responses_file.getvalue())
+        imported = merge_responses(entries, report_year)
+    except Exception as e:  # noqa: BLE001
+        st.error(f"讀取回應失敗：{e}")
+        return
+
+    items = imported.items
+    if base_json is not None:
+        base = json.loads(base_json.getvalue().decode("utf-8"))
+        # 只替換所有 Prompt 皆有回應的頁面，缺漏 / 無法解析的頁面保留舊目標
+        items, stats = splice_page_items(base, items, imported.covered_pages)
+        st.info(f"已替換 {len(imported.covered_pages)} 頁的目標：移除 {stats['removed']} 筆、新增 {stats['added']} 筆。")
+    if merge_duplicates:
+        items, merge_stats = merge_goal_items(items)
+        if merge_stats["removed"]:
+            st.info(f"跨頁重複目標已合併：{merge_stats['items']} → {merge_stats['merged_items']} 筆。")
+
+    st.success(f"已合併 {len(entries) - len(imported.missing) - len(imported.failed)} 個回應，共 {len(items)} 筆目標。")
+    if imported.missing:
+        st.warning(f"以下 Prompt 尚未貼上回應：{', '.join(imported.missing)}")
+    if imported.failed:
+        st.warning(f"⚠️ {len(imported.failed)} 個回應無法解析為 JSON，請重新複製：")
+        st.dataframe(pd.DataFrame(imported.failed), use_container_width=True)
+    if imported.problems:
+        with st.expander(f"Schema 驗證修正 / 丟棄 {len(imported.problems)} 處"):
+            st.dataframe(pd.DataFrame(imported.problems), use_container_width=True)
+
+    pretty = json.dumps(items, ensure_ascii=False, indent=2)
+    st.code(pretty, language="json")
+    st.download_button(
+        "📥 下載目標 JSON 檔",
+        data=pretty,
+        file_name=f"{report_year}_manual.json",
+        mime="application/json",
+        key="download_manual_goal_json",
+    )
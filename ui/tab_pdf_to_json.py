@@ -1,13 +1,53 @@
 import json
+import os
 import re
 import tempfile
+import uuid
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
 
+import pandas as pd
 import streamlit as st
 
+from core.boilerplate import detect_boilerplate, strip_boilerplate
+from core.budget import ReportBudget, rank_pages_by_relevance
+from core.compaction import CompactionStats, compact_pages
+from core.concurrency import FairLimiter, client_session
 from core.gemini_client import GeminiClient
-from core.pdf_extractor import extract_mixed_content
+from core.merge import merge_goal_items
+from core.pdf_extractor import parse_page_ranges
+from core.pipeline import PipelineResult, extract_goals_from_pages
+from core.planner import plan_report
+from core.prefetch import PagePrefetcher
+from core.splice import splice_page_items
+from core.usage import usage_scope
+
+
+@st.cache_resource
+def _shared_limiter() -> FairLimiter:
+    """整個 Streamlit process 共用的併發上限；GEMINI_MAX_CONCURRENCY 設為配額可承受的同時請求數。"""
+    return FairLimiter(int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")))
+
+
+@st.cache_resource
+def _shared_client(
+    image_strategy: str, escalation_model_name: Optional[str], focused_dictionary: bool = False
+) -> GeminiClient:
+    """同一組設定在整個 process 只建立一次 GeminiClient（不必每次點擊都重跑 load_dotenv / genai.configure）。"""
+    return GeminiClient(
+        image_strategy=image_strategy,
+        escalation_model_name=escalation_model_name,
+        limiter=_shared_limiter(),
+        focused_dictionary=focused_dictionary,
+        # 與 process 同壽命：用量只記到各次執行的 usage_scope，client 本身不累積紀錄
+        track_usage=False,
+    )
+
+
+def _session_id() -> str:
+    if "gemini_session_id" not in st.session_state:
+        st.session_state.gemini_session_id = uuid.uuid4().hex
+    return st.session_state.gemini_session_id
 
 
 def _infer_year_from_name(name: str, default: int = 2024) -> int:
@@ -21,37 +61,124 @@ def _infer_year_from_name(name: str, default: int = 2024) -> int:
 
 
 def _run_extraction(
-    pdf_path: Path, report_year: int, pages_filter: Optional[Set[int]] = None
-) -> List[Dict[str, Any]]:
+    pdf_path: Path,
+    report_year: int,
+    pages_filter: Optional[Set[int]] = None,
+    image_strategy: str = "inline",
+    escalation_model_name: Optional[str] = None,
+    strip_headers: bool = False,
+    compact: bool = False,
+    use_dictionary: bool = False,
+    budget: Optional[ReportBudget] = None,
+) -> Tuple[PipelineResult, Dict[str, Any]]:
     """直接在記憶體中執行 PDF → JSON 目標擷取，不寫入實體 JSON 檔。
 
     pages_filter:
         若提供，僅對指定頁碼呼叫 Gemini（0-based page index）。
         例如 {0, 4, 5} 代表第 1, 5, 6 頁。
+
+    strip_headers:
+        先移除跨頁重複的頁首 / 頁尾 / 頁碼 (core.boilerplate) 再送出。
+
+    compact:
+        長篇文字頁只保留含數值 / 指標的句子與前後文 (core.compaction)，
+        壓縮統計放在用量摘要的 "compaction"。
+
+    use_dictionary:
+        以 core.dictionary 預先標記頁面：略過沒有任何 ESG 詞彙的文字頁，
+        其餘文字頁的 Prompt 只列出命中的領域。
+
+    budget:
+        本次執行的呼叫 / tokens / 圖片上限 (core.budget)：頁面依目標相關度排序處理，
+        預算吃緊時降級，不足時略過 (skipped_pages reason="budget")；用量放在摘要的 "budget"。
+
+    回傳:
+        (擷取結果 (含失敗頁面), API 用量摘要)
     """
-    pages = extract_mixed_content(str(pdf_path))
+    client = _shared_client(image_strategy, escalation_model_name, use_dictionary)
+
+    # 背景執行緒先渲染後續頁面，與 Gemini 呼叫重疊；
+    # client 由所有 session 共用：呼叫依 session 公平排隊，用量只統計本次執行
+    boilerplate = (
+        detect_boilerplate(str(pdf_path), only_pages=pages_filter or None) if strip_headers else None
+    )
+    compaction = CompactionStats() if compact else None
+    page_order = rank_pages_by_relevance(str(pdf_path), pages_filter or None) if budget is not None else None
+    with PagePrefetcher(
+        str(pdf_path), only_pages=pages_filter or None, page_order=page_order
+    ) as pages, client_session(
+        _session_id()
+    ), usage_scope() as usage:
+        if boilerplate is not None:
+            pages = strip_boilerplate(pages, boilerplate)
+        if compaction is not None:
+            pages = compact_pages(pages, compaction)
+        result = extract_goals_from_pages(
+            client, pages, report_year, route_by_dictionary=use_dictionary, budget=budget
+        )
+    summary = usage.summary()
+    if compaction is not None:
+        summary["compaction"] = compaction.to_dict()
+    if budget is not None:
+        summary["budget"] = budget.to_dict()
+    return result, summary
 
-    if pages_filter:
-        pages = [p for p in pages if int(p.get("page_index", -1)) in pages_filter]
-    client = GeminiClient()
 
-    all_items: List[Dict[str, Any]] = []
-    for page in pages:
-        text: str = page["text"]
-        images: List[bytes] = page["images"]
+def _render_usage(summary: Dict[str, Any]) -> None:
+    """顯示本次解析的 token / 延遲 / 成本統計。"""
+    totals = summary["totals"]
+    st.subheader("💰 API 用量統計")
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("呼叫次數", totals["calls"], help=f"重試 {totals['retries']} 次，失敗 {totals['failed_calls']} 次")
+    c2.metric("Tokens (in / out)", f"{totals['prompt_tokens']:,} / {totals['output_tokens']:,}")
+    c3.metric("累計延遲", f"{totals['latency_s']:.1f} s", help=f"p90 {totals['latency_p90_s']:.1f} s")
+    c4.metric("估計成本", f"${totals['cost_usd']:.4f}")
 
-        page_items = client.extract_goals_from_page(
-            page_text=text,
-            images=images,
-            current_year=report_year,
+    compaction = summary.get("compaction")
+    if compaction:
+        st.caption(
+            f"數值脈絡壓縮：{compaction['compacted_pages']}/{compaction['pages']} 頁，"
+            f"{compaction['original_chars']:,} → {compaction['compacted_chars']:,} 字元"
+            f"（剩 {compaction['ratio']:.0%}）"
         )
 
-        for item in page_items:
-            if isinstance(item, dict):
-                item.setdefault("Report_Year", report_year)
-                all_items.append(item)
+    budget = summary.get("budget")
+    if budget:
+        limits = [
+            f"呼叫 {budget['spent_calls']}/{budget['max_calls']}" if budget["max_calls"] is not None else "",
+            f"tokens {budget['spent_tokens']:,}/{budget['max_tokens']:,}" if budget["max_tokens"] is not None else "",
+            (
+                f"圖片 {budget['spent_image_bytes'] / 1e6:.1f}/{budget['max_image_bytes'] / 1e6:.1f} MB"
+                if budget["max_image_bytes"] is not None
+                else ""
+            ),
+        ]
+        st.caption("預算用量：" + "，".join(x for x in limits if x))
 
-    return all_items
+    for key, label in (("by_mode", "依頁面模式"), ("by_kind", "依呼叫種類"), ("by_model", "依模型")):
+        if summary[key]:
+            st.caption(label)
+            st.dataframe(pd.DataFrame.from_dict(summary[key], orient="index"), use_container_width=True)
+
+    if summary["pages"]:
+        with st.expander("逐頁明細"):
+            st.dataframe(pd.DataFrame(summary["pages"]), use_container_width=True)
+
+
+def _render_plan(plan: Dict[str, Any]) -> None:
+    """顯示 dry-run 估算結果（未呼叫任何 API）。"""
+    totals = plan["totals"]
+    st.subheader("🧮 Dry-run 估算（未呼叫 API）")
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("頁數 / 呼叫", f"{totals['pages']} / {totals['calls']}", help=f"全文共 {plan['total_pages']} 頁")
+    c2.metric("Input tokens", f"{totals['prompt_tokens']:,}")
+    c3.metric("圖片", f"{totals['image_bytes'] / 1e6:.1f} MB")
+    c4.metric("估計成本", f"${totals['cost_usd']:.4f}")
+    c5.metric("預估耗時", f"{totals['duration_s']:.0f} s", help=f"規劃耗時 {plan['planning_time_s']:.2f} s")
+    st.caption("依頁面模式")
+    st.dataframe(pd.DataFrame.from_dict(plan["by_mode"], orient="index"), use_container_width=True)
+    with st.expander("逐頁路由與估算"):
+        st.dataframe(pd.DataFrame(plan["pages"]), use_container_width=True)
 
 
 def render() -> None:
@@ -82,8 +209,57 @@ def render() -> None:
         key="report_year_input_v2",
     )
 
+    image_strategy = st.radio(
+        "圖表頁 (HYBRID / VISION) 處理方式",
+        options=["inline", "describe"],
+        format_func=lambda v: {
+            "inline": "單次呼叫：Prompt + 文字 + 截圖一起送出（較快）",
+            "describe": "兩段式：先看圖產生描述，再擷取 JSON",
+        }[v],
+        horizontal=True,
+        key="image_strategy_v2",
+    )
+
+    cascade_choice = st.selectbox(
+        "Cascade：可疑頁面升級至較強模型（選填）",
+        options=["（不使用）", "gemini-2.5-flash", "gemini-2.5-pro"],
+        help="每頁先用 flash-lite；輸出未通過驗證、信心不足或含圖表數據時才以所選模型重跑。",
+        key="cascade_model_v2",
+    )
+    escalation_model_name = None if cascade_choice.startswith("（") else cascade_choice
+
+    strip_headers = st.checkbox(
+        "移除跨頁重複的頁首 / 頁尾 / 頁碼（節省 tokens）",
+        value=False,
+        key="strip_boilerplate_v2",
+    )
+    compact = st.checkbox(
+        "長篇文字頁只保留含數值 / 指標的句子與前後文（節省 tokens）",
+        value=False,
+        key="compact_text_v2",
+    )
+    use_dictionary = st.checkbox(
+        "依 ESG 字典預先標記頁面（略過無相關詞彙的文字頁、Prompt 只列出命中的領域）",
+        value=False,
+        key="use_dictionary_v2",
+    )
+    merge_duplicates = st.checkbox(
+        "合併跨頁重複的相同目標（聯集 Progress_History，Source_Pages 記錄來源頁）",
+        value=False,
+        key="merge_duplicates_v2",
+    )
+
+    # 單份報告的預算上限 (0 = 不限制)：依目標相關度排序處理，吃緊時不送圖片 → 壓縮文字 → 略過
+    with st.expander("預算上限（選填，0 代表不限制）"):
+        b1, b2, b3 = st.columns(3)
+        max_calls = b1.number_input("呼叫次數", min_value=0, value=0, step=10, key="max_calls_v2")
+        max_tokens = b2.number_input("Tokens (in + out)", min_value=0, value=0, step=50000, key="max_tokens_v2")
+        max_image_mb = b3.number_input("圖片 (MB)", min_value=0.0, value=0.0, step=1.0, key="max_image_mb_v2")
+
     if "goal_json" not in st.session_state:
         st.session_state.goal_json = None
+    if "goal_usage" not in st.session_state:
+        st.session_state.goal_usage = None
 
     # 可選：限制要解析的頁碼，降低 API 成本
     pages_raw = st.text_input(
@@ -92,31 +268,44 @@ def render() -> None:
         key="pages_filter_v2",
     )
 
-    pages_filter: Optional[Set[int]] = None
-    if pages_raw.strip():
-        pages_filter = set()
-        for part in pages_raw.split(","):
-            part = part.strip()
-            if not part:
-                continue
-            if "-" in part:
-                try:
-                    start_s, end_s = part.split("-", 1)
-                    start = int(start_s)
-                    end = int(end_s)
-                    for p in range(start, end + 1):
-                        # 轉為 0-based index
-                        pages_filter.add(p - 1)
-                except ValueError:
-                    continue
-            else:
-                try:
-                    p = int(part)
-                    pages_filter.add(p - 1)
-                except ValueError:
-                    continue
+    pages_filter: Optional[Set[int]] = parse_page_ranges(pages_raw) if pages_raw.strip() else None
+
+    # 局部重新擷取：只重跑指定頁碼，替換既有目標 JSON 中這些頁的目標 (依 Source_Page)
+    splice_mode = st.checkbox(
+        "只重新擷取上面指定的頁碼，替換進既有的目標 JSON（其餘頁面保留不動）",
+        value=False,
+        key="splice_mode_v2",
+        disabled=not pages_filter,
+    )
+    splice_base: Optional[List[Dict[str, Any]]] = None
+    if splice_mode and pages_filter:
+        existing_json = st.file_uploader(
+            "既有的目標 JSON（未上傳時使用本頁目前的結果）", type=["json"], key="splice_json_v2"
+        )
+        if existing_json is not None:
+            splice_base = json.loads(existing_json.getvalue().decode("utf-8"))
+        else:
+            splice_base = st.session_state.get("goal_json")
+        if splice_base is None:
+            st.warning("請上傳既有的目標 JSON，或先完整解析一次。")
 
     if uploaded_pdf is not None:
+        if st.button("估算成本 (Dry-run，不呼叫 API)"):
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
+                tmp_pdf.write(uploaded_pdf.getvalue())
+                plan_path = Path(tmp_pdf.name)
+            try:
+                _render_plan(
+                    plan_report(
+                        plan_path,
+                        int(report_year),
+                        pages_filter=pages_filter,
+                        image_strategy=image_strategy,
+                    )
+                )
+            finally:
+                plan_path.unlink(missing_ok=True)
+
         if st.button("開始解析目標 (PDF → JSON)"):
             st.info(f"正在處理檔案: {uploaded_pdf.name} ... 這可能需要數十秒。")
 
@@ -124,13 +313,99 @@ def render() -> None:
                 tmp_pdf.write(uploaded_pdf.read())
                 tmp_path = Path(tmp_pdf.name)
 
+            budget = (
+                ReportBudget(
+                    max_calls=int(max_calls) or None,
+                    max_tokens=int(max_tokens) or None,
+                    max_image_bytes=int(max_image_mb * 1e6) or None,
+                )
+                if max_calls or max_tokens or max_image_mb
+                else None
+            )
             try:
                 with st.spinner("Gemini 正在解析圖表與文字..."):
-                    data = _run_extraction(tmp_path, int(report_year), pages_filter)
-                st.session_state.goal_json = data
-                st.success(f"解析完成！共擷取到 {len(data)} 筆目標紀錄。")
+                    result, usage = _run_extraction(
+                        tmp_path,
+                        int(report_year),
+                        pages_filter,
+                        image_strategy,
+                        escalation_model_name,
+                        strip_headers,
+                        compact,
+                        use_dictionary,
+                        budget,
+                    )
+                items = result.items
+                budget_skipped = sorted(p["page_index"] for p in result.skipped_pages if p["reason"] == "budget")
+                if splice_mode and splice_base is not None and result.failed_pages:
+                    # 有頁面失敗時不替換，避免把這些頁的舊目標刪掉
+                    items = splice_base
+                    st.warning("部分頁面擷取失敗，既有目標 JSON 未修改。")
+                elif splice_mode and splice_base is not None:
+                    # 因預算略過的頁面沒有新結果，保留其舊目標
+                    items, splice_stats = splice_page_items(
+                        splice_base, items, pages_filter - set(budget_skipped)
+                    )
+                    st.info(
+                        f"已替換頁碼 {pages_raw} 的目標：移除 {splice_stats['removed']} 筆、"
+                        f"新增 {splice_stats['added']} 筆。"
+                    )
+                    if splice_stats["unknown_source"]:
+                        st.warning(
+                            f"{splice_stats['unknown_source']} 筆既有目標沒有 Source_Page，無法判斷來源頁，已原樣保留。"
+                        )
+                if merge_duplicates:
+                    items, merge_stats = merge_goal_items(items)
+                st.session_state.goal_json = items
+                st.session_state.goal_usage = usage
+                st.success(f"解析完成！共擷取到 {len(result.items)} 筆目標紀錄。")
+                if merge_duplicates and merge_stats["removed"]:
+                    st.info(f"跨頁重複目標已合併：{merge_stats['items']} → {merge_stats['merged_items']} 筆。")
+                if result.deduplicated_pages:
+                    dup_pages = ", ".join(
+                        f"{d['page_index'] + 1}←{d['duplicate_of'] + 1}" for d in result.deduplicated_pages
+                    )
+                    st.info(f"重複頁面直接沿用結果（頁碼←原始頁）：{dup_pages}")
+                dictionary_skipped = [p for p in result.skipped_pages if p["reason"] == "no_esg_terms"]
+                if dictionary_skipped:
+                    skipped = ", ".join(str(p["page_index"] + 1) for p in dictionary_skipped)
+                    st.info(f"以下文字頁沒有任何 ESG 字典詞彙或目標數值，未送出：{skipped}")
+                if result.degraded_pages:
+                    degraded = ", ".join(
+                        f"{p['page_index'] + 1}（{' + '.join(p['degradations'])}）" for p in result.degraded_pages
+                    )
+                    st.info(f"預算吃緊，以下頁面降級送出：{degraded}")
+                if budget_skipped:
+                    skipped = ", ".join(str(i + 1) for i in budget_skipped)
+                    st.warning(f"💸 預算不足，以下頁面未送出，可加大預算後以頁碼欄位補跑：{skipped}")
+                if result.escalated_pages:
+                    st.info(
+                        f"Cascade：{len(result.escalated_pages)}/{result.processed_pages} 頁升級至 "
+                        f"{escalation_model_name} ({result.escalation_rate:.0%})。"
+                    )
+                if result.failed_pages:
+                    pages_1based = ", ".join(str(p["page_index"] + 1) for p in result.failed_pages)
+                    st.warning(f"⚠️ 以下頁面無法取得合法 JSON，可用頁碼欄位單獨重跑：{pages_1based}")
+                if result.unverified_pages:
+                    pages_1based = ", ".join(str(p["page_index"] + 1) for p in result.unverified_pages)
+                    st.warning(f"🔎 以下頁面有數值在頁面文字中找不到（見 Verification 欄位），建議重跑：{pages_1based}")
+                    with st.expander("數值驗證明細"):
+                        st.dataframe(
+                            pd.DataFrame(
+                                [
+                                    {"page": p["page_index"] + 1, "issue": issue}
+                                    for p in result.unverified_pages
+                                    for issue in p["issues"]
+                                ]
+                            ),
+                            use_container_width=True,
+                        )
+                if result.problems:
+                    with st.expander(f"Schema 驗證修正 / 丟棄 {len(result.problems)} 處"):
+                        st.dataframe(pd.DataFrame(result.problems), use_container_width=True)
             except Exception as e:  # noqa: BLE001
                 st.session_state.goal_json = None
+                st.session_state.goal_usage = None
                 st.error(f"解析過程發生錯誤：{e}")
             finally:
                 try:
@@ -138,6 +413,9 @@ def render() -> None:
                 except Exception:
                     pass
 
+    if st.session_state.goal_usage:
+        _render_usage(st.session_state.goal_usage)
+
     if st.session_state.goal_json:
         st.subheader("📄 抽取出的目標 JSON")
         pretty = json.dumps(st.session_state.goal_json, ensure_ascii=False, indent=2)
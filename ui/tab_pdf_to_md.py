@@ -3,7 +3,10 @@ import re
 import tempfile
 
 import streamlit as st
-from markitdown import MarkItDown
+
+from core.pdf_markdown import convert_pdf_to_markdown, convert_with_markitdown
+
+_ENGINES = ("快速模式 (PyMuPDF 逐頁平行轉換)", "相容模式 (MarkItDown)")
 
 
 def render() -> None:
@@ -35,6 +38,14 @@ def render() -> None:
     )
     st.session_state.report_year = report_year
 
+    engine = st.radio(
+        "轉換引擎",
+        _ENGINES,
+        horizontal=True,
+        key="md_engine",
+        help="快速模式保留頁碼標記與標題，同一份檔案第二次轉換直接讀取快取；版面特殊時可改用 MarkItDown。",
+    )
+
     if uploaded_pdf is not None:
         if st.button("開始轉換"):
             st.info(f"正在處理檔案: {uploaded_pdf.name} ...")
@@ -44,12 +55,30 @@ def render() -> None:
                 tmp_pdf_path = tmp_pdf.name
 
             try:
-                md = MarkItDown()
-                result = md.convert(tmp_pdf_path)
-                st.session_state.markdown_content = result.text_content
+                if engine == _ENGINES[0]:
+                    progress = st.progress(0.0, text="轉換中...")
+                    partial = st.empty()
+
+                    def _on_page(page_index: int, total: int, page_md: str) -> None:
+                        # 逐頁回報進度，並顯示最新轉好的頁面
+                        progress.progress((page_index + 1) / total, text=f"已轉換 {page_index + 1}/{total} 頁")
+                        partial.code(page_md[:1500], language="markdown")
+
+                    markdown, cached = convert_pdf_to_markdown(tmp_pdf_path, on_page=_on_page)
+                    progress.empty()
+                    partial.empty()
+                    if cached:
+                        st.caption("此檔案先前已轉換過，直接使用快取結果。")
+                else:
+                    markdown = convert_with_markitdown(tmp_pdf_path)
+                st.session_state.markdown_content = markdown
                 os.remove(tmp_pdf_path)
                 st.success("轉換成功！請至「產生稽核 Prompt」分頁查看。")
 
+            except ImportError:
+                st.error("未安裝 MarkItDown (pip install 'markitdown[pdf]')，請改用快速模式。")
+                if os.path.exists(tmp_pdf_path):
+                    os.remove(tmp_pdf_path)
             except Exception as e:  # noqa: BLE001
                 st.error(f"轉換錯誤: {e}")
                 if os.path.exists(tmp_pdf_path):